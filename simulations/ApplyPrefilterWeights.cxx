@@ -0,0 +1,50 @@
+#include <iostream>
+
+#include "TFile.h"
+#include "TH1D.h"
+
+using namespace std;
+
+// Restore the generated photon spectra in a reconstruction output made from prefiltered events.
+//
+// analyzeLumiHits fills hGenPhoton_E / hGenEventCount from the events it sees, which after
+// the PropagateAndConvert prefilter are only the kept ones. The acceptance denominators must
+// count every generated photon, so the plugin's histograms are kept as *_kept and replaced by
+// the generated spectra written by PropagateAndConvert (stats_fname.root).
+void ApplyPrefilterWeights(string recon_file = "", string stats_file = "") {
+
+  if( recon_file.empty() || stats_file.empty() ) {
+    cout << "recon_file and stats_file arguments are required." << endl;
+    return;
+  }
+
+  TFile stats( stats_file.data(), "READ" );
+  TFile recon( recon_file.data(), "UPDATE" );
+  if( stats.IsZombie() || recon.IsZombie() ) {
+    cout << "Cannot open " << recon_file << " or " << stats_file << endl;
+    return;
+  }
+
+  for( string name : {"hGenPhoton_E", "hGenEventCount"} ) {
+    TH1D *generated = (TH1D*)stats.Get( name.data() );
+    TH1D *seen = (TH1D*)recon.Get( name.data() );
+    if( !generated ) {
+      cout << name << " not found in " << stats_file << endl;
+      continue;
+    }
+
+    recon.cd();
+    if( seen ) {
+      // already applied, do not overwrite the kept spectrum with the generated one
+      if( recon.Get( (name + "_kept").data() ) ) { continue; }
+      seen->Write( (name + "_kept").data() );
+    }
+    generated->Write( name.data(), TObject::kOverwrite );
+
+    cout << name << ": " << generated->GetEntries() << " generated, "
+      << (seen ? seen->GetEntries() : 0) << " seen by reconstruction" << endl;
+  }
+
+  recon.Close();
+  stats.Close();
+}
@@ -3,8 +3,12 @@
 #include "HepMC3/WriterAscii.h"
 #include "HepMC3/Print.h"
 #include <iostream>
+#include <fstream>
 
 #include "TF1.h"
+#include "TH1D.h"
+#include "TFile.h"
+#include "TApplication.h"
 
 #include "../utilities/constants.h"
 
@@ -26,7 +30,11 @@ struct positions {
 
 positions POS;
 
-void PropagateAndConvert(string infile="", string outfile="converterElectrons.hepmc", double Zprop = POS.AnalyzerStart) {
+// prefilter: drop events whose conversion vertex at Zprop lies outside |x| < envelopeX, |y| < envelopeY (mm)
+// or whose leptons are below Emin_lepton (GeV). The generated and kept photon spectra are written to
+// stats_fname.root (same binning as hGenPhoton_E / hGenEventCount in analyzeLumiHits) and stats_fname.json
+void PropagateAndConvert(string infile="", string outfile="converterElectrons.hepmc", double Zprop = POS.AnalyzerStart, bool terminate = true,
+    bool prefilter = false, double envelopeX = 100, double envelopeY = 100, double Emin_lepton = 0.001, string stats_fname = "") {
   
   if( infile.empty() ) {
     cout << "infile argument is blank." << endl;
@@ -40,6 +48,14 @@ void PropagateAndConvert(string infile="", string outfile="converterElectrons.he
   WriterAscii output_file( outfile.data() );
 
   int events_parsed = 0;
+  int events_kept = 0;
+
+  // generated vs kept photon spectra, the denominators of the acceptance histograms
+  TH1D *hGenPhoton_E = new TH1D("hGenPhoton_E", "Generated #gamma energy;E_{#gamma} (GeV);Nevents", 2000,0,20);
+  TH1D *hKeptPhoton_E = new TH1D("hKeptPhoton_E", "Prefiltered #gamma energy;E_{#gamma} (GeV);Nevents", 2000,0,20);
+  TH1D *hGenEventCount = new TH1D("hGenEventCount", "Number of generated events per Egen;E_{#gamma} (GeV);Nevents", 2500, 0, 50);
+  TH1D *hKeptEventCount = new TH1D("hKeptEventCount", "Number of prefiltered events per Egen;E_{#gamma} (GeV);Nevents", 2500, 0, 50);
+  for( auto h : {hGenPhoton_E, hKeptPhoton_E, hGenEventCount, hKeptEventCount} ) { h->SetDirectory(0); }
 
   while( ! input_file.failed() ) {
 
@@ -52,6 +68,9 @@ void PropagateAndConvert(string infile="", string outfile="converterElectrons.he
     // Grab Primary Vertex
     FourVector PV = evt.event_pos();
 
+    bool keep_event = !prefilter;
+    std::vector<double> converted_E;
+
     // loop over vertices starting from second one, first should always be the ep primary vertex
     for( int vtx = 1; vtx < evt.vertices().size(); vtx++ ) {
 
@@ -104,17 +123,53 @@ void PropagateAndConvert(string infile="", string outfile="converterElectrons.he
       // remove the old outgoing photon (now it's converted)
       evt.remove_particle( vertices[vtx]->particles_out()[0] );
 
+      converted_E.push_back( photonIN->momentum().e() );
+      if( prefilter && fabs( (RelVtxAtNewLocation + PV).x() ) < envelopeX && fabs( (RelVtxAtNewLocation + PV).y() ) < envelopeY
+          && E_electron > Emin_lepton && E_positron > Emin_lepton ) {
+        keep_event = true;
+      }
     }
     
-    // Save event to output file
-    output_file.write_event(evt);
+    for( double E : converted_E ) { hGenPhoton_E->Fill( E ); }
+    if( !converted_E.empty() ) { hGenEventCount->Fill( converted_E.back() ); }
 
     ++events_parsed;
+
+    if( keep_event ) {
+      for( double E : converted_E ) { hKeptPhoton_E->Fill( E ); }
+      if( !converted_E.empty() ) { hKeptEventCount->Fill( converted_E.back() ); }
+      ++events_kept;
+
+      // Save event to output file
+      output_file.write_event(evt);
+    }
+
     if( events_parsed%1000 == 0 ) std::cout<<"Events parsed: "<<events_parsed<<std::endl;
   }
 
   input_file.close();
   output_file.close();
+
+  if( prefilter ) {
+    std::cout<<"Prefilter kept "<<events_kept<<" of "<<events_parsed<<" events"<<std::endl;
+  }
+
+  if( !stats_fname.empty() ) {
+    TFile stats_root( (stats_fname + ".root").data(), "RECREATE" );
+    for( auto h : {hGenPhoton_E, hKeptPhoton_E, hGenEventCount, hKeptEventCount} ) { h->Write(); }
+    stats_root.Close();
+
+    // per-bin counts of hGenPhoton_E / hKeptPhoton_E for bookkeeping outside ROOT
+    std::ofstream stats_json( stats_fname + ".json" );
+    stats_json<<"{\"generated\": "<<events_parsed<<", \"kept\": "<<events_kept
+      <<", \"bins\": {\"nbins\": 2000, \"xmin\": 0, \"xmax\": 20}, \"generated_per_bin\": [";
+    for( int bin = 1; bin <= hGenPhoton_E->GetNbinsX(); bin++ ) { stats_json<<(bin > 1 ? ", " : "")<<hGenPhoton_E->GetBinContent(bin); }
+    stats_json<<"], \"kept_per_bin\": [";
+    for( int bin = 1; bin <= hKeptPhoton_E->GetNbinsX(); bin++ ) { stats_json<<(bin > 1 ? ", " : "")<<hKeptPhoton_E->GetBinContent(bin); }
+    stats_json<<"]}"<<std::endl;
+  }
+  for( auto h : {hGenPhoton_E, hKeptPhoton_E, hGenEventCount, hKeptEventCount} ) { delete h; }
   
-  gApplication->Terminate();
+  // keep the session alive when several files are converted in one ROOT process
+  if( terminate ) gApplication->Terminate();
 }
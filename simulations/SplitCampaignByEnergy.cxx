@@ -0,0 +1,111 @@
+#include <iostream>
+#include <set>
+#include <vector>
+
+#include "TFile.h"
+#include "TKey.h"
+#include "TH1.h"
+#include "TTree.h"
+#include "TString.h"
+#include "TObjArray.h"
+#include "TObjString.h"
+
+using namespace std;
+
+// One entry per event with the generated photon energy in branch e (analyzeLumiHits MCgenAnalysis)
+const char *kGenPhotonTree = "treeGenPhotons";
+
+// Whether h is binned in true photon energy along x (axis title E_{#gamma}, E_{#gammaMC}, ...)
+bool IsPhotonEnergyBinned(TH1 *h) {
+  return TString( h->GetXaxis()->GetTitle() ).Strip( TString::kBoth ).BeginsWith("E_{#gamma");
+}
+
+// Copy the part of in with Elow <= E_{#gamma} < Ehigh to out: histograms binned in true photon
+// energy keep only those bins and the generated photon tree only those events. All other objects
+// (hit, position and reconstructed energy histograms, the per-hit and per-track trees) carry no
+// photon energy to select by; they are left out and stay only in the merged file. Their names
+// are collected in skipped.
+void CopyEnergyWindow(TDirectory *in, TDirectory *out, double Elow, double Ehigh, vector<string> &skipped) {
+
+  set<string> done; // only the highest cycle of each key
+  TIter next( in->GetListOfKeys() );
+  TKey *key;
+  while( (key = (TKey*)next()) ) {
+    if( !done.insert( key->GetName() ).second ) { continue; }
+
+    TObject *obj = key->ReadObj();
+    if( obj->InheritsFrom( TDirectory::Class() ) ) {
+      CopyEnergyWindow( (TDirectory*)obj, out->mkdir( obj->GetName() ), Elow, Ehigh, skipped );
+      continue;
+    }
+
+    out->cd();
+    if( obj->InheritsFrom( TTree::Class() ) && TString( key->GetName() ) == kGenPhotonTree ) {
+      TTree *tree = ((TTree*)obj)->CopyTree( Form( "e >= %g && e < %g", Elow, Ehigh ) );
+      tree->Write( key->GetName() );
+      delete tree;
+      continue;
+    }
+    if( !obj->InheritsFrom( TH1::Class() ) || !IsPhotonEnergyBinned( (TH1*)obj ) ) {
+      skipped.push_back( string( in->GetPath() ) + "/" + key->GetName() );
+      if( !obj->InheritsFrom( TTree::Class() ) ) { delete obj; }
+      continue;
+    }
+
+    TH1 *h = (TH1*)obj;
+    h->SetDirectory(0);
+    int binx, biny, binz;
+    for( int bin = 0; bin < h->GetNcells(); bin++ ) {
+      h->GetBinXYZ( bin, binx, biny, binz );
+      double E = h->GetXaxis()->GetBinCenter( binx );
+      if( binx == 0 || binx > h->GetNbinsX() || E < Elow || E >= Ehigh ) {
+        h->SetBinContent( bin, 0 );
+        h->SetBinError( bin, 0 );
+      }
+    }
+    h->ResetStats();
+
+    h->Write( key->GetName() );
+    delete h;
+  }
+}
+
+// Split the merged reconstruction output of a continuous-spectrum campaign into the
+// per-energy files of a discrete energy scan (see CopyEnergyWindow for what they hold). out_pattern contains {E}, energies is a
+// comma separated list and each file gets the window [E - bin_width/2, E + bin_width/2).
+void SplitCampaignByEnergy(string merged_file = "", string out_pattern = "recon_output_{E}edm4hep.root", string energies = "", double bin_width = 1.0) {
+
+  if( merged_file.empty() || energies.empty() ) {
+    cout << "merged_file and energies arguments are required." << endl;
+    return;
+  }
+
+  TFile merged( merged_file.data(), "READ" );
+  if( merged.IsZombie() ) {
+    cout << "Cannot open " << merged_file << endl;
+    return;
+  }
+
+  TObjArray *tokens = TString( energies.data() ).Tokenize(",");
+  for( int i = 0; i < tokens->GetEntries(); i++ ) {
+    TString token = ((TObjString*)tokens->At(i))->GetString();
+    double E = token.Atof();
+
+    TString fname = out_pattern.data();
+    fname.ReplaceAll( "{E}", token.Strip( TString::kBoth ) );
+
+    TFile out( fname, "RECREATE" );
+    vector<string> skipped;
+    CopyEnergyWindow( &merged, &out, E - bin_width/2., E + bin_width/2., skipped );
+    out.Close();
+
+    cout << "Wrote " << fname << " for " << E - bin_width/2. << " <= E_gamma < " << E + bin_width/2. << " GeV" << endl;
+    if( i == 0 && !skipped.empty() ) {
+      cout << skipped.size() << " objects cannot be split by E_gamma and are only in " << merged_file << ":" << endl;
+      for( auto &name : skipped ) { cout << "  " << name << endl; }
+    }
+  }
+  delete tokens;
+
+  merged.Close();
+}
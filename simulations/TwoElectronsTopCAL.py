@@ -1,46 +1,50 @@
-import sys
+import os
+import argparse
+import functools
 
 import numpy as np
-from pyHepMC3 import HepMC3
 
-# generates 2 electrons from different vertices relevent for the lumi Pair Spectrometer
-outfilename = sys.argv[1]
+from hepmc_batch import write_sharded
+
+# generates electrons from different vertices relevent for the lumi Pair Spectrometer
+# one electron per gun y position in every event, optionally scanned over several pz values
+#
+# python TwoElectronsTopCAL.py out.hepmc                      (2 guns at y=110,180 mm, pz=-10 GeV, 100 events)
+# python TwoElectronsTopCAL.py out.hepmc --y 110 150 180 --pz -5 -10 -15 --events 1000000 --shards 8
 mass = 0.511e-3
-pz = -10 # GeV
-E = np.sqrt(mass**2 + pz**2)
-
-y1 = 110 # y position of gun 1 in mm
-y2 = 180 # y position of gun 2 in mm
-z = -64000 # z position close to entrance of lumi Pair Spectrometer CALs in mm
-
-writer = HepMC3.WriterAscii( outfilename )
-
-for ix in range(100):
- 
-    particle_in1 = HepMC3.GenParticle(HepMC3.FourVector(0, 0, pz, E))
-    particle_in1.set_pdg_id(11)
-    particle_in1.set_status(3)
-    particle_out1 = HepMC3.GenParticle(HepMC3.FourVector(0, 0, pz, E))
-    particle_out1.set_pdg_id(11)
-    particle_out1.set_status(1)
-
-    particle_in2 = HepMC3.GenParticle(HepMC3.FourVector(0, 0, pz, E))
-    particle_in2.set_pdg_id(11)
-    particle_in2.set_status(3)
-    particle_out2 = HepMC3.GenParticle(HepMC3.FourVector(0, 0, pz, E))
-    particle_out2.set_pdg_id(11)
-    particle_out2.set_status(1)
-
-    vertex1 = HepMC3.GenVertex(HepMC3.FourVector(0., y1, z, 0.))
-    vertex1.add_particle_in( particle_in1 )
-    vertex1.add_particle_out( particle_out1 )
-    
-    vertex2 = HepMC3.GenVertex(HepMC3.FourVector(0., y2, z, 0.))
-    vertex2.add_particle_in( particle_in2 )
-    vertex2.add_particle_out( particle_out2 )
-
-    event = HepMC3.GenEvent( HepMC3.Units.GEV, HepMC3.Units.MM )
-    event.add_vertex( vertex1 )
-    event.add_vertex( vertex2 )
-
-    writer.write_event( event )
+
+
+def build_events(n_events, rng, y_positions, pz, z):
+    """Gun events: one electron with momentum (0, 0, pz) per y position, all at the same z."""
+    n_guns = len(y_positions)
+    momenta = np.zeros((n_events, n_guns, 4))
+    momenta[..., 2] = pz
+    momenta[..., 3] = np.sqrt(mass**2 + pz**2)
+
+    vertices = np.zeros((n_events, n_guns, 4))
+    vertices[..., 1] = y_positions
+    vertices[..., 2] = z
+
+    pdg = np.full(n_guns, 11)
+    return momenta, vertices, pdg, np.full(n_guns, mass)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Electron guns in front of the lumi Pair Spectrometer CALs")
+    parser.add_argument("outfilename", help="output HepMC3 file")
+    parser.add_argument("--y", type=float, nargs="+", default=[110, 180], help="y positions of the guns in mm")
+    parser.add_argument("--pz", type=float, nargs="+", default=[-10], help="electron pz in GeV, one file per value")
+    parser.add_argument("--z", type=float, default=-64000, help="z position close to entrance of the CALs in mm")
+    parser.add_argument("--events", type=int, default=100, help="events per pz value")
+    parser.add_argument("--shards", type=int, default=1, help="split each file into this many parallel shards")
+    parser.add_argument("--batch-size", type=int, default=10000, help="events built and written per block")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stem, ext = os.path.splitext(args.outfilename)
+    for pz in args.pz:
+        outfilename = args.outfilename if len(args.pz) == 1 else f"{stem}_pz{pz:g}{ext or '.hepmc'}"
+        builder = functools.partial(build_events, y_positions=np.asarray(args.y), pz=pz, z=args.z)
+        files = write_sharded(outfilename, builder, args.events, n_shards=args.shards,
+                              batch_size=args.batch_size, seed=args.seed)
+        print(f"pz = {pz} GeV: wrote {args.events} events to {', '.join(files)}")
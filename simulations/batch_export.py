@@ -0,0 +1,235 @@
+"""
+Export of a run's task graph to batch-system jobs.
+
+Instead of one batch job per file (Farm_Bash_Scripts/PairSpec_Sim.sh), the
+tasks of each stage are packed into bundles of about target_wall_s predicted
+run time (first fit, longest task first; a task longer than the target gets
+a bundle of its own). A bundle is a plain bash script running its tasks one
+after the other, each into its own log, and recording the outcome of every
+task under status/<task_id>: a resubmitted bundle skips the tasks already
+completed and a reconstruction task is skipped when its simulation did not
+complete.
+
+Stages become one job each per backend:
+    slurm   one array job per stage (array index = bundle), the reconstruction
+            array depending on the simulation array (afterany)
+    swif2   one job per bundle, stages in consecutive workflow phases
+    local   no scheduler: run_local executes the bundles of each stage in a
+            process pool, a stand-in to test the exported scripts on one machine
+
+Layout of the batch directory:
+    bundles/<stage>_<n>.sh     tasks of one job
+    <stage>_array.sh           Slurm array script of a stage
+    submit.sh                  submission of all stages (slurm, swif2)
+    status/<task_id>           completed, failed <exit code> or skipped
+    logs/<task_id>.log         output of a task
+"""
+import os
+import math
+import shlex
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+BACKENDS = ("slurm", "swif2", "local")
+TARGET_WALL_S = 4 * 3600.0
+
+
+def pack(tasks: List[dict], target_wall_s: float = TARGET_WALL_S) -> List[List[dict]]:
+    """
+    Pack tasks into bundles of at most target_wall_s predicted seconds (first fit decreasing).
+
+    Args:
+        tasks: Task dicts with predicted_s
+
+    Returns:
+        List[List[dict]]: Bundles, the tasks of each in execution order (longest first)
+    """
+    bundles: List[List[dict]] = []
+    loads: List[float] = []
+    for task in sorted(tasks, key=lambda task: task['predicted_s'], reverse=True):
+        for index, load in enumerate(loads):
+            if load + task['predicted_s'] <= target_wall_s:
+                bundles[index].append(task)
+                loads[index] += task['predicted_s']
+                break
+        else:
+            bundles.append([task])
+            loads.append(task['predicted_s'])
+    return bundles
+
+
+def bundle_script(batch_dir: str, name: str, bundle: List[dict]) -> str:
+    """Bash script running the tasks of a bundle; exits non-zero if one of them failed."""
+    predicted = sum(task['predicted_s'] for task in bundle)
+    lines = [
+        "#!/bin/bash",
+        f"# Bundle {name}: {len(bundle)} tasks, predicted {predicted / 3600:.2f} h",
+        f"STATUS={shlex.quote(os.path.join(batch_dir, 'status'))}",
+        f"LOGS={shlex.quote(os.path.join(batch_dir, 'logs'))}",
+        "failed=0",
+        "",
+        "run_task() {  # task_id required_task_id command...",
+        "    local task_id=$1 requires=$2",
+        "    shift 2",
+        "    if [ \"$(cat \"$STATUS/$task_id\" 2>/dev/null)\" = completed ]; then",
+        "        return 0",
+        "    fi",
+        "    if [ -n \"$requires\" ] && [ \"$(cat \"$STATUS/$requires\" 2>/dev/null)\" != completed ]; then",
+        "        echo skipped > \"$STATUS/$task_id\"",
+        "        return 0",
+        "    fi",
+        "    \"$@\" > \"$LOGS/$task_id.log\" 2>&1",
+        "    local code=$?",
+        "    if [ $code -eq 0 ]; then",
+        "        echo completed > \"$STATUS/$task_id\"",
+        "    else",
+        "        echo \"failed $code\" > \"$STATUS/$task_id\"",
+        "        failed=1",
+        "    fi",
+        "}",
+        "",
+    ]
+    for task in bundle:
+        lines.append(f"run_task {shlex.quote(task['task_id'])} {shlex.quote(task.get('requires') or '')} "
+                     f"{shlex.join(task['command'])}")
+    lines += ["", "exit $failed", ""]
+    return "\n".join(lines)
+
+
+def _resources(bundles: List[List[dict]], time_margin: float, memory_margin: float) -> Dict[str, float]:
+    """Time (minutes), memory (MB) and disk (GB) one job of bundles needs at most."""
+    return {
+        "minutes": max(1, math.ceil(max(sum(task['predicted_s'] for task in bundle) for bundle in bundles)
+                                    * time_margin / 60)),
+        "memory_mb": math.ceil(max(task['memory_mb'] for bundle in bundles for task in bundle) * memory_margin),
+        "disk_gb": max(1, math.ceil(max(sum(task['output_bytes'] for task in bundle) for bundle in bundles) / 2**30) + 1),
+    }
+
+
+def _slurm_array(batch_dir: str, stage: str, count: int, resources: Dict, settings: Dict) -> str:
+    lines = [
+        "#!/bin/bash",
+        f"#SBATCH --job-name={settings.get('workflow', 'epic_sim')}_{stage}",
+        f"#SBATCH --array=0-{count - 1}",
+        f"#SBATCH --time={resources['minutes'] // 60:02d}:{resources['minutes'] % 60:02d}:00",
+        f"#SBATCH --mem={resources['memory_mb']}M",
+        "#SBATCH --cpus-per-task=1",
+        f"#SBATCH --output={os.path.join(batch_dir, 'logs', f'{stage}_%a.out')}",
+    ]
+    for option in ("account", "partition"):
+        if settings.get(option):
+            lines.append(f"#SBATCH --{option}={settings[option]}")
+    bundles = shlex.quote(os.path.join(batch_dir, "bundles"))
+    lines += ["", f"exec {bundles}/{stage}_$(printf %04d \"$SLURM_ARRAY_TASK_ID\").sh", ""]
+    return "\n".join(lines)
+
+
+def write_batch(batch_dir: str, stages: List[Tuple[str, List[dict]]], backend: str = "slurm",
+                settings: Dict = None) -> List[str]:
+    """
+    Write the bundle scripts and the submission of the stages of a run.
+
+    Args:
+        batch_dir: Directory of the scripts, statuses and task logs
+        stages: (stage, tasks) in dependency order; tasks are dicts with task_id, command
+            (argument list), predicted_s, memory_mb, output_bytes and optionally requires
+            (task_id of an earlier stage that has to be completed)
+        backend: slurm, swif2 or local
+        settings: target_wall_h, time_margin, memory_margin, workflow, account, partition
+
+    Returns:
+        List[str]: Paths of the bundle scripts
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown batch backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    settings = settings or {}
+    target_wall_s = settings.get('target_wall_h', TARGET_WALL_S / 3600) * 3600
+    time_margin = settings.get('time_margin', 1.5)
+    memory_margin = settings.get('memory_margin', 1.2)
+    workflow = settings.get('workflow', 'epic_sim')
+    for sub_dir in ("bundles", "status", "logs"):
+        os.makedirs(os.path.join(batch_dir, sub_dir), exist_ok=True)
+    # Bundles of an earlier export are replaced, the statuses stay so completed tasks are not rerun
+    for name in os.listdir(os.path.join(batch_dir, "bundles")):
+        os.remove(os.path.join(batch_dir, "bundles", name))
+
+    written = []
+    submit = ["#!/bin/bash", "set -e", f"cd {shlex.quote(batch_dir)}"]
+    if backend == "swif2":
+        submit.append(f"swif2 create -workflow {workflow}")
+    previous_job = None
+    for phase, (stage, tasks) in enumerate(stages, start=1):
+        if not tasks:
+            continue
+        bundles = pack(tasks, target_wall_s)
+        for index, bundle in enumerate(bundles):
+            path = os.path.join(batch_dir, "bundles", f"{stage}_{index:04d}.sh")
+            with open(path, 'w') as f:
+                f.write(bundle_script(batch_dir, f"{stage}_{index:04d}", bundle))
+            os.chmod(path, 0o755)
+            written.append(path)
+            if backend == "swif2":
+                resources = _resources([bundle], time_margin, memory_margin)
+                submit.append(
+                    f"swif2 add-job -workflow {workflow} -name {stage}_{index:04d} -phase {phase} "
+                    + (f"-account {settings['account']} " if settings.get('account') else "")
+                    + (f"-partition {settings['partition']} " if settings.get('partition') else "")
+                    + f"-cores 1 -ram {resources['memory_mb']}mb -disk {resources['disk_gb']}gb "
+                    f"-time {resources['minutes']}min {shlex.quote(path)}"
+                )
+        if backend == "slurm":
+            array_path = os.path.join(batch_dir, f"{stage}_array.sh")
+            with open(array_path, 'w') as f:
+                f.write(_slurm_array(batch_dir, stage, len(bundles),
+                                     _resources(bundles, time_margin, memory_margin), settings))
+            # Later stages start when the earlier array has ended, tasks whose input failed are skipped
+            dependency = f"--dependency=afterany:${previous_job} " if previous_job else ""
+            submit.append(f"{stage}=$(sbatch --parsable {dependency}{shlex.quote(array_path)})")
+            submit.append(f"echo \"{stage}: {len(bundles)} bundles, job ${stage}\"")
+            previous_job = stage
+    if backend == "swif2":
+        submit.append(f"swif2 run -workflow {workflow}")
+
+    if backend != "local":
+        path = os.path.join(batch_dir, "submit.sh")
+        with open(path, 'w') as f:
+            f.write("\n".join(submit) + "\n")
+        os.chmod(path, 0o755)
+    return written
+
+
+def _run_bundle(path: str) -> Tuple[str, int]:
+    return path, subprocess.run(["/bin/bash", path], capture_output=True).returncode
+
+
+def run_local(batch_dir: str, stages: List[str], workers: int, logger=None) -> Dict[str, str]:
+    """
+    Run the bundles written by write_batch in a process pool, one stage after the other.
+
+    Args:
+        batch_dir: Directory written by write_batch
+        stages: Stage names in dependency order
+        workers: Bundles run at the same time
+
+    Returns:
+        Dict[str, str]: Status of every task (read_status)
+    """
+    bundles = sorted(os.listdir(os.path.join(batch_dir, "bundles")))
+    for stage in stages:
+        paths = [os.path.join(batch_dir, "bundles", name) for name in bundles if name.rsplit("_", 1)[0] == stage]
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+            for path, returncode in executor.map(_run_bundle, paths):
+                if logger is not None:
+                    logger.info(f"Bundle {os.path.basename(path)} finished with exit code {returncode}")
+    return read_status(batch_dir)
+
+
+def read_status(batch_dir: str) -> Dict[str, str]:
+    """Recorded status of every task of the batch directory by task_id."""
+    status_dir = os.path.join(batch_dir, "status")
+    status = {}
+    for task_id in os.listdir(status_dir):
+        with open(os.path.join(status_dir, task_id), 'r') as f:
+            status[task_id] = f.read().strip()
+    return status
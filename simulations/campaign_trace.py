@@ -0,0 +1,113 @@
+"""
+Timeline of a simulation campaign in the Chrome Trace Event format.
+
+The written trace.json opens in chrome://tracing or https://ui.perfetto.dev.
+Every phase (detector copy/compile, HepMC generation, ddsim, eicrecon,
+merging) is a complete ("X") event; tasks run by a thread pool land on the
+row of their worker slot, so idle gaps and barriers between phases show up
+as empty stretches of the rows.
+"""
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+class TraceRecorder(object):
+    """
+    Thread-safe collector of trace spans.
+
+    Usage:
+        tracer = TraceRecorder()
+        with tracer.span("compile_epic", "prep", px_key="1.0x0.1"):
+            ...
+        tracer.write("trace.json")
+    """
+
+    def __init__(self) -> None:
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self._events: List[Dict] = []
+        self._slots: Dict[int, int] = {}  # thread ident -> row of threads not in a pool
+        self._lock = threading.Lock()
+
+    def _slot(self) -> int:
+        """
+        Row of the calling thread: 0 for the main thread, the pool worker index + 1
+        for ThreadPoolExecutor workers (so successive pools reuse the same rows).
+        """
+        thread = threading.current_thread()
+        if thread is threading.main_thread():
+            return 0
+        prefix, _, index = thread.name.rpartition("_")
+        if prefix.startswith("ThreadPoolExecutor") and index.isdigit():
+            return int(index) + 1
+        with self._lock:
+            return self._slots.setdefault(threading.get_ident(), 1000 + len(self._slots))
+
+    def add_span(self, name: str, category: str, start: float, end: float, **args) -> None:
+        """Record a span from start to end (time.time() seconds)."""
+        slot = self._slot()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": max(0.0, end - start) * 1e6,
+            "pid": self.pid,
+            "tid": slot,
+            "args": {"host": self.host, "worker_slot": slot, **args}
+        }
+        with self._lock:
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        """Record the duration of the with block, marking it failed if it raises."""
+        start = time.time()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = str(e)
+            raise
+        finally:
+            self.add_span(name, category, start, time.time(), **args)
+
+    def instant(self, name: str, category: str, **args) -> None:
+        """Record a point in time, e.g. a barrier between phases."""
+        slot = self._slot()
+        with self._lock:
+            self._events.append({
+                "name": name,
+                "cat": category,
+                "ph": "i",
+                "s": "p",
+                "ts": time.time() * 1e6,
+                "pid": self.pid,
+                "tid": slot,
+                "args": {"host": self.host, **args}
+            })
+
+    def write(self, path: str) -> str:
+        """
+        Write all events recorded so far as a Chrome Trace JSON file.
+
+        Returns:
+            str: The written path
+        """
+        with self._lock:
+            events = list(self._events)
+        slots = sorted(set(event["tid"] for event in events))
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid,
+                     "args": {"name": f"HandleSim {self.host}:{self.pid}"}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": slot,
+                      "args": {"name": "main" if slot == 0 else f"worker {slot}"}} for slot in slots]
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp_path, path)
+        return path
@@ -23,12 +23,13 @@ if len(os.listdir(genPath)) != 0:
   print("{0} directory not empty.  Clear directory".format(genPath))
   exit()
 
+# macros are compiled once with ACLiC ('+') and the library is reused by later calls
 for n in energies:
   ID = n # just the index of statistically independent sample
   if BH == 1: # BH E spectrum
-    cmd = "root -q 'lumi_particles.cxx(1e4,false,false,false,4,18,\"{1}/idealPhotonsAtIP_{0}.hepmc\")'".format(ID,genPath)
+    cmd = "root -q 'lumi_particles.cxx+(1e4,false,false,false,4,18,\"{1}/idealPhotonsAtIP_{0}.hepmc\")'".format(ID,genPath)
   else: # flat E spectrum
-    cmd = "root -q 'lumi_particles.cxx(1e4,true,false,false,{0},{0},\"{1}/idealPhotonsAtIP_{0}.hepmc\")'".format(ID,genPath)
+    cmd = "root -q 'lumi_particles.cxx+(1e4,true,false,false,{0},{0},\"{1}/idealPhotonsAtIP_{0}.hepmc\")'".format(ID,genPath)
 
   os.system(cmd)
 
@@ -37,7 +38,7 @@ for n in energies:
   os.system(cmd)
 
   # propagate to certain locations, specified as last argument
-  cmd = "root -b 'PropagateAndConvert.cxx(\"{1}/beamEffectsPhotonsAtIP_{0}.hepmc\",\"{1}/beamEffectsElectrons_{0}.hepmc\",{2})'".format(ID,genPath,location)
+  cmd = "root -b 'PropagateAndConvert.cxx+(\"{1}/beamEffectsPhotonsAtIP_{0}.hepmc\",\"{1}/beamEffectsElectrons_{0}.hepmc\",{2})'".format(ID,genPath,location)
   os.system(cmd)
-  cmd = "root -b 'PropagateAndConvert.cxx(\"{1}/idealPhotonsAtIP_{0}.hepmc\",\"{1}/idealElectrons_{0}.hepmc\",{2})'".format(ID,genPath,location)
+  cmd = "root -b 'PropagateAndConvert.cxx+(\"{1}/idealPhotonsAtIP_{0}.hepmc\",\"{1}/idealElectrons_{0}.hepmc\",{2})'".format(ID,genPath,location)
   os.system(cmd)
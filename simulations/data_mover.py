@@ -0,0 +1,225 @@
+"""
+Delta, locality-aware data movement between this machine and remote hosts.
+
+Remote hosts only get what their tasks need, staged right before the first
+task that needs it: the worker scripts, the detector variant of the task
+(sources; the install only when the host sees it at the same path, since
+it hard-codes that path) and its HepMC input. Transfers are rsync deltas
+with checksums and compression, several items in parallel streams, run as
+argument lists without a shell. Each task's outputs are pulled back as soon
+as the task completes, while the host keeps computing.
+
+Every push is recorded per host in a manifest under ~/.cache/epic_sim with
+the signature (sizes and modification times) of what was sent. An item that
+has not changed since is not transferred again, so a repeated run moves
+nothing; a new detector variant is sent relative to the last variant staged
+on the host (rsync --copy-dest), moving only the files that differ.
+Delete the host's manifest to force restaging after files were removed on
+the host.
+
+Local pseudo-hosts (local_transport.py) have their files on this machine:
+their transfers are rsync runs between local paths.
+"""
+import os
+import json
+import time
+import shlex
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List
+
+CACHE_DIR = "~/.cache/epic_sim"
+
+
+def path_signature(path: str) -> str:
+    """Sizes and modification times of a file or of every file below a directory."""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(file_path, path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class DataMover(object):
+    """
+    rsync transfers to and from the remote hosts of a run with a per-host manifest.
+
+    Usage:
+        mover = DataMover(username, ssh_command, streams=4)
+        mover.push(hostname, [(local_path, remote_path, excludes)], kind="variant")
+        mover.pull(hostname, remote_path, local_path)  # returns at once
+        mover.wait(hostname)
+    """
+
+    def __init__(self, username: str, ssh_command: str, streams: int = 4, compress: bool = True,
+                 checksum: bool = True, cache_dir: str = CACHE_DIR, local_hosts: List[str] = (),
+                 logger=None) -> None:
+        self.username = username
+        self.ssh_command = ssh_command
+        self.streams = max(1, streams)
+        self.compress = compress
+        self.checksum = checksum
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.local_hosts = set(local_hosts)
+        self.logger = logger
+        self.moved = {"pushed": 0, "skipped": 0, "pulled": 0}
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._lock = threading.Lock()
+        self._manifests: Dict[str, Dict] = {}
+        # Staging and fetching outputs have their own streams, so big outputs do not hold up staging
+        self._push_pool = ThreadPoolExecutor(max_workers=self.streams)
+        self._pull_pool = ThreadPoolExecutor(max_workers=self.streams)
+        self._pulls: Dict[str, List[Future]] = {}
+
+    def __getstate__(self) -> dict:
+        # Threads and locks stay in the coordinating process
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def _log(self, message: str, level: str = "info") -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    # Manifest of what each host has
+
+    def _manifest_path(self, hostname: str) -> str:
+        return os.path.join(self.cache_dir, f"staged_{hostname}.json")
+
+    def _manifest(self, hostname: str) -> Dict:
+        if hostname not in self._manifests:
+            try:
+                with open(self._manifest_path(hostname), 'r') as f:
+                    self._manifests[hostname] = json.load(f)
+            except (OSError, ValueError):
+                self._manifests[hostname] = {"items": {}, "last": {}}
+        return self._manifests[hostname]
+
+    def _save_manifest(self, hostname: str) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._manifest_path(hostname)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(self._manifests[hostname], f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    # Transfers
+
+    def _endpoint(self, hostname: str, path: str) -> str:
+        return path if hostname in self.local_hosts else f"{self.username}@{hostname}:{path}"
+
+    def _rsync(self, source: str, target: str, excludes: List[str] = (), checksum: bool = False,
+               copy_dest: str = None, remote_parent: str = None) -> None:
+        cmd = ["rsync", "-a", "--partial", "-e", self.ssh_command]
+        if self.compress:
+            cmd.append("-z")
+        if checksum:
+            cmd.append("--checksum")
+        if copy_dest:
+            cmd.append(f"--copy-dest={copy_dest}")
+        if remote_parent:
+            # Create the target's parent on the remote side in the same connection
+            cmd.append(f"--rsync-path=mkdir -p {shlex.quote(remote_parent)} && rsync")
+        cmd += [f"--exclude={pattern}" for pattern in excludes]
+        cmd += [source, target]
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+    def _push_one(self, hostname: str, local_path: str, remote_path: str, excludes: List[str], kind: str) -> bool:
+        signature = path_signature(local_path)
+        with self._lock:
+            manifest = self._manifest(hostname)
+            if manifest["items"].get(remote_path) == signature:
+                self.moved["skipped"] += 1
+                return False
+            copy_dest = manifest["last"].get(kind) if kind else None
+
+        is_dir = os.path.isdir(local_path)
+        source = local_path.rstrip("/") + "/" if is_dir else local_path
+        target = self._endpoint(hostname, remote_path.rstrip('/') + '/' if is_dir else remote_path)
+        parent = remote_path.rstrip("/") if is_dir else os.path.dirname(remote_path)
+        if hostname in self.local_hosts:
+            os.makedirs(parent, exist_ok=True)
+            parent = None
+        start = time.time()
+        try:
+            self._rsync(source, target, excludes, checksum=self.checksum,
+                        copy_dest=copy_dest if copy_dest != remote_path else None, remote_parent=parent)
+        except subprocess.CalledProcessError:
+            if not copy_dest:
+                raise
+            # The earlier copy may be gone from the host
+            self._rsync(source, target, excludes, checksum=self.checksum, remote_parent=parent)
+        self._log(f"Staged {local_path} on {hostname}:{remote_path} in {time.time() - start:.1f} s")
+
+        with self._lock:
+            manifest = self._manifest(hostname)
+            manifest["items"][remote_path] = signature
+            if kind:
+                manifest["last"][kind] = remote_path
+            self._save_manifest(hostname)
+            self.moved["pushed"] += 1
+        return True
+
+    def push(self, hostname: str, items: List, kind: str = None) -> int:
+        """
+        Send items to hostname in parallel streams, skipping those unchanged since they were last sent.
+
+        Args:
+            hostname: Remote host
+            items: (local_path, remote_path, excludes) tuples
+            kind: Items of this kind are sent relative to the last one of the kind on the host
+
+        Returns:
+            int: Number of items transferred
+        """
+        futures = [self._push_pool.submit(self._push_one, hostname, local, remote, list(excludes), kind)
+                   for local, remote, excludes in items]
+        return sum(1 for future in futures if future.result())
+
+    def pull(self, hostname: str, remote_path: str, local_path: str, excludes: List[str] = ()) -> Future:
+        """Fetch remote_path from hostname in the background (a remote_path ending in / is merged into local_path)."""
+        def fetch() -> None:
+            start = time.time()
+            is_dir = remote_path.endswith("/")
+            os.makedirs(local_path if is_dir else os.path.dirname(local_path), exist_ok=True)
+            self._rsync(self._endpoint(hostname, remote_path), local_path, excludes)
+            with self._lock:
+                self.moved["pulled"] += 1
+            self._log(f"Fetched {hostname}:{remote_path} in {time.time() - start:.1f} s", level="debug")
+
+        future = self._pull_pool.submit(fetch)
+        with self._lock:
+            self._pulls.setdefault(hostname, []).append(future)
+        return future
+
+    def wait(self, hostname: str = None) -> List[Exception]:
+        """
+        Wait for the pending pulls of hostname (of all hosts if None).
+
+        Returns:
+            List[Exception]: Errors of the pulls that failed
+        """
+        with self._lock:
+            hostnames = list(self._pulls) if hostname is None else [hostname]
+            pulls = [future for name in hostnames for future in self._pulls.pop(name, [])]
+        wait(pulls)
+        return [future.exception() for future in pulls if future.exception() is not None]
+
+    def close(self) -> None:
+        """Wait for the running transfers and stop the transfer threads."""
+        self._push_pool.shutdown(wait=True)
+        self._pull_pool.shutdown(wait=True)
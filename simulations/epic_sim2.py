@@ -11,12 +11,32 @@ import json
 import xml.etree.ElementTree as ET
 import subprocess
 import logging
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import time 
 import tempfile
+import hashlib
+import socket
+import argparse
+import functools
+import math
+import sqlite3
 from concurrent.futures import ThreadPoolExecutor
 
+from hepmc_store import HepMCStore
+from task_metrics import MetricsTable, run_measured
+from campaign_trace import TraceRecorder
+from progress import SIM_PROGRESS_ARGS, ProgressTracker, count_events
+from metrics_server import Counters, MetricsServer, host_load
+from log_pipeline import LogPipeline, TaskLogger, zstandard
+from phase_profile import PhaseProfiler
+from execution_report import build_report, task_records, write_report
+from run_catalog import CATALOG_FILE, RunCatalog
+from planner import DEFAULT_COST_MODEL, estimate, render_plan
+from host_calibration import CalibrationCache
+from batch_export import run_local, write_batch
+from host_broker import BROKER_DIR, HostBroker
+
 class HandleSim(object):
     """
     Handles particle accelerator simulation using ddsim and eicrecon commands.
@@ -27,7 +47,10 @@ class HandleSim(object):
     3. Optionally runs eicrecon reconstruction on simulation outputs
     """
 
-    def __init__(self) -> None:
+    # ROOT macros of the generation pipeline, compiled once per image with ACLiC
+    GENERATOR_MACROS = ["lumi_particles.cxx", "PropagateAndConvert.cxx"]
+
+    def __init__(self, profiler: PhaseProfiler = None) -> None:
         # Configuration paths
         self.settings_path: str = "simulation_settings.json"
         self.execution_path: str = os.getcwd()
@@ -56,6 +79,17 @@ class HandleSim(object):
         self.sif_path: str = ""  # Initialize sif_path
         self.plugin_path: str = ""  # Initialize plugin_path
         
+        # Shared HepMC input store, references are held under this run's id
+        self.hepmc_store: HepMCStore = None
+        self.metrics_table: MetricsTable = None
+        self.tracer = TraceRecorder()  # timeline of all phases, written to trace.json
+        self.progress: ProgressTracker = None  # live task progress during exec_sim
+        self.broker: HostBroker = None  # task slots shared with the other runs on this host during exec_sim
+        self.counters = Counters()  # container starts, cache hits, ... for the metrics endpoint
+        self.metrics_server: MetricsServer = None
+        self.profiler = profiler or PhaseProfiler()  # cProfile/tracemalloc per phase with --profile
+        self.run_id: str = f"{socket.gethostname()}:{os.getpid()}:{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
         # Check if running inside Singularity container
         self.inside_singularity = self.is_inside_singularity()
         self.eic_shell_path = ""  # Path to EIC shell script, used when inside Singularity
@@ -92,7 +126,8 @@ class HandleSim(object):
         ]
         
         # load settings from JSON
-        self.load_settings()
+        with self.profiler.phase("load_settings"):
+            self.load_settings()
         
         # Now initialize logging after settings are loaded
         self.init_logger()
@@ -146,37 +181,28 @@ class HandleSim(object):
         """
         Initialize the logger after settings are loaded, with improved formatting.
         """
-        self.logger = logging.getLogger("main_logger")
-        self.logger.setLevel(logging.DEBUG)
-        
-        # Clear any existing handlers
-        self.logger.handlers = []
-        
-        # Create custom formatter without color codes
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        
         # Create directory structure for log file
         log_dir = os.path.join(self.execution_path, "simEvents", 
                               datetime.now().strftime("%Y%m%d_%H%M%S"))
         os.makedirs(log_dir, exist_ok=True)
         
-        # Add file handler - now using backup_path
+        # One queue-based pipeline for the main log and all task logs (see log_pipeline.py)
         self.overview_log_path = os.path.join(log_dir, "overview.log")
-        file_handler = logging.FileHandler(self.overview_log_path, mode="w")
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
+        self.log_pipeline = LogPipeline(
+            self.overview_log_path,
+            console=self.enable_console_logging,
+            max_open_files=self.settings_dict.get('log_max_open_files', 64),
+            compress_task_logs=self.settings_dict.get('compress_task_logs', False)
+        )
+        self.logger = self.log_pipeline.main_logger
         
         # Store the backup path for later use
         self.backup_path = log_dir
         
-        # Add console handler if enabled, with plain formatting
         if self.enable_console_logging:  # Use the new variable name
-            console_handler = logging.StreamHandler()
-            console_handler.setLevel(logging.DEBUG)
-            console_handler.setFormatter(formatter)
-            self.logger.addHandler(console_handler)
             print("Console logging enabled.")  # Use print since logger isn't ready yet
+        if self.settings_dict.get('compress_task_logs', False) and zstandard is None:
+            self.printlog("compress_task_logs is set but zstandard is not installed, task logs stay uncompressed", level="warning")
 
     def load_settings(self) -> None:
         """
@@ -381,169 +407,455 @@ class HandleSim(object):
         
         # Check for missing files by looping through all combinations
         missing_files = []
-        for energy in self.energy_levels:
+        for energy in self.generation_keys():
             for file_type in self.simulation_types:
                 files_to_check = [
                     f"idealPhotonsAtIP_{energy}.hepmc",
-                    f"{file_type}_{energy}.hepmc"
+                    self.input_file_name(file_type, energy)
                 ]
                 if file_type == "beamEffectsElectrons":
                     files_to_check.append(f"beamEffectsPhotonsAtIP_{energy}.hepmc")
                 
                 for hepmc_file in files_to_check:
                     if not os.path.exists(os.path.join(self.hepmc_input_path, hepmc_file)):
+                        self.counters.inc("cache_misses_total", cache="hepmc")
                         missing_files.append((energy, file_type))
                         break  # If any file is missing for this energy/type combo, we need to regenerate
+                    self.counters.inc("cache_hits_total", cache="hepmc")
         
         if missing_files:
             self.printlog(f"Missing files for energy/type combinations: {missing_files}", level="info")
-            self.create_hepmc(missing_files)
+            with self.tracer.span("hepmc_generation", "generation",
+                                  energies=sorted(set(str(energy) for energy, _ in missing_files))):
+                self.create_hepmc(missing_files)
         else:
             self.printlog("All required hepmc files found.", level="info")
+        
+        # Reference the inputs of this run so they are not garbage collected underneath it;
+        # a file collected by another run since the check above is generated again
+        used_files = {
+            self.input_file_name(file_type, energy): (energy, file_type)
+            for energy in self.generation_keys()
+            for file_type in self.simulation_types
+        }
+        missing = self.get_hepmc_store().add_refs(self.run_id, list(used_files))
+        if missing:
+            self.printlog(f"HepMC inputs removed by another run's garbage collection: {missing}", level="warning")
+            self.create_hepmc([used_files[name] for name in missing])
+            missing = self.get_hepmc_store().add_refs(self.run_id, missing)
+            if missing:
+                raise RuntimeError(f"HepMC inputs could not be regenerated: {missing}")
+
+    def get_campaign(self) -> Dict:
+        """
+        Continuous-spectrum campaign settings, None when running discrete energies.
+
+        A campaign generates one wide photon spectrum covering all energy_levels,
+        simulates it in evenly sized shards and splits the reconstructed
+        histograms back into per-energy files by true photon energy.
+        """
+        campaign = self.settings_dict.get('campaign') or {}
+        if not campaign.get('enabled', False):
+            return None
+        bin_width = float(campaign.get('bin_width', 1.0))
+        spectrum = campaign.get('spectrum', 'flat')
+        if spectrum not in ("flat", "bh"):
+            raise ValueError(f"Unknown campaign spectrum '{spectrum}', expected 'flat' or 'bh'")
+        energy_min = campaign.get('energy_min')
+        energy_min = float(energy_min if energy_min is not None else min(self.energy_levels) - bin_width / 2)
+        energy_max = campaign.get('energy_max')
+        energy_max = float(energy_max if energy_max is not None else max(self.energy_levels) + bin_width / 2)
+        # The spectrum covers every bin_width window of the range, not only those of energy_levels:
+        # particle_count per window gives each split file the statistics of a discrete run (on a flat spectrum)
+        events = campaign.get('events') or math.ceil(self.particle_count * (energy_max - energy_min) / bin_width)
+        return {
+            "spectrum": spectrum,
+            "energy_min": energy_min,
+            "energy_max": energy_max,
+            "events": int(events),
+            "shards": max(1, int(campaign.get('shards', 10))),
+            "bin_width": bin_width
+        }
+
+    def campaign_key(self) -> str:
+        """Label used in place of the energy in the file names of a campaign, e.g. flat4.5-30.5GeV."""
+        campaign = self.get_campaign()
+        return f"{campaign['spectrum']}{campaign['energy_min']:g}-{campaign['energy_max']:g}GeV"
+
+    def generation_keys(self) -> List:
+        """Energies (or the campaign label) a generation chain is produced for."""
+        if self.get_campaign() is not None:
+            return [self.campaign_key()]
+        return list(self.energy_levels)
+
+    def _generator_args(self, energy) -> str:
+        """lumi_particles arguments n_events, flat, convert, displaceVertices, Egamma_start, Egamma_end."""
+        campaign = self.get_campaign()
+        if campaign is not None and energy == self.campaign_key():
+            flat = "true" if campaign['spectrum'] == "flat" else "false"
+            return (f"{campaign['events']},{flat},false,false,"
+                    f"{campaign['energy_min']},{campaign['energy_max']}")
+        return f"{self.particle_count},true,false,false,{energy},{energy}"
+
+    def get_hepmc_store(self) -> HepMCStore:
+        """Shared store wrapping hepmc_input_path, created on first use."""
+        if self.hepmc_store is None:
+            self.hepmc_store = HepMCStore(self.hepmc_input_path, logger=self.logger)
+        return self.hepmc_store
+
+    def release_hepmc_inputs(self) -> None:
+        """
+        Drop this run's references on the shared HepMC inputs and garbage collect
+        unreferenced files older than 'hepmc_gc_days' (if set).
+        """
+        store = self.get_hepmc_store()
+        store.release_refs(self.run_id)
+        gc_days = self.settings_dict.get('hepmc_gc_days')
+        if gc_days:
+            removed = store.garbage_collect(float(gc_days))
+            self.printlog(f"Removed {len(removed)} unused HepMC inputs older than {gc_days} days", level="info")
+
+    def get_prefilter(self) -> Dict[str, float]:
+        """
+        Generator-level fiducial prefilter applied by PropagateAndConvert, None if disabled.
+
+        Events whose conversion vertex lies outside the envelope (or whose
+        leptons are below min_lepton_energy_gev) are dropped before ddsim.
+        """
+        prefilter = self.settings_dict.get('prefilter') or {}
+        if not prefilter.get('enabled', False):
+            return None
+        return {
+            "envelope_x_mm": float(prefilter.get('envelope_x_mm', 100.0)),
+            "envelope_y_mm": float(prefilter.get('envelope_y_mm', 100.0)),
+            "min_lepton_energy_gev": float(prefilter.get('min_lepton_energy_gev', 0.001))
+        }
+
+    def input_file_name(self, file_type: str, energy) -> str:
+        """
+        Name of the HepMC file simulated for file_type at energy.
+
+        Prefiltered electron files carry a tag of the prefilter parameters so
+        differently filtered samples can share hepmc_input_path.
+        """
+        prefilter = self.get_prefilter()
+        if prefilter is None or not file_type.endswith("Electrons"):
+            return f"{file_type}_{energy}.hepmc"
+        tag = hashlib.sha1(json.dumps(prefilter, sort_keys=True).encode()).hexdigest()[:8]
+        return f"{file_type}_{energy}_pf{tag}.hepmc"
+
+    def prefilter_stats_path(self, file_type: str, energy) -> str:
+        """Stem of the generated/kept spectra (.root and .json) written next to a prefiltered file."""
+        name = os.path.splitext(self.input_file_name(file_type, energy))[0]
+        return self.get_hepmc_store().path(f"{name}.prefilter")
+
+    def _hepmc_chain_files(self, energy) -> List[str]:
+        """All files generated by the createGenFiles.py chain for one energy."""
+        return [
+            f"idealPhotonsAtIP_{energy}.hepmc",
+            f"beamEffectsPhotonsAtIP_{energy}.hepmc",
+            self.input_file_name("idealElectrons", energy),
+            self.input_file_name("beamEffectsElectrons", energy)
+        ]
 
     def create_hepmc(self, missing_files: List[Tuple[int, str]]) -> None:
         """
         Create missing hepmc files following createGenFiles.py workflow exactly.
         Executes root commands inside singularity container.
+
+        hepmc_input_path may be shared by several concurrent runs: each energy's
+        files are only produced by the run holding their locks, the others wait
+        for it and then reuse the committed files.
         """
         self.printlog("Creating missing hepmc files...", level="info")
         
+        # Create results directory if it doesn't exist
+        os.makedirs(self.hepmc_input_path, exist_ok=True)
+        store = self.get_hepmc_store()
+        
+        pending = sorted(set(energy for energy, _ in missing_files))  # Process each energy once
+        for attempt in range(3):
+            owned, deferred = {}, {}
+            for energy in pending:
+                claimed, busy = store.try_claim(self._hepmc_chain_files(energy))
+                if busy:
+                    deferred[energy] = busy
+                elif claimed:
+                    owned[energy] = claimed
+            
+            try:
+                if owned:
+                    self._produce_hepmc_chains(sorted(owned))
+            finally:
+                for claimed in owned.values():
+                    store.release(claimed)
+            
+            if not deferred:
+                break
+            
+            self.printlog(f"Energies {sorted(deferred)} are being generated by another run, waiting for it...", level="info")
+            for busy in deferred.values():
+                store.wait_for(busy)
+            
+            # The other producer may have failed, retry whatever is still missing
+            pending = [
+                energy for energy in sorted(deferred)
+                if not all(store.exists(name) for name in self._hepmc_chain_files(energy))
+            ]
+            if not pending:
+                break
+        else:
+            raise RuntimeError(f"HepMC files for energies {pending} could not be produced")
+
+    def _produce_hepmc_chains(self, energies: List[int]) -> None:
+        """
+        Generate the missing files of the given energies (locks must be held).
+
+        The generator macros are run from precompiled ACLiC libraries (see
+        compile_generator_macros) and every energy of a generation step is
+        processed in a single ROOT session. Outputs are written to temp names
+        and only renamed to their final name once complete.
+        """
+        store = self.get_hepmc_store()
+        
         # Get location from settings
         location = self.settings_dict.get('location', 'POS.ConvMiddle')
         
-        # Create results directory if it doesn't exist
-        os.makedirs(self.hepmc_input_path, exist_ok=True)
+        # Compile (or reuse) the generator libraries
+        with self.tracer.span("compile_generator_macros", "generation"):
+            libraries = self.compile_generator_macros()
+        
+        # Step 1: Create ideal photons for all energies in one ROOT session
+        statements, outputs = [], []
+        for energy in energies:
+            name = f"idealPhotonsAtIP_{energy}.hepmc"
+            if not store.exists(name):
+                temp_file = store.temp_path(name)
+                outputs.append((name, temp_file))
+                statements.append(
+                    f"lumi_particles({self._generator_args(energy)},\"{temp_file}\",false);"
+                )
+            else:
+                self.printlog(f"Using existing ideal photons file for {energy} GeV", level="info")
+        
+        if statements:
+            self.printlog(f"Generating ideal photons for {len(statements)} energies...", level="info")
+            self._run_root_session(libraries, statements, "generate ideal photons", outputs)
+            self._commit_outputs(outputs)
+        
+        # Step 2: Create beam effects version (abconv is a separate executable, one call per energy)
+        macro_dir = os.path.dirname(os.path.abspath(__file__))
+        for energy in energies:
+            name = f"beamEffectsPhotonsAtIP_{energy}.hepmc"
+            if store.exists(name):
+                self.printlog(f"Using existing beam effects file for {energy} GeV", level="info")
+                continue
+            
+            self.printlog(f"Generating beam effects photons for {energy} GeV...", level="info")
+            ideal_photons_file = store.path(f"idealPhotonsAtIP_{energy}.hepmc")
+            temp_file = store.temp_path(name)
+            abconv_cmd = f"cd {macro_dir} && abconv {ideal_photons_file} --plot-off -o {os.path.splitext(temp_file)[0]}"
+            with self.tracer.span("abconv", "generation", energy=str(energy)):
+                result = subprocess.run(self._generation_cmd(abconv_cmd), capture_output=True, text=True)
+            if result.returncode != 0:
+                store.discard(temp_file)
+                raise RuntimeError(f"Failed to generate beam effects photons: {result.stderr}")
+            
+            self._commit_outputs([(name, temp_file)])
+            self.printlog(f"Generated beam effects photons for {energy} GeV", level="info")
+        
+        # Step 3: Propagate both versions to electrons, again in one ROOT session
+        prefilter = self.get_prefilter()
+        statements, outputs = [], []
+        for energy in energies:
+            for photon_type in ["ideal", "beamEffects"]:
+                input_file = store.path(f"{photon_type}PhotonsAtIP_{energy}.hepmc")
+                name = self.input_file_name(f"{photon_type}Electrons", energy)
+                
+                if not store.exists(name):
+                    temp_file = store.temp_path(name)
+                    outputs.append((name, temp_file))
+                    if prefilter is None:
+                        statements.append(
+                            f"PropagateAndConvert(\"{input_file}\",\"{temp_file}\",{location},false);"
+                        )
+                    else:
+                        # The generated/kept spectra are written before the events are committed
+                        stats = self.prefilter_stats_path(f"{photon_type}Electrons", energy)
+                        statements.append(
+                            f"PropagateAndConvert(\"{input_file}\",\"{temp_file}\",{location},false,"
+                            f"true,{prefilter['envelope_x_mm']},{prefilter['envelope_y_mm']},"
+                            f"{prefilter['min_lepton_energy_gev']},\"{stats}\");"
+                        )
+                else:
+                    self.printlog(f"Using existing {photon_type} electrons file for {energy} GeV", level="info")
+        
+        if statements:
+            self.printlog(f"Propagating {len(statements)} photon files to electrons...", level="info")
+            self._run_root_session(libraries, statements, "propagate photons", outputs)
+            self._commit_outputs(outputs)
+            if prefilter is not None:
+                self._log_prefilter_stats(energies)
+        
+        self.printlog(f"Successfully processed energy levels: {energies}", level="info")
+
+    def _log_prefilter_stats(self, energies: List[int]) -> None:
+        """Log how many generated events each prefiltered electron file kept."""
+        for energy in energies:
+            for file_type in ["idealElectrons", "beamEffectsElectrons"]:
+                stats_file = f"{self.prefilter_stats_path(file_type, energy)}.json"
+                if not os.path.exists(stats_file):
+                    self.printlog(f"Prefilter statistics not found: {stats_file}", level="warning")
+                    continue
+                with open(stats_file, 'r') as f:
+                    stats = json.load(f)
+                fraction = stats['kept'] / stats['generated'] if stats['generated'] else 0.0
+                self.printlog(
+                    f"Prefilter {file_type} {energy} GeV: kept {stats['kept']} of {stats['generated']} events ({fraction:.1%})",
+                    level="info"
+                )
+
+    def _commit_outputs(self, outputs: List[Tuple[str, str]]) -> None:
+        """Publish finished temp files in the HepMC store, failing if any was not produced."""
+        store = self.get_hepmc_store()
+        missing = [name for name, temp_file in outputs if not os.path.exists(temp_file)]
+        if missing:
+            for _, temp_file in outputs:
+                store.discard(temp_file)
+            raise RuntimeError(f"HepMC files not created: {missing}")
+        for name, temp_file in outputs:
+            store.commit(name, temp_file)
+
+    def _generation_cmd(self, shell_cmd: str) -> List[str]:
+        """
+        Wrap a shell command of the generation pipeline so it runs in the eic-shell environment.
+        """
+        if self.inside_singularity:
+            # Direct execution when inside Singularity
+            return ["/bin/bash", "-c", shell_cmd]
         
-        # Get the directory containing the macro files
+        # Execution using Singularity when outside
+        self.counters.inc("container_starts_total", stage="generation")
         macro_dir = os.path.dirname(os.path.abspath(__file__))
-        # Get the project root directory (parent of simulations)
         project_root = os.path.dirname(macro_dir)
-        utilities_dir = os.path.join(project_root, "utilities")
+        cmd = ["singularity", "exec", "--containall"]
+        for path in [self.hepmc_input_path, macro_dir, project_root, self.detector_path, self._macro_cache_root()]:
+            cmd += ["--bind", f"{path}:{path}"]
+        if self.backup_path:
+            cmd += ["--bind", f"{self.backup_path}:{self.backup_path}"]
+        return cmd + [self.singularity_image_path, "/bin/bash", "-c", shell_cmd]
+
+    def _macro_cache_root(self) -> str:
+        """Directory holding the compiled generator libraries, shared between runs."""
+        cache_root = self.settings_dict.get('macro_cache_path') or \
+            os.path.join(os.path.expanduser("~"), ".cache", "epic_sim", "macros")
+        os.makedirs(cache_root, exist_ok=True)
+        return cache_root
+
+    def _image_identity(self) -> str:
+        """
+        Identify the container image the macros are compiled against.
         
-        # Validate required macro files exist
-        required_files = ["lumi_particles.cxx", "PropagateAndConvert.cxx"]
-        for file in required_files:
-            if not os.path.exists(os.path.join(macro_dir, file)):
-                raise FileNotFoundError(f"{file} not found in scripts directory: {macro_dir}")
+        Uses path, size and modification time instead of hashing the (multi-GB) image.
+        """
+        image = os.environ.get('SINGULARITY_CONTAINER', '') if self.inside_singularity else self.singularity_image_path
+        if image and os.path.exists(image):
+            stat = os.stat(image)
+            return f"{os.path.realpath(image)}:{stat.st_size}:{int(stat.st_mtime)}"
+        return image or "no-image"
+
+    def compile_generator_macros(self) -> Dict[str, str]:
+        """
+        Compile lumi_particles.cxx and PropagateAndConvert.cxx with ACLiC into cached shared libraries.
         
-        # Validate constants.h exists
-        if not os.path.exists(os.path.join(utilities_dir, "constants.h")):
-            raise FileNotFoundError(f"constants.h not found in utilities directory: {utilities_dir}")
+        Libraries are keyed by the hash of the macro sources, utilities/constants.h and the
+        container image, so they are built once per image and reused by every later run.
+        
+        Returns:
+            Dict[str, str]: Macro name -> path of the compiled library
+        """
+        macro_dir = os.path.dirname(os.path.abspath(__file__))
+        utilities_dir = os.path.join(os.path.dirname(macro_dir), "utilities")
         
-        # Process each missing energy/type combination
-        for energy, _ in set(missing_files):  # Use set to process each energy once
+        # Validate required macro files exist
+        sources = [os.path.join(macro_dir, file) for file in self.GENERATOR_MACROS]
+        sources.append(os.path.join(utilities_dir, "constants.h"))
+        for source in sources:
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"{os.path.basename(source)} not found: {source}")
+        
+        # Cache key from sources and container image
+        digest = hashlib.sha256()
+        for source in sources:
+            with open(source, 'rb') as f:
+                digest.update(f.read())
+        digest.update(self._image_identity().encode())
+        cache_root = self._macro_cache_root()
+        cache_dir = os.path.join(cache_root, digest.hexdigest()[:16])
+        
+        libraries = {
+            os.path.splitext(file)[0]: os.path.join(cache_dir, "simulations", file.replace(".cxx", "_cxx.so"))
+            for file in self.GENERATOR_MACROS
+        }
+        if all(os.path.exists(lib) for lib in libraries.values()):
+            self.printlog(f"Using cached generator libraries from {cache_dir}", level="info")
+            self.counters.inc("cache_hits_total", cache="macros")
+            return libraries
+        self.counters.inc("cache_misses_total", cache="macros")
+        
+        # Build in a private staging copy (keeping the ../utilities include layout) and publish atomically
+        self.printlog(f"Compiling generator macros into {cache_dir}", level="info")
+        staging_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(cache_dir)}.", dir=cache_root)
+        try:
+            os.makedirs(os.path.join(staging_dir, "simulations"))
+            os.makedirs(os.path.join(staging_dir, "utilities"))
+            for file in self.GENERATOR_MACROS:
+                shutil.copy2(os.path.join(macro_dir, file), os.path.join(staging_dir, "simulations", file))
+            shutil.copy2(os.path.join(utilities_dir, "constants.h"), os.path.join(staging_dir, "utilities", "constants.h"))
+            
+            compile_args = " ".join(
+                f"-e 'if (gSystem->CompileMacro(\"{file}\", \"kO\") != 1) gSystem->Exit(1);'"
+                for file in self.GENERATOR_MACROS
+            )
+            root_cmd = f"cd {os.path.join(staging_dir, 'simulations')} && root -b -q {compile_args}"
+            result = subprocess.run(self._generation_cmd(root_cmd), capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to compile generator macros: {result.stderr}")
+            
             try:
-                self.printlog(f"\nProcessing energy level: {energy} GeV", level="info")
-                
-                # Step 1: Create ideal photons
-                ideal_photons_file = os.path.join(self.hepmc_input_path, f"idealPhotonsAtIP_{energy}.hepmc")
-                if not os.path.exists(ideal_photons_file):
-                    self.printlog("Generating ideal photons...", level="info")
-                    
-                    root_cmd = f"cd {macro_dir} && root -b -q 'lumi_particles.cxx({self.particle_count},true,false,false,{energy},{energy},\"{ideal_photons_file}\")'"
-                    
-                    if self.inside_singularity:
-                        # Direct execution when inside Singularity
-                        cmd = ["/bin/bash", "-c", root_cmd]
-                    else:
-                        # Execution using Singularity when outside
-                        cmd = [
-                            "singularity", "exec", "--containall",
-                            "--bind", f"{self.hepmc_input_path}:{self.hepmc_input_path}",
-                            "--bind", f"{macro_dir}:{macro_dir}",
-                            "--bind", f"{project_root}:{project_root}",
-                            "--bind", f"{self.detector_path}:{self.detector_path}",
-                            self.singularity_image_path,
-                            "/bin/bash", "-c", root_cmd
-                        ]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode != 0:
-                        raise RuntimeError(f"Failed to generate ideal photons: {result.stderr}")
-                    
-                    if not os.path.exists(ideal_photons_file):
-                        raise RuntimeError(f"Ideal photons file not created: {ideal_photons_file}")
-                    
-                    self.printlog(f"Generated ideal photons for {energy} GeV", level="info")
-                else:
-                    self.printlog(f"Using existing ideal photons file for {energy} GeV", level="info")
-                
-                # Step 2: Create beam effects version
-                beam_effects_file = os.path.join(self.hepmc_input_path, f"beamEffectsPhotonsAtIP_{energy}.hepmc")
-                if not os.path.exists(beam_effects_file):
-                    self.printlog("Generating beam effects photons...", level="info")
-                    
-                    # Create the command to run inside singularity - match createGenFiles.py exactly
-                    abconv_cmd = f"cd {macro_dir} && abconv {ideal_photons_file} --plot-off -o {os.path.splitext(beam_effects_file)[0]}"
-                    
-                    if self.inside_singularity:
-                        # Direct execution when inside Singularity
-                        cmd = ["/bin/bash", "-c", abconv_cmd]
-                    else:
-                        # Execution using Singularity when outside
-                        cmd = [
-                            "singularity", "exec", "--containall",
-                            "--bind", f"{self.hepmc_input_path}:{self.hepmc_input_path}",
-                            "--bind", f"{macro_dir}:{macro_dir}",
-                            "--bind", f"{project_root}:{project_root}",
-                            "--bind", f"{self.detector_path}:{self.detector_path}",
-                            self.singularity_image_path,
-                            "/bin/bash", "-c", abconv_cmd
-                        ]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode != 0:
-                        raise RuntimeError(f"Failed to generate beam effects photons: {result.stderr}")
-                    
-                    if not os.path.exists(beam_effects_file):
-                        raise RuntimeError(f"Beam effects file not created: {beam_effects_file}")
-                    
-                    self.printlog(f"Generated beam effects photons for {energy} GeV", level="info")
-                else:
-                    self.printlog(f"Using existing beam effects file for {energy} GeV", level="info")
-                
-                # Step 3: Propagate both versions to electrons
-                for photon_type in ["ideal", "beamEffects"]:
-                    input_file = os.path.join(self.hepmc_input_path, f"{photon_type}PhotonsAtIP_{energy}.hepmc")
-                    output_file = os.path.join(self.hepmc_input_path, f"{photon_type}Electrons_{energy}.hepmc")
-                    
-                    if not os.path.exists(output_file):
-                        self.printlog(f"Propagating {photon_type} photons to electrons...", level="info")
-                        
-                        # Create the command to run inside singularity - match createGenFiles.py exactly
-                        prop_cmd = f"cd {macro_dir} && root -b -q 'PropagateAndConvert.cxx(\"{input_file}\",\"{output_file}\",{location})'"
-                        
-                        if self.inside_singularity:
-                            # Direct execution when inside Singularity
-                            cmd = ["/bin/bash", "-c", prop_cmd]
-                        else:
-                            # Execution using Singularity when outside
-                            cmd = [
-                                "singularity", "exec", "--containall",
-                                "--bind", f"{self.hepmc_input_path}:{self.hepmc_input_path}",
-                                "--bind", f"{macro_dir}:{macro_dir}",
-                                "--bind", f"{project_root}:{project_root}",
-                                "--bind", f"{self.detector_path}:{self.detector_path}",
-                                self.singularity_image_path,
-                                "/bin/bash", "-c", prop_cmd
-                            ]
-                        
-                        result = subprocess.run(cmd, capture_output=True, text=True)
-                        if result.returncode != 0:
-                            raise RuntimeError(f"Failed to propagate {photon_type} photons: {result.stderr}")
-                        
-                        if not os.path.exists(output_file):
-                            raise RuntimeError(f"Electron file not created: {output_file}")
-                        
-                        self.printlog(f"Generated {photon_type} electrons for {energy} GeV", level="info")
-                    else:
-                        self.printlog(f"Using existing {photon_type} electrons file for {energy} GeV", level="info")
-                
-                self.printlog(f"Successfully processed energy level {energy} GeV", level="info")
-                
-            except Exception as e:
-                self.printlog(f"Error processing energy {energy}: {str(e)}", level="error")
-                raise
+                os.rename(staging_dir, cache_dir)
+            except OSError:
+                # Another run published the same key first, use theirs
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        except Exception as e:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            self.printlog(f"Error compiling generator macros: {e}", level="error")
+            raise
+        
+        for lib in libraries.values():
+            if not os.path.exists(lib):
+                raise RuntimeError(f"Compiled generator library not found: {lib}")
+        return libraries
+
+    def _run_root_session(self, libraries: Dict[str, str], statements: List[str], description: str,
+                          outputs: List[Tuple[str, str]] = None) -> None:
+        """
+        Load the compiled generator libraries and run all statements in one ROOT process.
+        
+        Temp files listed in outputs are removed if the session fails.
+        """
+        macro_dir = os.path.dirname(os.path.abspath(__file__))
+        loads = [f"gSystem->Load(\"{lib}\");" for lib in libraries.values()]
+        root_args = " ".join(f"-e '{statement}'" for statement in loads + statements)
+        root_cmd = f"cd {macro_dir} && root -b -q {root_args}"
+        
+        self.printlog(f"ROOT session ({description}): {root_cmd}", level="debug")
+        with self.tracer.span(description, "generation", statements=len(statements)):
+            result = subprocess.run(self._generation_cmd(root_cmd), capture_output=True, text=True)
+        if result.returncode != 0:
+            for _, temp_file in outputs or []:
+                self.get_hepmc_store().discard(temp_file)
+            raise RuntimeError(f"Failed to {description}: {result.stderr}")
 
     def _run_command_in_singularity(self, cmd: str, work_dir: str) -> None:
         """
@@ -626,18 +938,21 @@ class HandleSim(object):
             try:
                 # 1. Copy detector
                 os.makedirs(curr_sim_path, exist_ok=True)
-                curr_sim_det_path = self.copy_epic(curr_sim_path)
+                with self.tracer.span("copy_epic", "prep", px_key=px_key):
+                    curr_sim_det_path = self.copy_epic(curr_sim_path)
                 
                 # 2. Modify detector settings for this pixel pair
-                self.mod_detector_settings(curr_sim_det_path, curr_px_dx, curr_px_dy)
+                with self.tracer.span("mod_detector_settings", "prep", px_key=px_key):
+                    self.mod_detector_settings(curr_sim_det_path, curr_px_dx, curr_px_dy)
                 
                 # 3. Compile detector after modifications
-                self.compile_epic(curr_sim_det_path)
+                with self.tracer.span("compile_epic", "prep", px_key=px_key):
+                    self.compile_epic(curr_sim_det_path)
                 
                 # Secondary loop: file types
                 for file_type in self.simulation_types:
-                    # Tertiary loop: energies
-                    for energy in self.energy_levels:
+                    # Tertiary loop: energies (or the campaign spectrum)
+                    for energy in self.generation_keys():
                         self._setup_simulation_for_config(
                             curr_sim_path,
                             curr_sim_det_path,
@@ -654,15 +969,11 @@ class HandleSim(object):
                                    file_type: str, energy: int) -> None:
         """Setup simulation for a specific configuration."""
         # Verify input file exists
-        input_file = os.path.join(self.hepmc_input_path, f"{file_type}_{energy}.hepmc")
+        input_file = os.path.join(self.hepmc_input_path, self.input_file_name(file_type, energy))
         if not os.path.exists(input_file):
             self.printlog(f"Warning: Input file not found: {input_file}", level="warning")
             return
 
-        # Setup paths
-        sim_output = os.path.join(sim_path, f"output_{file_type}_{energy}edm4hep.root")
-        os.makedirs(os.path.dirname(sim_output), exist_ok=True)
-
         # Add to simulation dictionary
         if px_key not in self.sim_dict:
             self.sim_dict[px_key] = {
@@ -672,36 +983,136 @@ class HandleSim(object):
                 "sim_shell_path": os.path.join(det_path, "install/bin/thisepic.sh"),
                 "ddsim_cmds": [],
                 "recon_cmds": [] if self.enable_reconstruction else None,
-                "task_ids": []
+                "task_ids": [],
+                "task_info": [],  # file type, energy, shard and output files of each task
+                "campaign_outputs": {}
             }
 
-        # Generate commands
-        task_id = f"{px_key}_{file_type}_{energy}"
-        self.sim_dict[px_key]["task_ids"].append(task_id)
-        
-        # Add ddsim command
-        ddsim_cmd = self.get_ddsim_cmd(input_file, sim_output, 
-                                      self.sim_dict[px_key]["sim_ip6_path"])
-        self.sim_dict[px_key]["ddsim_cmds"].append(ddsim_cmd)
+        campaign = self.get_campaign()
+        for shard_key, shard, skip_events, n_events in self.task_shards(file_type, energy):
+            # Setup paths
+            sim_output = os.path.join(sim_path, f"output_{file_type}_{shard_key}edm4hep.root")
+            os.makedirs(os.path.dirname(sim_output), exist_ok=True)
+
+            # Generate commands
+            task_id = f"{px_key}_{file_type}_{shard_key}"
+            self.sim_dict[px_key]["task_ids"].append(task_id)
+            task_info = {"file_type": file_type, "energy": energy, "shard": shard, "sim_output": sim_output}
+            self.sim_dict[px_key]["task_info"].append(task_info)
+            
+            # Add ddsim command
+            ddsim_cmd = self.get_ddsim_cmd(input_file, sim_output, 
+                                          self.sim_dict[px_key]["sim_ip6_path"],
+                                          n_events=n_events, skip_events=skip_events)
+            self.sim_dict[px_key]["ddsim_cmds"].append(ddsim_cmd)
+
+            # Add reconstruction command if enabled
+            if self.enable_reconstruction:
+                recon_dir = os.path.join(sim_path, "recon")
+                os.makedirs(recon_dir, exist_ok=True)
+                recon_output = os.path.join(recon_dir, f"recon_output_{file_type}_{shard_key}edm4hep.root")
+                task_info["recon_output"] = recon_output
+                recon_cmd = self.get_recon_cmd(sim_output, recon_output, det_path)
+                if campaign is not None:
+                    # Shards are merged (and prefilter weights applied once) in merge_campaign_outputs
+                    self.sim_dict[px_key]["campaign_outputs"].setdefault(file_type, []).append(
+                        (f"recon_{task_id}", recon_output)
+                    )
+                elif self.get_prefilter() is not None and file_type.endswith("Electrons"):
+                    # hGenPhoton_E must count all generated photons, not only the prefiltered ones
+                    recon_cmd += f" && {self._prefilter_weights_cmd(recon_output, file_type, energy)}"
+                self.sim_dict[px_key]["recon_cmds"].append(recon_cmd)
+
+    def _prefilter_weights_cmd(self, recon_output: str, file_type: str, energy) -> str:
+        """ROOT call restoring the generated photon spectrum in a prefiltered reconstruction output."""
+        stats_file = f"{self.prefilter_stats_path(file_type, energy)}.root"
+        macro = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ApplyPrefilterWeights.cxx")
+        return f"root -b -q '{macro}(\"{recon_output}\",\"{stats_file}\")'"
+
+    def task_shards(self, file_type: str, energy) -> List[Tuple]:
+        """
+        ddsim tasks of one input file.
 
-        # Add reconstruction command if enabled
-        if self.enable_reconstruction:
-            recon_dir = os.path.join(sim_path, "recon")
-            os.makedirs(recon_dir, exist_ok=True)
-            recon_output = os.path.join(recon_dir, f"recon_output_{file_type}_{energy}edm4hep.root")
-            recon_cmd = self.get_recon_cmd(sim_output, recon_output, det_path)
-            self.sim_dict[px_key]["recon_cmds"].append(recon_cmd)
+        A campaign is simulated in shards of the same input file, discrete
+        energies in one task.
+
+        Returns:
+            List[Tuple]: (key used in task id and file names, shard index or None,
+            events to skip, events to simulate) per task
+        """
+        if self.get_campaign() is None:
+            return [(energy, None, 0, self.particle_count)]
+        return [
+            (f"{energy}-s{shard}", shard, skip, count)
+            for shard, (skip, count) in enumerate(self._campaign_shards(file_type, energy))
+        ]
+
+    def _campaign_shards(self, file_type: str, energy) -> List[Tuple[int, int]]:
+        """
+        Split the events of a campaign input file into evenly sized shards.
+
+        Returns:
+            List[Tuple[int, int]]: (events to skip, events to simulate) per shard
+        """
+        campaign = self.get_campaign()
+        n_events = campaign['events']
+        if self.get_prefilter() is not None and file_type.endswith("Electrons"):
+            stats_file = f"{self.prefilter_stats_path(file_type, energy)}.json"
+            if os.path.exists(stats_file):
+                with open(stats_file, 'r') as f:
+                    n_events = json.load(f)['kept']
+        n_shards = max(1, min(campaign['shards'], n_events))
+        counts = [n_events // n_shards + (1 if i < n_events % n_shards else 0) for i in range(n_shards)]
+        return [(sum(counts[:i]), count) for i, count in enumerate(counts)]
+
+    # ddsim print levels and the matching eicrecon log_level values
+    EICRECON_LOG_LEVELS = {"VERBOSE": "trace", "DEBUG": "debug", "INFO": "info", "WARNING": "warn", "ERROR": "error"}
+
+    def get_verbosity(self) -> Dict:
+        """
+        Print level of the tasks and the DEBUG re-run of failed tasks.
+
+        Tasks run at print_level with only the last tail_lines lines of their
+        output kept; a failed task is re-run once at DEBUG with its complete
+        output written next to its log (around the failing event only, if
+        debug_rerun_events is set, for simulations).
+        """
+        verbosity = self.settings_dict.get('verbosity') or {}
+        print_level = str(verbosity.get('print_level', 'WARNING')).upper()
+        if print_level not in self.EICRECON_LOG_LEVELS:
+            raise ValueError(f"verbosity.print_level must be one of {', '.join(self.EICRECON_LOG_LEVELS)}")
+        return {
+            "print_level": print_level,
+            "tail_lines": int(verbosity.get('tail_lines', 200)),
+            "debug_rerun": bool(verbosity.get('debug_rerun', True)),
+            "debug_rerun_events": int(verbosity.get('debug_rerun_events', 0))
+        }
+
+    def with_print_level(self, cmd: str, task_type: str, level: str) -> str:
+        """
+        Add the ddsim print level (or the eicrecon log level) to a task command.
+
+        ddsim also gets the Geant4 per-event progress line, which the live progress
+        and the processed events follow whatever the print level.
+        """
+        if task_type == 'sim':
+            return re.sub(r"\bddsim ", f"ddsim --printLevel {level} {SIM_PROGRESS_ARGS} ", cmd, count=1)
+        return re.sub(r"\beicrecon ", f"eicrecon -Plog_level={self.EICRECON_LOG_LEVELS[level]} ", cmd, count=1)
 
-    def get_ddsim_cmd(self, input_file: str, output_file: str, compact_file: str) -> str:
+    def get_ddsim_cmd(self, input_file: str, output_file: str, compact_file: str,
+                      n_events: int = None, skip_events: int = 0) -> str:
         """
         Generate a ddsim command with consistent parameters
         """
-        return (
+        cmd = (
             f"ddsim --inputFiles {input_file} "
             f"--outputFile {output_file} "
             f"--compactFile {compact_file} "
-            f"-N {self.particle_count} "
+            f"-N {n_events if n_events is not None else self.particle_count} "
         )
+        if skip_events:
+            cmd += f"--skipNEvents {skip_events} "
+        return cmd
 
     def get_recon_cmd(self, input_file: str, output_file: str, detector_path: str) -> str:
         """
@@ -854,6 +1265,7 @@ class HandleSim(object):
         px_key = task['px_key']
         cmd = task['cmd']
         task_type = task['type']  # Add task type to distinguish between sim and recon
+        verbosity = self.get_verbosity()
         
         # Setup logging for this task
         logger, log_file = self.setup_subprocess_logger(cmd, px_key, task_type)
@@ -862,49 +1274,61 @@ class HandleSim(object):
         
         try:
             # Add source commands for environment setup
-            if task_type == 'sim':
-                source_cmd = f"source {task['shell_path']} && "
-            else:  # reconstruction
-                source_cmd = (
-                    f"source {task['shell_path']} && "
-                    f"export EICrecon_MY={self.eicrecon_plugin_path}/EICrecon_MY && "
-                    f"export DETECTOR_PATH={os.path.dirname(task['shell_path'])} && "
-                )
+            source_cmd = self._task_source_cmd(task)
+            if task_type == 'recon':
                 logger.info(f"Setting up reconstruction environment:")
                 logger.info(f"Shell path: {task['shell_path']}")
                 logger.info(f"EICrecon_MY: {self.eicrecon_plugin_path}/EICrecon_MY")
                 logger.info(f"DETECTOR_PATH: {os.path.dirname(task['shell_path'])}")
             
-            # Choose execution method based on environment
             if self.inside_singularity:
-                # Direct execution when inside Singularity
-                full_cmd = ["/bin/bash", "-c", f"{source_cmd}{task['cmd']}"]
                 logger.info("Executing command directly (inside Singularity)")
             else:
-                # Execution using Singularity when outside
-                singularity_cmd = [
-                    "singularity", "exec", "--containall",
-                    "--bind", f"{self.detector_path}:{self.detector_path}",
-                    "--bind", f"{self.execution_path}:{self.execution_path}",
-                    "--bind", f"{self.hepmc_input_path}:{self.hepmc_input_path}",
-                    "--bind", f"{self.eicrecon_plugin_path}:{self.eicrecon_plugin_path}",
-                    self.singularity_image_path,
-                    "/bin/bash", "-c", f"{source_cmd}{task['cmd']}"
-                ]
-                full_cmd = singularity_cmd
                 logger.info("Executing command in Singularity container")
             
-            # Execute with output capture
-            logger.info(f"Executing {task_type} command...")
-            result = subprocess.run(
-                full_cmd,
-                capture_output=True,
-                text=True,
-                check=True
+            # Execute quietly, keeping only the tail of the output and measuring the process tree
+            logger.info(f"Executing {task_type} command at print level {verbosity['print_level']}...")
+            # The span covers container start-up and the ddsim/eicrecon process
+            last_event = 0
+
+            def on_line(line: str) -> None:
+                nonlocal last_event
+                events = count_events(task_type, line)
+                if events is not None:
+                    last_event = max(last_event, events)
+                if self.progress is not None:
+                    self.progress.feed(task_id, line)
+
+            if self.progress is not None:
+                self.progress.start_task(task_id)
+            task_cmd = self.with_print_level(cmd, task_type, verbosity['print_level'])
+            with self.tracer.span(task_type, "task", task_id=task_id, px_key=px_key):
+                result, metrics = run_measured(
+                    self._task_container_cmd(task_type, f"{source_cmd}{task_cmd}"),
+                    events=task.get('events'), on_line=on_line, tail_lines=verbosity['tail_lines'],
+                    event_counter=functools.partial(count_events, task_type)
+                )
+            self.record_task_metrics(task, metrics, output_bytes=self._output_bytes(task))
+            logger.info(
+                f"Resources: wall {metrics['wall_s']:.1f} s, CPU {metrics['user_s'] + metrics['sys_s']:.1f} s, "
+                f"peak RSS {metrics['peak_rss_mb']:.0f} MB"
             )
+            if result.returncode != 0 and verbosity['debug_rerun']:
+                logger.warning(f"{task_type.capitalize()} task failed with exit code {result.returncode}, "
+                               f"last {verbosity['tail_lines']} lines of its output:")
+                logger.warning(result.stdout)
+                if result.stderr:
+                    logger.warning(result.stderr)
+                rerun, complete = self.debug_rerun(task, source_cmd, log_file, last_event, logger)
+                # A rerun of the whole task that succeeds stands in for the failed attempt
+                if complete and rerun.returncode == 0:
+                    logger.warning("DEBUG re-run succeeded, the failure was not reproducible")
+                    result = rerun
+            if result.returncode != 0:
+                raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
             
             # Log outputs
-            logger.info(f"{task_type.capitalize()} command output:")
+            logger.info(f"{task_type.capitalize()} command output (last {verbosity['tail_lines']} lines):")
             logger.info(result.stdout)
             if result.stderr:
                 logger.warning(f"{task_type.capitalize()} command stderr:")
@@ -920,6 +1344,7 @@ class HandleSim(object):
                     logger.error(f"Reconstruction output file not found: {output_file}")
                     raise RuntimeError(f"Reconstruction failed - output file not created")
             
+            self._finish_progress(task_id, True)
             return {
                 'task_id': task_id,
                 'status': 'completed',
@@ -930,6 +1355,7 @@ class HandleSim(object):
         except subprocess.CalledProcessError as e:
             logger.error(f"{task_type.capitalize()} task failed with exit code {e.returncode}")
             logger.error(f"Error output: {e.stderr}")
+            self._finish_progress(task_id, False)
             return {
                 'task_id': task_id,
                 'status': 'failed',
@@ -937,15 +1363,167 @@ class HandleSim(object):
             }
         except Exception as e:
             logger.error(f"Unexpected error during {task_type}: {str(e)}")
+            self._finish_progress(task_id, False)
             return {
                 'task_id': task_id,
                 'status': 'failed',
                 'error': str(e)
             }
+        finally:
+            # Release the task's log file
+            logger.close()
+
+    def start_admission(self, tasks: List[dict], max_workers: int) -> None:
+        """
+        Register the tasks of the next stage with the host broker (host_broker.py), if admission is enabled.
 
-    def setup_subprocess_logger(self, cmd: str, px_key: str, task_type: str) -> Tuple[logging.Logger, str]:
+        The run's task slots follow its fair share of the host among all runs
+        registered there; up to max_workers of the tasks want to run at once,
+        each needing the predicted peak memory of its stage (task_costs).
         """
-        Create a separate logger for each subprocess with detailed identification.
+        settings = self.settings_dict.get('admission') or {}
+        if not settings.get('enabled', True) or not tasks:
+            return
+        cost_of = self.task_costs()
+        memory_mb = max(cost_of(task)['peak_rss_mb'] for task in tasks)
+        demand = min(max_workers, len(tasks))
+        if self.broker is None:
+            broker = HostBroker(
+                path=settings.get('path', BROKER_DIR),
+                priority=settings.get('priority', 1.0),
+                reserve_cpus=settings.get('reserve_cpus', 1),
+                memory_fraction=settings.get('memory_fraction', 0.9),
+                interval=settings.get('interval_s', 5.0),
+                logger=self.logger
+            )
+            try:
+                slots = broker.register(self.run_id, demand, memory_mb)
+            except OSError as e:
+                self.printlog(f"Admission disabled, cannot register with the host broker: {str(e)}", level="warning")
+                broker.close()
+                return
+            self.broker = broker
+        else:
+            slots = self.broker.set_demand(demand, memory_mb)
+        self.printlog(f"Admission: {slots} of {demand} task slots granted on this host", level="info")
+
+    def stop_admission(self) -> None:
+        """Unregister from the host broker, handing this run's slots to the other runs."""
+        if self.broker is not None:
+            self.broker.close()
+            self.broker = None
+
+    def execute_admitted(self, task: dict) -> dict:
+        """execute_task once the run has a free task slot on the host."""
+        if self.broker is None:
+            return self.execute_task(task)
+        with self.broker.slot():
+            return self.execute_task(task)
+
+    def _task_source_cmd(self, task: dict) -> str:
+        """Environment setup prefixed to the command of a task."""
+        if task['type'] == 'sim':
+            return f"source {task['shell_path']} && "
+        return (
+            f"source {task['shell_path']} && "
+            f"export EICrecon_MY={self.eicrecon_plugin_path}/EICrecon_MY && "
+            f"export DETECTOR_PATH={os.path.dirname(task['shell_path'])} && "
+        )
+
+    def _task_container_cmd(self, task_type: str, shell_cmd: str) -> List[str]:
+        """Command list running shell_cmd directly or in the Singularity image."""
+        if not self.inside_singularity:
+            self.counters.inc("container_starts_total", stage=task_type)
+        return self._container_args(shell_cmd)
+
+    def _container_args(self, shell_cmd: str) -> List[str]:
+        if self.inside_singularity:
+            return ["/bin/bash", "-c", shell_cmd]
+        macro_dir = os.path.dirname(os.path.abspath(__file__))
+        return [
+            "singularity", "exec", "--containall",
+            "--bind", f"{self.detector_path}:{self.detector_path}",
+            "--bind", f"{self.execution_path}:{self.execution_path}",
+            "--bind", f"{self.hepmc_input_path}:{self.hepmc_input_path}",
+            "--bind", f"{self.eicrecon_plugin_path}:{self.eicrecon_plugin_path}",
+            "--bind", f"{macro_dir}:{macro_dir}",
+            self.singularity_image_path,
+            "/bin/bash", "-c", shell_cmd
+        ]
+
+    def debug_rerun(self, task: dict, source_cmd: str, log_file: str, last_event: int,
+                    logger: TaskLogger) -> Tuple[subprocess.CompletedProcess, bool]:
+        """
+        Re-run a failed task once at DEBUG level, writing its complete output to <log>_debug.log.
+
+        With verbosity.debug_rerun_events set, a failed simulation is only re-run
+        for that many events starting at the last event it reached, into a
+        separate <key>-debugedm4hep.root output that is removed afterwards.
+
+        Returns:
+            Tuple[subprocess.CompletedProcess, bool]: The result, and whether the whole task was re-run
+        """
+        verbosity = self.get_verbosity()
+        cmd = task['cmd']
+        complete = True
+        debug_output = None
+        if task['type'] == 'sim' and verbosity['debug_rerun_events'] > 0 and last_event > 0:
+            skip = re.search(r"--skipNEvents (\d+)", cmd)
+            skip_events = (int(skip.group(1)) if skip else 0) + last_event - 1
+            output_file = task['sim_output']
+            cmd = re.sub(r"--skipNEvents \d+ ?", "", cmd)
+            debug_output = output_file.replace("edm4hep.root", "-debugedm4hep.root")
+            cmd = cmd.replace(output_file, debug_output, 1)
+            cmd = re.sub(r"-N \d+", f"-N {verbosity['debug_rerun_events']} --skipNEvents {skip_events}", cmd, count=1)
+            complete = False
+
+        capture_path = os.path.splitext(log_file)[0] + "_debug.log"
+        logger.warning(f"Re-running at DEBUG level{'' if complete else f' from event {last_event}'}, "
+                       f"full output in {capture_path}")
+        debug_cmd = self.with_print_level(cmd, task['type'], "DEBUG")
+        with self.tracer.span(f"{task['type']}_debug", "task", task_id=task['task_id'], px_key=task['px_key']):
+            result, metrics = run_measured(
+                self._task_container_cmd(task['type'], f"{source_cmd}{debug_cmd}"),
+                events=None if not complete else task.get('events'),
+                tail_lines=verbosity['tail_lines'], capture_path=capture_path,
+                event_counter=functools.partial(count_events, task['type']) if complete else None
+            )
+        if debug_output is not None and os.path.exists(debug_output):
+            os.remove(debug_output)  # only the log of the partial re-run is of interest
+        self.counters.inc("debug_reruns_total", stage=task['type'])
+        self.record_task_metrics(task, metrics, attempt="debug")
+        logger.warning(f"DEBUG re-run finished with exit code {result.returncode}")
+        return result, complete
+
+    def _output_bytes(self, task: dict) -> int:
+        """Size of the output file of a task (ddsim output, eicrecon histsfile), None if missing."""
+        output_file = task.get('sim_output' if task['type'] == 'sim' else 'recon_output')
+        if output_file and os.path.exists(output_file):
+            return os.path.getsize(output_file)
+        return None
+
+    def _finish_progress(self, task_id: str, success: bool) -> None:
+        if self.progress is not None:
+            self.progress.finish_task(task_id, success)
+
+    def record_task_metrics(self, task: dict, metrics: dict, **extra) -> None:
+        """Append the resource usage of a finished task (plus extra fields) to metrics.jsonl in backup_path."""
+        if self.metrics_table is None:
+            self.metrics_table = MetricsTable(self.backup_path)
+        self.metrics_table.append({
+            "task_id": task['task_id'],
+            "px_key": task['px_key'],
+            "type": task['type'],
+            **extra,
+            **metrics
+        })
+
+    def setup_subprocess_logger(self, cmd: str, px_key: str, task_type: str) -> Tuple[TaskLogger, str]:
+        """
+        Create the logger of one task, writing to its own file in the pixel folder.
+
+        The logger is an adapter on the shared log pipeline: its file is opened
+        when the first record arrives and closed by logger.close().
         """
         # Initialize log_file at the start
         log_file = None
@@ -956,14 +1534,13 @@ class HandleSim(object):
         
         # Parse command to get file type and energy
         if task_type == 'sim':
-            if '--inputFiles' in cmd:
-                input_file = cmd.split('--inputFiles')[1].split()[0]
-                base_name = os.path.basename(input_file)
-                if base_name.endswith('.hepmc'):
-                    parts = base_name.replace('.hepmc', '').split('_')
-                    if len(parts) >= 2:
-                        file_type = parts[0]
-                        energy = parts[1]
+            # Campaign shards share their input file, so identify the task by its output
+            if '--outputFile' in cmd:
+                output_file = cmd.split('--outputFile')[1].split()[0]
+                parts = os.path.basename(output_file).split('_')
+                if len(parts) >= 3:
+                    file_type = parts[1]
+                    energy = parts[2].replace('edm4hep.root', '')
         else:  # reconstruction
             if 'recon_output_' in cmd:
                 output_parts = [p for p in cmd.split() if 'recon_output_' in p][0]
@@ -972,12 +1549,10 @@ class HandleSim(object):
                     file_type = parts[1]
                     energy = parts[2].replace('edm4hep.root', '')
         
-        # Create unique logger name
+        # Unique task name
         process_id = f"{px_key}_{file_type}_{energy}_{task_type}_pid{os.getpid()}" if file_type and energy else f"{px_key}_{task_type}_pid{os.getpid()}"
-        logger_name = f"subprocess_{process_id}"
-        logger = logging.getLogger(logger_name)
         
-        # Create log file path even if logger already has handlers
+        # Create log file path
         px_path = os.path.join(self.backup_path, f"{px_key}px")
         os.makedirs(px_path, exist_ok=True)
         
@@ -989,23 +1564,7 @@ class HandleSim(object):
         else:
             log_file = os.path.join(logs_dir, f"{task_type}_subprocess_{os.getpid()}.log")
         
-        if not logger.hasHandlers():
-            logger.setLevel(logging.DEBUG)
-            
-            file_handler = logging.FileHandler(log_file)
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s - %(name)s - Process %(process)d - %(levelname)s - %(message)s'
-            ))
-            logger.addHandler(file_handler)
-            
-            if self.console_logging:
-                console_handler = logging.StreamHandler()
-                console_handler.setFormatter(logging.Formatter(
-                    '%(levelname)s - %(name)s - Process %(process)d - %(message)s'
-                ))
-                logger.addHandler(console_handler)
-        
-        return logger, log_file
+        return self.log_pipeline.task_logger(f"subprocess_{process_id}", log_file), log_file
 
     def _extract_output_path(self, cmd: str) -> str:
         """Extract the output file path from a reconstruction command."""
@@ -1021,162 +1580,469 @@ class HandleSim(object):
     def exec_sim(self) -> None:
         """Execute simulation and reconstruction with proper task dependencies."""
         task_status = {}
+        recon_tasks = []
         max_workers = max(1, os.cpu_count() - 1)
         
-        # First run all simulation tasks
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            sim_futures = {}
-            for task in self.get_simulation_tasks():
-                future = executor.submit(self.execute_task, task)
-                sim_futures[future] = task
+        # Live progress: every task is known up front so the ETA covers the whole campaign
+        sim_tasks = self.get_simulation_tasks()
+        self.progress = ProgressTracker(
+            log=lambda message: self.printlog(message, level="info"),
+            log_interval=self.settings_dict.get('progress_log_interval', 60)
+        )
+        for task in sim_tasks:
+            self.progress.add_task(task['task_id'], 'sim', task.get('events'))
+            if self.enable_reconstruction:
+                self.progress.add_task(f"recon_{task['task_id']}", 'recon', task.get('events'))
+        self.progress.start()
+        try:
+            self.start_admission(sim_tasks, max_workers)
+        
+            # First run all simulation tasks
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                sim_futures = {}
+                for task in sim_tasks:
+                    future = executor.submit(self.profiler.wrap(self.execute_admitted), task)
+                    sim_futures[future] = task
                 
-            for future in as_completed(sim_futures):
-                task = sim_futures[future]
+                for future in as_completed(sim_futures):
+                    task = sim_futures[future]
+                    try:
+                        result = future.result()
+                        task_status[result['task_id']] = result
+                        self.printlog(f"Simulation {result['task_id']} completed with status: {result['status']}")
+                    except Exception as e:
+                        self.printlog(f"Simulation failed: {str(e)}", level="error")
+                        task_status[task['task_id']] = {'status': 'failed', 'error': str(e)}
+
+            self.tracer.instant("simulation barrier", "barrier")
+
+            # Validate reconstruction setup before running tasks
+            if self.enable_reconstruction:
                 try:
-                    result = future.result()
-                    task_status[result['task_id']] = result
-                    self.printlog(f"Simulation {result['task_id']} completed with status: {result['status']}")
+                    self._validate_reconstruction_setup()
                 except Exception as e:
-                    self.printlog(f"Simulation failed: {str(e)}", level="error")
-                    task_status[task['task_id']] = {'status': 'failed', 'error': str(e)}
-
-        # Validate reconstruction setup before running tasks
-        if self.enable_reconstruction:
-            try:
-                self._validate_reconstruction_setup()
-            except Exception as e:
-                self.printlog(f"Reconstruction validation failed: {e}", level="error")
-                return
+                    self.printlog(f"Reconstruction validation failed: {e}", level="error")
+                    return
             
-            # Run reconstruction tasks
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                recon_futures = {}
-                for task in self.get_reconstruction_tasks(task_status):
-                    future = executor.submit(self.execute_task, task)
-                    recon_futures[future] = task
+                # Run reconstruction tasks
+                recon_tasks = self.get_reconstruction_tasks(task_status)
+                self.start_admission(recon_tasks, max_workers)
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    recon_futures = {}
+                    for task in recon_tasks:
+                        future = executor.submit(self.profiler.wrap(self.execute_admitted), task)
+                        recon_futures[future] = task
                     
-            for future in as_completed(recon_futures):
-                task = recon_futures[future]
-                try:
-                    result = future.result()
-                    task_status[result['task_id']] = result
-                    self.printlog(f"Reconstruction {result['task_id']} completed with status: {result['status']}")
-                except Exception as e:
-                    self.printlog(f"Reconstruction failed: {str(e)}", level="error")
-                    task_status[task['task_id']] = {'status': 'failed', 'error': str(e)}
-
-        self.create_execution_report(task_status)
+                for future in as_completed(recon_futures):
+                    task = recon_futures[future]
+                    try:
+                        result = future.result()
+                        task_status[result['task_id']] = result
+                        self.printlog(f"Reconstruction {result['task_id']} completed with status: {result['status']}")
+                    except Exception as e:
+                        self.printlog(f"Reconstruction failed: {str(e)}", level="error")
+                        task_status[task['task_id']] = {'status': 'failed', 'error': str(e)}
+        finally:
+            # A failed stage must not leave this run registered with the host broker
+            self.progress.stop()
+            self.stop_admission()
+
+        # Bin the campaign shards back into per-energy outputs
+        if self.enable_reconstruction and self.get_campaign() is not None:
+            self.tracer.instant("reconstruction barrier", "barrier")
+            with self.tracer.span("merge_campaign_outputs", "merge"):
+                self.merge_campaign_outputs(task_status)
+
+        with self.profiler.phase("create_execution_report"):
+            self.create_execution_report(task_status, sim_tasks + recon_tasks)
+        self.write_trace()
+
+    # Help texts of the counters in self.counters
+    COUNTER_HELP = {
+        "container_starts_total": "Singularity containers started",
+        "cache_hits_total": "Generator inputs reused from a cache",
+        "cache_misses_total": "Generator inputs that had to be produced",
+        "debug_reruns_total": "Failed tasks re-run at DEBUG print level"
+    }
+
+    def start_metrics_server(self) -> None:
+        """
+        Serve campaign metrics on http://127.0.0.1:<metrics_port>/metrics if 'metrics_port' is set.
+        """
+        port = self.settings_dict.get('metrics_port')
+        if not port:
+            return
+        try:
+            self.metrics_server = MetricsServer(int(port), self.collect_metrics)
+        except OSError as e:
+            self.printlog(f"Cannot start metrics endpoint on port {port}: {e}", level="warning")
+            return
+        self.metrics_server.start()
+        self.printlog(f"Metrics endpoint at http://127.0.0.1:{self.metrics_server.port}/metrics", level="info")
+
+    def stop_metrics_server(self) -> None:
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def collect_metrics(self) -> List[Tuple[str, str, str, Dict, float]]:
+        """Samples for the metrics endpoint: task states and events per stage, counters and host load."""
+        samples = []
+        if self.progress is not None:
+            for stage, state in self.progress.snapshot().items():
+                for task_state in ("queued", "running", "done", "failed"):
+                    samples.append(("tasks", "gauge", "Tasks per stage and state",
+                                    {"stage": stage, "state": task_state}, state[task_state]))
+                samples.append(("events_total", "counter", "Events processed per stage",
+                                {"stage": stage}, state["events"]))
+                samples.append(("events_per_second", "gauge", "Aggregate event rate per stage",
+                                {"stage": stage}, state["rate"]))
+        for name, labels, value in self.counters.items():
+            samples.append((name, "counter", self.COUNTER_HELP.get(name, name), labels, value))
+        return samples + host_load()
+
+    def write_profile(self) -> str:
+        """Write the per-phase profile (--profile) into backup_path/profile."""
+        path = self.profiler.write(os.path.join(self.backup_path, "profile"))
+        self.profiler.stop()
+        if path:
+            self.printlog(f"Orchestrator profile written to {path}", level="info")
+        return path
+
+    def write_trace(self) -> str:
+        """
+        Write the timeline recorded so far to trace.json in backup_path
+        (open in chrome://tracing or ui.perfetto.dev).
+        """
+        trace_path = self.tracer.write(os.path.join(self.backup_path, "trace.json"))
+        self.printlog(f"Timeline written to {trace_path}", level="info")
+        return trace_path
 
-    def create_execution_report(self, task_status: dict) -> None:
+    def merge_campaign_outputs(self, task_status: dict) -> None:
         """
-        Create a concise execution report summarizing simulation and reconstruction results.
+        Merge the reconstructed shards of a campaign and split them by true photon energy.
+
+        Writes recon/recon_output_<type>_<campaign>edm4hep.root with the full
+        spectrum and, for every entry of energy_levels, the per-energy file
+        recon/recon_output_<type>_<energy>edm4hep.root of a discrete scan. The
+        per-energy files only hold what can be selected by true photon energy
+        (SplitCampaignByEnergy.cxx); everything else stays in the merged file.
         """
-        report_path = os.path.join(self.backup_path, "execution_report.txt")
-        with open(report_path, 'w') as f:
-            # Header
-            f.write("EPIC Simulation Report\n")
-            f.write("====================\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            # Configuration Summary
-            f.write("Configuration\n")
-            f.write("-------------\n")
-            f.write(f"Particles: {self.particle_count:,}\n")
-            f.write(f"File Types: {', '.join(self.simulation_types)}\n")
-            f.write(f"Energies (GeV): {', '.join(map(str, self.energy_levels))}\n")
-            f.write(f"Reconstruction: {'Enabled' if self.enable_reconstruction else 'Disabled'}\n\n")
-            
-            # Overall Statistics
-            total = len(task_status)
-            completed = sum(1 for status in task_status.values() if status['status'] == 'completed')
-            failed = sum(1 for status in task_status.values() if status['status'] == 'failed')
-            
-            f.write("Execution Summary\n")
-            f.write("----------------\n")
-            f.write(f"Total Tasks: {total}\n")
-            f.write(f"Success Rate: {(completed/total)*100:.1f}% ({completed}/{total})\n")
-            if failed > 0:
-                f.write(f"Failed Tasks: {failed}\n")
-            f.write("\n")
-            
-            # Group tasks by pixel pair
-            tasks_by_pixel = {}
-            for task_id, status in task_status.items():
-                parts = task_id.split('_')
-                px_key = f"{parts[0]}x{parts[1]}"
-                
-                if px_key not in tasks_by_pixel:
-                    tasks_by_pixel[px_key] = {
-                        'ddsim': {'completed': [], 'failed': []},
-                        'recon': {'completed': [], 'failed': []}
-                    }
-                
-                # Determine task type and extract info
-                is_recon = 'recon' in task_id
-                task_type = 'recon' if is_recon else 'ddsim'
-                task_status = status['status']
-                
-                if len(parts) >= 4:
-                    file_type = parts[2]
-                    energy = parts[3]
-                    task_info = {
-                        'file_type': file_type,
-                        'energy': energy,
-                        'error': status.get('error', None)
-                    }
-                    tasks_by_pixel[px_key][task_type][task_status == 'completed' and 'completed' or 'failed'].append(task_info)
-            
-            # Write detailed status by pixel pair
-            f.write("Status by Configuration\n")
-            f.write("----------------------\n")
-            
-            for px_key, tasks in tasks_by_pixel.items():
-                f.write(f"\n[{px_key}]\n")
-                
-                # Simulation status
-                sim_completed = len(tasks['ddsim']['completed'])
-                sim_failed = len(tasks['ddsim']['failed'])
-                sim_total = sim_completed + sim_failed
-                
-                if sim_total > 0:
-                    f.write(f"Simulation: {sim_completed}/{sim_total} completed")
-                    if sim_failed > 0:
-                        f.write(f" ({sim_failed} failed)")
-                    f.write("\n")
-                    
-                    # List failed simulations with errors
-                    if sim_failed > 0:
-                        f.write("  Failed:\n")
-                        for task in tasks['ddsim']['failed']:
-                            f.write(f"  - {task['file_type']} @ {task['energy']} GeV")
-                            if task['error']:
-                                f.write(f"\n    Error: {task['error']}")
-                            f.write("\n")
+        campaign = self.get_campaign()
+        key = self.campaign_key()
+        macro_dir = os.path.dirname(os.path.abspath(__file__))
+        split_macro = os.path.join(macro_dir, "SplitCampaignByEnergy.cxx")
+        energies = ",".join(str(energy) for energy in self.energy_levels)
+        
+        for px_key, sim_info in self.sim_dict.items():
+            for file_type, shards in sim_info.get("campaign_outputs", {}).items():
+                done = [output for task_id, output in shards
+                        if task_status.get(task_id, {}).get('status') == 'completed']
+                if len(done) < len(shards):
+                    self.printlog(f"{px_key} {file_type}: only {len(done)} of {len(shards)} campaign shards reconstructed", level="warning")
+                if not done:
+                    continue
                 
-                # Reconstruction status (if enabled)
-                if self.enable_reconstruction:
-                    recon_completed = len(tasks['recon']['completed'])
-                    recon_failed = len(tasks['recon']['failed'])
-                    recon_total = recon_completed + recon_failed
-                    
-                    if recon_total > 0:
-                        f.write(f"Reconstruction: {recon_completed}/{recon_total} completed")
-                        if recon_failed > 0:
-                            f.write(f" ({recon_failed} failed)")
-                        f.write("\n")
-                        
-                        # List failed reconstructions with errors
-                        if recon_failed > 0:
-                            f.write("  Failed:\n")
-                            for task in tasks['recon']['failed']:
-                                f.write(f"  - {task['file_type']} @ {task['energy']} GeV")
-                                if task['error']:
-                                    f.write(f"\n    Error: {task['error']}")
-                                f.write("\n")
+                recon_dir = os.path.dirname(done[0])
+                merged = os.path.join(recon_dir, f"recon_output_{file_type}_{key}edm4hep.root")
+                pattern = os.path.join(recon_dir, f"recon_output_{file_type}_{{E}}edm4hep.root")
+                merge_cmd = f"hadd -f {merged} {' '.join(done)}"
+                if self.get_prefilter() is not None and file_type.endswith("Electrons"):
+                    merge_cmd += f" && {self._prefilter_weights_cmd(merged, file_type, key)}"
+                merge_cmd += f" && root -b -q '{split_macro}(\"{merged}\",\"{pattern}\",\"{energies}\",{campaign['bin_width']})'"
                 
-            # Footer
-            f.write("\n" + "="*50 + "\n")
-            f.write(f"Report generated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                self.printlog(f"Merging {len(done)} campaign shards for {px_key} {file_type}", level="info")
+                result = subprocess.run(self._generation_cmd(merge_cmd), capture_output=True, text=True)
+                if result.returncode != 0:
+                    self.printlog(f"Failed to merge campaign shards for {px_key} {file_type}: {result.stderr}", level="error")
+                    continue
+                self.printlog(f"Wrote {merged} and per-energy outputs for {energies} GeV", level="info")
+
+    def create_execution_report(self, task_status: dict, tasks: List[dict] = None) -> None:
+        """
+        Write the execution report of the run from its task records.
+
+        execution_report.json holds per-configuration throughput, CPU-hours,
+        failure signatures, the critical path and one record per task (also
+        as execution_report.csv/.parquet); execution_report.txt is rendered
+        from the same data.
+
+        Args:
+            task_status: Result of every executed task by task_id
+            tasks: Task dicts of the run, default: rebuilt from sim_dict
+        """
+        if tasks is None:
+            tasks = self.get_simulation_tasks()
+            if self.enable_reconstruction:
+                tasks += self.get_reconstruction_tasks(task_status)
+        metrics = self.metrics_table.read() if self.metrics_table is not None else []
+        configuration = {
+            "particles": self.particle_count,
+            "file_types": self.simulation_types,
+            "energies": self.energy_levels,
+            "pixel_pairs": self.pixel_pairs,
+            "campaign": self.get_campaign(),
+            "prefilter": self.get_prefilter(),
+            "reconstruction": self.enable_reconstruction
+        }
+        report = build_report(
+            task_records(tasks, task_status, metrics), configuration,
+            resources=self.metrics_table.summary() if self.metrics_table is not None else None,
+            run_id=self.run_id
+        )
+        report["regressions"] = self.catalog_run(report)
+        paths = write_report(report, self.backup_path)
+        if self.metrics_table is not None:
+            self.metrics_table.to_parquet()
+        self.printlog(f"Execution report written: {', '.join(os.path.basename(path) for path in paths)}", level="info")
+
+    def _detector_hash(self) -> str:
+        """Git commit of the detector checkout (with -dirty for local changes), None if unknown."""
+        try:
+            commit = subprocess.run(["git", "-C", self.detector_path, "rev-parse", "HEAD"],
+                                    capture_output=True, text=True, timeout=30)
+            if commit.returncode != 0:
+                return None
+            dirty = subprocess.run(["git", "-C", self.detector_path, "status", "--porcelain"],
+                                   capture_output=True, text=True, timeout=30)
+            return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+
+    def _catalog_path(self) -> str:
+        settings = self.settings_dict.get('run_catalog') or {}
+        return settings.get('path') or os.path.join(os.path.dirname(self.backup_path), CATALOG_FILE)
+
+    def catalog_run(self, report: dict) -> List[dict]:
+        """
+        Add this run to the cross-run catalog and check it for throughput regressions.
+
+        The catalog (run_catalog.path, default simEvents/run_catalog.sqlite)
+        keeps the task records of every run with host, image and detector
+        commit. Events/s per stage, file type and energy are compared with
+        the previous run_catalog.baseline_runs runs.
+
+        Returns:
+            List[dict]: Regressions (see RunCatalog.regressions), empty if the catalog is disabled
+        """
+        settings = self.settings_dict.get('run_catalog') or {}
+        if not settings.get('enabled', True):
+            return []
+        db_path = self._catalog_path()
+        try:
+            catalog = RunCatalog(db_path)
+            catalog.ingest(report, self.backup_path, socket.gethostname(), self._image_identity(), self._detector_hash())
+            regressions = catalog.regressions(
+                self.run_id,
+                window=settings.get('baseline_runs', 10),
+                min_slowdown=settings.get('min_slowdown', 0.1),
+                alpha=settings.get('alpha', 0.01)
+            )
+        except sqlite3.Error as e:
+            self.printlog(f"Could not update the run catalog {db_path}: {e}", level="warning")
+            return []
+
+        for alert in regressions:
+            self.printlog(
+                f"Throughput regression: {alert['stage']} {alert['file_type']} {alert['px_key']}px "
+                f"@ {', '.join(alert['energies'])} "
+                f"{alert['events_per_s']:.2f} events/s vs. {alert['baseline_events_per_s']:.2f} over the last "
+                f"{alert['baseline_runs']} runs ({alert['slowdown']:.0%} slower, p = {alert['p_value']:.1e}; "
+                f"host {alert['host']}, baseline hosts {', '.join(alert['baseline_hosts'])})",
+                level="warning"
+            )
+        return regressions
+
+    def plan_tasks(self) -> List[dict]:
+        """
+        Task graph of the settings, expanded like prep_sim but without preparing anything.
+
+        Returns:
+            List[dict]: Simulation (and reconstruction) task dicts as in exec_sim, without commands
+        """
+        tasks = []
+        for curr_px_dx, curr_px_dy in self.pixel_pairs:
+            px_key = f"{curr_px_dx}x{curr_px_dy}"
+            for file_type in self.simulation_types:
+                for energy in self.generation_keys():
+                    for shard_key, shard, _, n_events in self.task_shards(file_type, energy):
+                        task_id = f"{px_key}_{file_type}_{shard_key}"
+                        info = {'px_key': px_key, 'file_type': file_type, 'energy': energy,
+                                'shard': shard, 'events': n_events}
+                        tasks.append({'task_id': task_id, 'type': 'sim', **info})
+                        if self.enable_reconstruction:
+                            tasks.append({'task_id': f"recon_{task_id}", 'type': 'recon', **info})
+        return tasks
+
+    def task_costs(self) -> Callable[[dict], dict]:
+        """
+        Predicted cost of a task per event, as used by plan and export_batch.
+
+        Per-event costs come from the run catalog (same stage, file type and
+        energy, else same stage and file type) and otherwise from
+        plan.cost_model on top of planner.DEFAULT_COST_MODEL, whose simulation
+        time per event is replaced by this host's ddsim calibration when there
+        is one (host_calibration.py).
+
+        Returns:
+            Callable[[dict], dict]: Cost model of a task dict (see planner.estimate)
+        """
+        settings = self.settings_dict.get('plan') or {}
+        base_model = {stage: {**model, "source": "model"} for stage, model in DEFAULT_COST_MODEL.items()}
+        cache = CalibrationCache()
+        calibration = cache.get(socket.gethostname()) or cache.get(socket.getfqdn())
+        if calibration and calibration.get('ddsim_events_per_s'):
+            seconds = 1.0 / calibration['ddsim_events_per_s']
+            base_model["sim"].update(wall_s_per_event=seconds, cpu_s_per_event=seconds, source="calibration")
+        cost_model = {
+            stage: {**model, **(settings.get('cost_model') or {}).get(stage, {})}
+            for stage, model in base_model.items()
+        }
+        db_path = self._catalog_path()
+        catalog = RunCatalog(db_path) if os.path.exists(db_path) else None
+        window = (self.settings_dict.get('run_catalog') or {}).get('baseline_runs', 10)
+
+        costs = {}
+
+        def cost_of(task: dict) -> dict:
+            # Pixel pairs are different geometries, their history is never pooled
+            key = (task['type'], task['file_type'], str(task['energy']), task['px_key'])
+            if key not in costs:
+                cost = dict(cost_model[task['type']])
+                for source, query in (("history", key), ("history (file type)", (*key[:2], None, key[3]))):
+                    history = catalog.cost_model(*query, window=window) if catalog is not None else None
+                    if history is not None:
+                        output = history["output_bytes_per_event"]
+                        cost = {
+                            **history, "overhead_s": 0.0, "source": source,
+                            "output_bytes_per_event": output if output is not None else cost["output_bytes_per_event"]
+                        }
+                        break
+                costs[key] = cost
+            return costs[key]
+
+        return cost_of
+
+    def plan(self, workers: int = None) -> dict:
+        """
+        Predict CPU-hours, makespan, peak memory and disk usage of the settings without running anything.
+
+        Per-event costs come from task_costs.
+
+        Args:
+            workers: Concurrent tasks, default plan.workers or the worker count of exec_sim
+
+        Returns:
+            dict: The plan (see planner.estimate)
+        """
+        settings = self.settings_dict.get('plan') or {}
+        workers = workers or settings.get('workers') or max(1, os.cpu_count() - 1)
+        cost_of = self.task_costs()
+
+        # Physical memory and free space of the output location unless limited in the settings
+        memory_limit_mb = settings.get('memory_limit_gb')
+        memory_limit_mb = memory_limit_mb * 1024 if memory_limit_mb else \
+            os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2**20
+        disk_free = settings.get('disk_limit_gb')
+        output_root = self.simulation_output_path or self.execution_path
+        disk_free = disk_free * 2**30 if disk_free else shutil.disk_usage(output_root).free
+
+        # Every pixel configuration gets its own copy of the detector
+        detector_bytes = 0
+        for root, _, files in os.walk(self.detector_path):
+            for name in files:
+                try:
+                    detector_bytes += os.lstat(os.path.join(root, name)).st_size
+                except OSError:
+                    continue
+        tasks = self.plan_tasks()
+        fixed_bytes = {task['px_key']: detector_bytes for task in tasks}
+
+        plan = estimate(tasks, cost_of, workers, memory_limit_mb, disk_free, fixed_bytes)
+        missing = sorted({
+            self.input_file_name(file_type, energy)
+            for file_type in self.simulation_types for energy in self.generation_keys()
+            if not os.path.exists(os.path.join(self.hepmc_input_path, self.input_file_name(file_type, energy)))
+        })
+        if missing:
+            plan["warnings"].append(f"{len(missing)} HepMC inputs do not exist yet and will be generated first "
+                                    f"(not included in the prediction): {', '.join(missing)}")
+        plan["missing_inputs"] = missing
+        return plan
+
+    def write_plan(self, plan: dict) -> str:
+        """Write plan.json and plan.txt into backup_path and print the summary."""
+        text = render_plan(plan)
+        with open(os.path.join(self.backup_path, "plan.json"), 'w') as f:
+            json.dump(plan, f, indent=2)
+        path = os.path.join(self.backup_path, "plan.txt")
+        with open(path, 'w') as f:
+            f.write(text)
+        print(text)
+        for warning in plan["warnings"]:
+            self.printlog(f"Plan: {warning}", level="warning")
+        return path
+
+    def export_batch(self, backend: str = None) -> Dict[str, dict]:
+        """
+        Write the prepared tasks as batch jobs (batch_export.py) into <run dir>/batch.
+
+        Tasks are packed into jobs of about batch.target_wall_h predicted hours
+        (task_costs); reconstruction jobs run after the simulation jobs and skip
+        tasks whose simulation failed. With the local backend the jobs are run
+        right away in a process pool and the execution report is written.
+
+        Args:
+            backend: slurm, swif2 or local, default batch.backend
+
+        Returns:
+            Dict[str, dict]: Task status of a local run, empty otherwise
+        """
+        settings = self.settings_dict.get('batch') or {}
+        backend = backend or settings.get('backend', 'slurm')
+        batch_dir = os.path.join(self.backup_path, "batch")
+        cost_of = self.task_costs()
+        verbosity = self.get_verbosity()
+
+        def job_task(task: dict) -> dict:
+            cost = cost_of(task)
+            events = task.get('events') or 0
+            shell_cmd = self._task_source_cmd(task) + self.with_print_level(task['cmd'], task['type'],
+                                                                          verbosity['print_level'])
+            return {
+                'task_id': task['task_id'],
+                'command': self._container_args(shell_cmd),
+                'predicted_s': events * cost['wall_s_per_event'] + cost.get('overhead_s', 0.0),
+                'memory_mb': cost['peak_rss_mb'],
+                'output_bytes': events * (cost.get('output_bytes_per_event') or 0.0),
+                'requires': task['task_id'][len("recon_"):] if task['type'] == 'recon' else None
+            }
+
+        sim_tasks = self.get_simulation_tasks()
+        recon_tasks = []
+        if self.enable_reconstruction:
+            # Every simulation may succeed; the jobs skip reconstructions of failed ones
+            recon_tasks = self.get_reconstruction_tasks({task['task_id']: {'status': 'completed'} for task in sim_tasks})
+        stages = [("sim", [job_task(task) for task in sim_tasks]), ("recon", [job_task(task) for task in recon_tasks])]
+        bundles = write_batch(batch_dir, stages, backend, settings)
+        self.printlog(f"Wrote {len(sim_tasks) + len(recon_tasks)} tasks as {len(bundles)} {backend} jobs to {batch_dir}",
+                      level="info")
+        if backend != "local":
+            self.printlog(f"Submit them with {os.path.join(batch_dir, 'submit.sh')}", level="info")
+            return {}
+
+        workers = settings.get('workers') or max(1, os.cpu_count() - 1)
+        status = run_local(batch_dir, [stage for stage, _ in stages], workers, logger=self.logger)
+        task_status = {}
+        for task in sim_tasks + recon_tasks:
+            outcome = status.get(task['task_id'], 'failed (not run)')
+            task_status[task['task_id']] = {'task_id': task['task_id'], 'status': outcome.split()[0]}
+            if outcome != 'completed':
+                task_status[task['task_id']]['error'] = f"{outcome}, see {os.path.join(batch_dir, 'logs', task['task_id'])}.log"
+        if self.enable_reconstruction and self.get_campaign() is not None:
+            self.merge_campaign_outputs(task_status)
+        self.create_execution_report(task_status, sim_tasks + recon_tasks)
+        return task_status
 
     def get_simulation_tasks(self) -> List[dict]:
         """
@@ -1189,13 +2055,16 @@ class HandleSim(object):
         for px_key, sim_info in self.sim_dict.items():
             for cmd_idx, cmd in enumerate(sim_info['ddsim_cmds']):
                 task_id = sim_info['task_ids'][cmd_idx]
+                n_events = re.search(r"-N (\d+)", cmd)
                 tasks.append({
                     'task_id': task_id,
                     'px_key': px_key,
                     'type': 'sim',
                     'cmd': cmd,
+                    'events': int(n_events.group(1)) if n_events else None,
                     'shell_path': sim_info['sim_shell_path'],
-                    'detector_path': sim_info['sim_det_path']
+                    'detector_path': sim_info['sim_det_path'],
+                    **sim_info['task_info'][cmd_idx]
                 })
         
         self.printlog(f"Generated {len(tasks)} simulation tasks", level="info")
@@ -1223,15 +2092,20 @@ class HandleSim(object):
                 sim_status = task_status.get(sim_task_id, {}).get('status')
                 if sim_status == 'completed':
                     task_id = f"recon_{sim_task_id}"
+                    n_events = re.search(r"-N (\d+)", sim_info['ddsim_cmds'][cmd_idx])
                     tasks.append({
                         'task_id': task_id,
                         'px_key': px_key,
                         'type': 'recon',
                         'cmd': cmd,
+                        'events': int(n_events.group(1)) if n_events else None,
                         'shell_path': sim_info['sim_shell_path'],
-                        'detector_path': sim_info['sim_det_path']
+                        'detector_path': sim_info['sim_det_path'],
+                        **sim_info['task_info'][cmd_idx]
                     })
                 else:
+                    if self.progress is not None:
+                        self.progress.remove_task(f"recon_{sim_task_id}")
                     self.printlog(
                         f"Skipping reconstruction for {sim_task_id} due to simulation status: {sim_status}", 
                         level="warning"
@@ -1370,9 +2244,21 @@ class HandleSim(object):
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Run the ePIC luminosity simulation campaign in simulation_settings.json")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "plan", "export"],
+                        help="run the campaign, only predict its cost (plan) or write it as batch jobs (export)")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent tasks assumed by plan")
+    parser.add_argument("--backend", choices=["slurm", "swif2", "local"], default=None,
+                        help="batch system of export, default batch.backend")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile every phase with cProfile and tracemalloc (written to <run dir>/profile)")
+    parser.add_argument("--profile-top", type=int, default=30,
+                        help="functions and allocation sites listed per phase in profile_summary.txt")
+    args = parser.parse_args()
+
     """ Simulation """
     # initialize the simulation handler
-    eic_simulation = HandleSim()
+    eic_simulation = HandleSim(profiler=PhaseProfiler(enabled=args.profile, top_n=args.profile_top))
     eic_simulation.printlog("Simulation handler initialized.", level="info")
 
     # initialize paths, variables, and settings from JSON
@@ -1382,26 +2268,56 @@ if __name__ == "__main__":
     os.chmod(os.getcwd(), 0o777)
     eic_simulation.printlog("Settings, variables, and paths initialized.", level="info")
 
-    # Check and create hepmc files first
-    eic_simulation.printlog("Checking and creating hempc files.", level="info")
-    eic_simulation.get_energies()
-    eic_simulation.printlog("hempc file check completed.", level="info")
-
-    # prepare the simulation based on settings (now working directly in backup location)
-    eic_simulation.printlog("Preparing simulation based on settings.", level="info")
-    eic_simulation.prep_sim()
-
-    # execute the simulation and reconstruction in parallel
-    eic_simulation.exec_sim() 
-
-    # Only merge if reconstruction was successful
-    """
-    if eic_simulation.enable_reconstruction:
-        eic_simulation.printlog("Merging reconstruction outputs.", level="info")
-        eic_simulation.merge_recon_out()
-    """
+    try:
+        if args.command == "plan":
+            # Dry run: predict the cost of the task graph, nothing is generated, copied or executed
+            with eic_simulation.profiler.phase("plan"):
+                eic_simulation.write_plan(eic_simulation.plan(workers=args.workers))
+            raise SystemExit(0)
+
+        eic_simulation.start_metrics_server()
+
+        # Check and create hepmc files first
+        eic_simulation.printlog("Checking and creating hempc files.", level="info")
+        with eic_simulation.profiler.phase("get_energies"):
+            eic_simulation.get_energies()
+        eic_simulation.printlog("hempc file check completed.", level="info")
+
+        # prepare the simulation based on settings (now working directly in backup location)
+        eic_simulation.printlog("Preparing simulation based on settings.", level="info")
+        with eic_simulation.profiler.phase("prep_sim"):
+            eic_simulation.prep_sim()
+
+        if args.command == "export":
+            # Inputs and detectors are ready on the shared file system, the batch system runs the tasks
+            with eic_simulation.profiler.phase("export"):
+                exported = eic_simulation.export_batch(args.backend)
+            if exported:
+                # Only a local run is finished here, submitted jobs still read the HepMC inputs
+                eic_simulation.release_hepmc_inputs()
+            raise SystemExit(0)
+
+        # execute the simulation and reconstruction in parallel
+        with eic_simulation.profiler.phase("exec_sim"):
+            eic_simulation.exec_sim()
+
+        # Only merge if reconstruction was successful
+        """
+        if eic_simulation.enable_reconstruction:
+            eic_simulation.printlog("Merging reconstruction outputs.", level="info")
+            eic_simulation.merge_recon_out()
+        """
 
-    # Create README directly
-    eic_simulation.printlog("Creating README file.", level="info")
-    eic_simulation.setup_readme()
-    eic_simulation.printlog("Simulation process completed.", level="info")
\ No newline at end of file
+        # Release this run's hold on the shared HepMC inputs
+        eic_simulation.release_hepmc_inputs()
+
+        # Create README directly
+        eic_simulation.printlog("Creating README file.", level="info")
+        eic_simulation.setup_readme()
+        eic_simulation.printlog("Simulation process completed.", level="info")
+    finally:
+        # The timeline and profile are written however the command ends (plan, export, errors)
+        eic_simulation.write_trace()
+        eic_simulation.write_profile()
+        eic_simulation.stop_metrics_server()
+        eic_simulation.log_pipeline.stop()
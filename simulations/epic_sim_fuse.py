@@ -11,170 +11,506 @@ import json
 import xml.etree.ElementTree as ET
 import subprocess
 import logging
-from typing import Dict, List, Tuple
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import time 
 import socket
 import paramiko
 import getpass
+import shlex
+import hashlib
 import sys
+import threading
+from contextlib import contextmanager
+
+from task_metrics import MetricsTable
+from work_queue import DEFAULT_EVENTS_PER_S, WorkQueue
+from data_mover import DataMover
+from task_worker import compile_variant, env_snapshot, run_task, stamp_variant
+from host_calibration import CalibrationCache, calibrate, events_per_core, host_identity
+from local_transport import LocalTransport, is_local_host
+
+# OpenSSH connection sharing for the rsync transfers: the first one opens a master
+# connection, the following ones reuse it for ControlPersist after the last one ends
+SSH_MUX_OPTS = "-o ControlMaster=auto -o ControlPath=~/.ssh/epic_sim-%r@%h:%p -o ControlPersist=10m"
+# What a remote host needs to run task specs (task_worker.py), staged into its execution path
+WORKER_FILES = ["task_worker.py", "task_metrics.py", "progress.py", "run_sim.sh", "host_calibration.py"]
+# CPU counts of the machines, probed once and kept across runs (refreshed by the telemetry)
+CPU_CACHE_FILE = "~/.cache/epic_sim/machine_cpus.json"
+# Host registry used when the settings have no "hosts" block
+DEFAULT_HOSTS = {
+    'deuteron.tau.ac.il': {'base_path': '/data/'},
+    'helion.tau.ac.il': {'base_path': '/extra/'}
+}
+
+
+class SSHConnectionPool:
+    """
+    One authenticated SSH transport per host, shared by all commands to that host.
+
+    Commands run on their own channels multiplexed over the pooled transport,
+    so a probe costs a channel open instead of a TCP connect, key exchange
+    and authentication. Authentication uses the SSH agent and the user's keys
+    (a password only as fallback). Transports are kept alive and checked
+    before use; a dead one is replaced and the command retried once.
+
+    At most max_sessions channels are open per host. Long-running sessions
+    (worker pools, tasks) get at most max_sessions - 1 of them, so a short
+    command such as a telemetry probe (the host's heartbeat) never waits for
+    a task to finish.
+    """
+
+    def __init__(self, username: str, password: str = None, keepalive: int = 30,
+                 connect_timeout: float = 10.0, max_sessions: int = 8) -> None:
+        self.username = username
+        self.password = password
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.max_sessions = max_sessions  # below sshd's default MaxSessions of 10
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._clients: Dict[str, paramiko.SSHClient] = {}
+        self._host_locks: Dict[str, threading.Lock] = {}
+        self._sessions: Dict[str, threading.BoundedSemaphore] = {}
+        self._long_sessions: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Connections and locks cannot cross into worker processes, each process builds its own pool
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def _host_state(self, hostname: str) -> Tuple[threading.Lock, threading.BoundedSemaphore]:
+        with self._lock:
+            if hostname not in self._host_locks:
+                self._host_locks[hostname] = threading.Lock()
+                self._sessions[hostname] = threading.BoundedSemaphore(self.max_sessions)
+                self._long_sessions[hostname] = threading.BoundedSemaphore(max(1, self.max_sessions - 1))
+            return self._host_locks[hostname], self._sessions[hostname]
+
+    @staticmethod
+    def _healthy(client: paramiko.SSHClient) -> bool:
+        transport = client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    def client(self, hostname: str) -> paramiko.SSHClient:
+        """Connected client of hostname, (re)connecting if there is no healthy one."""
+        host_lock, _ = self._host_state(hostname)
+        with host_lock:
+            client = self._clients.get(hostname)
+            if client is not None and self._healthy(client):
+                return client
+            if client is not None:
+                client.close()
+
+            client = paramiko.SSHClient()
+            client.load_system_host_keys()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            try:
+                client.connect(
+                    hostname, username=self.username, password=self.password,
+                    allow_agent=True, look_for_keys=True, timeout=self.connect_timeout,
+                    banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout
+                )
+            except Exception as e:
+                client.close()
+                raise ConnectionError(f"Failed to connect to {hostname}: {str(e)}")
+            client.get_transport().set_keepalive(self.keepalive)
+            self._clients[hostname] = client
+            return client
+
+    def discard(self, hostname: str) -> None:
+        """Close the pooled connection of hostname, the next command reconnects."""
+        host_lock, _ = self._host_state(hostname)
+        with host_lock:
+            client = self._clients.pop(hostname, None)
+        if client is not None:
+            client.close()
+
+    def execute(self, hostname: str, command: str, timeout: float = None) -> Tuple[str, str]:
+        """Run command on a new channel of the pooled connection to hostname."""
+        _, sessions = self._host_state(hostname)
+        with sessions:
+            for attempt in range(2):
+                try:
+                    _, stdout, stderr = self.client(hostname).exec_command(command, timeout=timeout)
+                    return stdout.read().decode(), stderr.read().decode()
+                except (paramiko.SSHException, EOFError, OSError) as e:
+                    # The transport died between the health check and the command
+                    self.discard(hostname)
+                    if attempt == 1 or isinstance(e, ConnectionError):
+                        raise
+
+    @contextmanager
+    def session(self, hostname: str, command: str):
+        """
+        Long-running command on its own channel of the pooled connection to hostname.
+
+        Holds one of the max_sessions - 1 long-running channels, one channel
+        always stays free for execute.
+
+        Yields:
+            Tuple: stdin, stdout and stderr files of the command
+        """
+        _, sessions = self._host_state(hostname)
+        with self._long_sessions[hostname], sessions:
+            stdin, stdout, stderr = self.client(hostname).exec_command(command)
+            try:
+                yield stdin, stdout, stderr
+            finally:
+                stdout.channel.close()
+
+    def close_all(self) -> None:
+        """Close every pooled connection."""
+        with self._lock:
+            hostnames = list(self._clients)
+        for hostname in hostnames:
+            self.discard(hostname)
+
 
 class RemoteExecutor:
-    """Handle remote execution of commands on another machine"""
+    """Handle remote execution of commands on another machine (over SSH or, for local:<n>, as child processes)"""
     
-    def __init__(self, hostname: str, username: str, password: str) -> None:
+    def __init__(self, hostname: str, pool) -> None:
         self.hostname = hostname
-        self.username = username
-        self.password = password
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.pool = pool  # SSHConnectionPool or LocalTransport
         
     def connect(self) -> None:
-        """Establish SSH connection"""
-        try:
-            self.client.connect(self.hostname, username=self.username, password=self.password)
-        except Exception as e:
-            raise ConnectionError(f"Failed to connect to {self.hostname}: {str(e)}")
+        """Make sure the pooled SSH connection is up"""
+        self.pool.client(self.hostname)
             
-    def execute_command(self, command: str) -> Tuple[str, str]:
+    def execute_command(self, command: str, timeout: float = None) -> Tuple[str, str]:
         """Execute command on remote machine"""
-        stdin, stdout, stderr = self.client.exec_command(command)
-        return stdout.read().decode(), stderr.read().decode()
+        return self.pool.execute(self.hostname, command, timeout=timeout)
+
+    def session(self, command: str):
+        """Long-running command on remote machine, see SSHConnectionPool.session"""
+        return self.pool.session(self.hostname, command)
         
     def close(self) -> None:
-        """Close SSH connection"""
-        self.client.close()
+        """Close the pooled SSH connection (it is reopened on the next command)"""
+        self.pool.discard(self.hostname)
+
+
+# One sample of a host: load, CPUs, free memory and disk under argv[1], running ddsim/eicrecon
+# processes. Runs as python3 -c on every host, so it must not contain single quotes.
+TELEMETRY_PROBE = """
+import os, sys, json
+path = sys.argv[1] if os.path.exists(sys.argv[1]) else "/"
+mem = {}
+for line in open("/proc/meminfo"):
+    key, value = line.split(":", 1)
+    mem[key] = int(value.split()[0]) * 1024
+disk = os.statvfs(path)
+running = 0
+for pid in os.listdir("/proc"):
+    if pid.isdigit():
+        try:
+            running += open("/proc/" + pid + "/comm").read().strip() in ("ddsim", "eicrecon")
+        except OSError:
+            pass
+print(json.dumps({
+    "load1": os.getloadavg()[0], "cpus": os.cpu_count(),
+    "mem_available_bytes": mem.get("MemAvailable", mem.get("MemFree", 0)),
+    "disk_free_bytes": disk.f_bavail * disk.f_frsize, "running_tasks": running
+}))
+"""
+
+
+class HostTelemetry:
+    """
+    Background sampling of every host's load, free memory, free disk and running tasks.
+
+    One daemon thread per host runs TELEMETRY_PROBE every interval seconds (through
+    the executor of remote hosts) and caches the reading. The
+    scheduler reads the cache instead of probing; a reading older than ttl is
+    stale and is refreshed synchronously on the next read.
+    """
+
+    def __init__(self, machines: Dict[str, dict], current_hostname: str, logger,
+                 interval: float = 15.0, ttl: float = 60.0) -> None:
+        self.machines = machines
+        self.current_hostname = current_hostname
+        self.logger = logger
+        self.interval = interval
+        self.ttl = ttl
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._readings: Dict[str, dict] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str, dict], None]] = []
+
+    def add_listener(self, listener: Callable[[str, dict], None]) -> None:
+        """Call listener(hostname, reading) after every successful sample (e.g. as heartbeat)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def __getstate__(self) -> dict:
+        # Threads and locks stay in the scheduling process, worker processes get an empty cache
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def sample(self, hostname: str) -> dict:
+        """Probe hostname now and cache the reading."""
+        base_path = self.machines[hostname]['base_path']
+        if hostname in self.current_hostname:
+            stdout = subprocess.run([sys.executable, "-c", TELEMETRY_PROBE, base_path],
+                                    capture_output=True, text=True, check=True).stdout
+        else:
+            stdout, _ = self.machines[hostname]['executor'].execute_command(
+                f"python3 -c '{TELEMETRY_PROBE}' {shlex.quote(base_path)}", timeout=self.interval
+            )
+        reading = json.loads(stdout)
+        reading['time'] = time.time()
+        with self._lock:
+            self._readings[hostname] = reading
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(hostname, reading)
+        return reading
+
+    def _refresh(self, hostname: str) -> None:
+        while True:
+            try:
+                self.sample(hostname)
+            except Exception as e:
+                self.logger.warning(f"Telemetry sample of {hostname} failed: {str(e)}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        """Start one sampling thread per host."""
+        if self._threads:
+            return
+        self._stop.clear()
+        for hostname in self.machines:
+            thread = threading.Thread(target=self._refresh, args=(hostname,),
+                                      name=f"telemetry-{hostname}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Stop the sampling threads."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=self.interval)
+        self._threads = []
+
+    def reading(self, hostname: str) -> dict:
+        """
+        Latest reading of hostname, sampled now if there is none younger than ttl.
+
+        Returns:
+            dict: load1, cpus, mem_available_bytes, disk_free_bytes, running_tasks, time;
+            None if the host cannot be sampled
+        """
+        with self._lock:
+            reading = self._readings.get(hostname)
+        if reading is not None and time.time() - reading['time'] <= self.ttl:
+            return reading
+        try:
+            return self.sample(hostname)
+        except Exception as e:
+            self.logger.error(f"Failed to sample {hostname}: {str(e)}")
+            return None
 
 class ComputeResourceManager:
     """Manage compute resources across machines"""
     
-    def __init__(self, logger) -> None:
+    def __init__(self, logger, settings: dict = None) -> None:
         self.logger = logger
         self.current_hostname = socket.gethostname()
-        self.machines = {
-            'deuteron.tau.ac.il': {'base_path': '/data/', 'executor': None},
-            'helion.tau.ac.il': {'base_path': '/extra/', 'executor': None}
-        }
+        settings = settings or {}
+        self.machines = self.load_hosts(settings.get('hosts') or DEFAULT_HOSTS)
         self.machine_cpus = {}
-        self.update_machine_cpus()
+        self.unprobed_cpus = set()  # fallback and configured counts, not persisted
+        telemetry_settings = settings.get('telemetry', {})
+        self.cpu_cache_path = os.path.expanduser(telemetry_settings.get('cpu_cache', CPU_CACHE_FILE))
         
-        # Initialize remote executors
+        # Initialize remote executors before probing the machines
         self.setup_remote_executors()
+        self.update_machine_cpus()
+        
+        # Load, memory, disk and running tasks of every host, refreshed in the background
+        self.telemetry = HostTelemetry(
+            self.machines, self.current_hostname, self.logger,
+            interval=telemetry_settings.get('interval_s', 15.0),
+            ttl=telemetry_settings.get('ttl_s', 60.0)
+        )
+        self.telemetry.start()
+        
+        # Delta transfers of task inputs and outputs
+        data_settings = settings.get('data_movement', {})
+        self.data_mover = DataMover(
+            self.username, f"ssh -o StrictHostKeyChecking=no {SSH_MUX_OPTS}",
+            streams=data_settings.get('streams', 4),
+            compress=data_settings.get('compress', True),
+            checksum=data_settings.get('checksum', True),
+            local_hosts=[hostname for hostname in self.machines if is_local_host(hostname)],
+            logger=self.logger
+        )
+
+    @staticmethod
+    def load_hosts(hosts: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        Host registry from the "hosts" settings block.
+
+        Every entry maps a hostname to its base_path (the prefix its copies of the
+        run's paths live under) and optionally cpus (slots used on it, 0 to only
+        coordinate from it). Hosts named local:<n> are pseudo-hosts on this machine
+        (see local_transport.py).
+        """
+        machines = {}
+        for hostname, entry in hosts.items():
+            if not entry.get('base_path'):
+                raise ValueError(f"Host {hostname} has no base_path in the hosts settings")
+            machines[hostname] = {**entry, 'base_path': os.path.join(entry['base_path'], ''), 'executor': None}
+        return machines
         
     def setup_remote_executors(self) -> None:
-        """Set up remote executors for other machines"""
-        username = getpass.getuser()  # Get current username
-        password = "abcd1234"  # In production, this should be handled more securely
+        """Set up remote executors for other machines, sharing one pooled connection per host"""
+        self.username = getpass.getuser()  # Get current username
+        # Keys or the SSH agent are used first; a password only if given in the environment
+        self.ssh_pool = SSHConnectionPool(self.username, password=os.environ.get("EPIC_SIM_SSH_PASSWORD"))
+        # Pseudo-hosts local:<n> run their commands as child processes of this machine
+        self.local_transport = LocalTransport(self.machines)
         
         for hostname in self.machines:
             if hostname not in self.current_hostname:
-                self.machines[hostname]['executor'] = RemoteExecutor(hostname, username, password)
+                pool = self.local_transport if is_local_host(hostname) else self.ssh_pool
+                self.machines[hostname]['executor'] = RemoteExecutor(hostname, pool)
                 
     def get_machine_load(self, hostname: str) -> float:
-        """Get CPU load for a machine"""
-        if hostname in self.current_hostname:
-            # Get local CPU load
-            load = os.getloadavg()[0] / os.cpu_count()
-            self.logger.info(f"Local CPU load on {hostname}: {load}")
-            return load
-        else:
-            # Get remote CPU load
-            executor = self.machines[hostname]['executor']
-            try:
-                executor.connect()
-                stdout, stderr = executor.execute_command("python3 -c 'import os; print(os.getloadavg()[0] / os.cpu_count())'")
-                executor.close()
-                load = float(stdout.strip())
-                self.logger.info(f"Remote CPU load on {hostname}: {load}")
-                return load
-            except Exception as e:
-                self.logger.error(f"Failed to get CPU load for {hostname}: {str(e)}")
-                return float('inf')
+        """Get CPU load per core for a machine from its latest telemetry reading"""
+        reading = self.telemetry.reading(hostname)
+        if reading is None:
+            return float('inf')
+        cpus = reading['cpus'] or self.machine_cpus.get(hostname, 1)
+        if self.machines[hostname].get('cpus') is None and not is_local_host(hostname) \
+                and self.machine_cpus.get(hostname) != cpus:
+            self.machine_cpus[hostname] = cpus
+            self.unprobed_cpus.discard(hostname)
+            self.save_machine_cpus()
+        load = reading['load1'] / cpus
+        self.logger.debug(f"CPU load on {hostname}: {load:.2f} ({reading['running_tasks']} tasks running, "
+                          f"{reading['mem_available_bytes'] / 2**30:.1f} GB memory and "
+                          f"{reading['disk_free_bytes'] / 2**30:.1f} GB disk free)")
+        return load
                 
-    def get_best_machine(self) -> str:
-        """Get machine with lowest CPU load"""
-        loads = {hostname: self.get_machine_load(hostname) for hostname in self.machines}
+    def get_best_machine(self, assigned: Dict[str, int] = None, hostnames: List[str] = None) -> str:
+        """
+        Get machine with lowest CPU load, counting tasks already queued to it.
+
+        Args:
+            assigned: Tasks queued per machine that are not running yet
+            hostnames: Machines to choose from (default all)
+
+        Returns:
+            str: Hostname
+        """
+        assigned = assigned or {}
+        loads = {}
+        for hostname in hostnames or self.machines:
+            load = self.get_machine_load(hostname)
+            loads[hostname] = load + assigned.get(hostname, 0) / self.machine_cpus.get(hostname, 1)
         return min(loads.items(), key=lambda x: x[1])[0]
         
+    @property
+    def current_machine(self) -> str:
+        """Registry name of this machine, the registered hostname contained in its own"""
+        if self.current_hostname in self.machines:
+            return self.current_hostname
+        return next((hostname for hostname in self.machines if hostname in self.current_hostname),
+                    self.current_hostname)
+
     def adapt_path(self, path: str, hostname: str) -> str:
-        """Adapt path based on specified machine"""
-        return path.replace('/data/', self.machines[hostname]['base_path']).replace('/extra/', self.machines[hostname]['base_path'])
+        """Adapt path based on specified machine: the base path of any registered machine becomes its own"""
+        if hostname not in self.machines:
+            raise KeyError(f"Machine {hostname} is not in the hosts settings ({', '.join(self.machines)})")
+        entry = self.machines[hostname]
+        bases = sorted({machine['base_path'] for machine in self.machines.values()}, key=len, reverse=True)
+        # One pass, so a base path is never replaced inside an already adapted one
+        return re.sub("|".join(re.escape(base) for base in bases), lambda match: entry['base_path'], path)
+
+    def adapt_shared_path(self, path: str, hostname: str) -> str:
+        """Adapt a read-only input (container image, plugins); local pseudo-hosts use this machine's copy"""
+        return path if is_local_host(hostname) else self.adapt_path(path, hostname)
+
+    def transfer_files_to_remote(self, items: List[Tuple[str, str, List[str]]], hostname: str, kind: str = None) -> int:
+        """
+        Send (local_path, remote_path, excludes) items to a remote machine, skipping unchanged ones.
 
-    def transfer_files(self, source_dir: str, target_dir: str, hostname: str) -> None:
-        """Transfer files between local and remote machines"""
-        executor = self.machines[hostname]['executor']
-        
+        Returns:
+            int: Number of items transferred
+        """
         try:
-            executor.connect()
-            
-            # Create target directory on remote machine
-            executor.execute_command(f"mkdir -p {target_dir}")
-            
-            # Use rsync to transfer files
-            rsync_cmd = f"rsync -avz -e 'ssh -o StrictHostKeyChecking=no' {source_dir}/ {self.username}@{hostname}:{target_dir}/"
-            subprocess.run(rsync_cmd, shell=True, check=True)
-            
-            executor.close()
-            
+            return self.data_mover.push(hostname, items, kind=kind)
         except Exception as e:
             self.logger.error(f"Failed to transfer files to {hostname}: {str(e)}")
             raise
             
-    def transfer_files_to_remote(self, source_dir: str, target_dir: str, hostname: str) -> None:
-        """Transfer files from local to remote machine using scp"""
-        executor = self.machines[hostname]['executor']
-        
-        try:
-            executor.connect()
-            
-            # Create target directory on remote machine
-            executor.execute_command(f"mkdir -p {target_dir}")
-            
-            # Use scp to transfer files
-            scp_cmd = f"scp -r {source_dir}/* {self.username}@{hostname}:{target_dir}"
-            subprocess.run(scp_cmd, shell=True, check=True)
-            
-            executor.close()
-            
-        except Exception as e:
-            self.logger.error(f"Failed to transfer files to {hostname}: {str(e)}")
-            raise
-            
-    def transfer_files_from_remote(self, source_dir: str, target_dir: str, hostname: str) -> None:
-        """Transfer files from remote to local machine using scp"""
-        executor = self.machines[hostname]['executor']
-        
-        try:
-            executor.connect()
-            
-            # Create target directory on local machine
-            os.makedirs(target_dir, exist_ok=True)
-            
-            # Use scp to transfer files
-            scp_cmd = f"scp -r {self.username}@{hostname}:{source_dir}/* {target_dir}"
-            subprocess.run(scp_cmd, shell=True, check=True)
-            
-            executor.close()
-            
-        except Exception as e:
-            self.logger.error(f"Failed to transfer files from {hostname}: {str(e)}")
-            raise
+    def transfer_files_from_remote(self, source: str, target: str, hostname: str, excludes: List[str] = ()):
+        """Fetch a file (or a directory ending in /) from a remote machine in the background"""
+        return self.data_mover.pull(hostname, source, target, excludes)
 
     def update_machine_cpus(self) -> None:
-        """Get CPU count for all machines"""
+        """Get CPU count for all machines, probing only those not known from earlier runs"""
+        try:
+            with open(self.cpu_cache_path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
         for hostname in self.machines:
-            if hostname in self.current_hostname:
+            if self.machines[hostname].get('cpus') is not None:
+                # An override of this run's settings (0: coordinator only), not the host's CPU count
+                self.machine_cpus[hostname] = self.machines[hostname]['cpus']
+                self.unprobed_cpus.add(hostname)
+            elif is_local_host(hostname):
+                # A pseudo-host is a share of this machine, nothing to remember
                 self.machine_cpus[hostname] = os.cpu_count()
+                self.unprobed_cpus.add(hostname)
+            elif hostname in self.current_hostname:
+                self.machine_cpus[hostname] = os.cpu_count()
+            elif hostname in cached:
+                self.machine_cpus[hostname] = cached[hostname]
             else:
                 executor = self.machines[hostname]['executor']
                 try:
-                    executor.connect()
                     stdout, _ = executor.execute_command("python3 -c 'import os; print(os.cpu_count())'")
-                    executor.close()
                     self.machine_cpus[hostname] = int(stdout.strip())
                 except Exception as e:
                     self.logger.error(f"Failed to get CPU count for {hostname}: {str(e)}")
                     self.machine_cpus[hostname] = 1  # Conservative fallback
+                    self.unprobed_cpus.add(hostname)
+        self.save_machine_cpus()
+
+    def save_machine_cpus(self) -> None:
+        """Persist the probed CPU counts for the next run, keeping those of hosts not in this run"""
+        try:
+            with open(self.cpu_cache_path, 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        # Entries of overridden or unprobed hosts may be stale (e.g. a cached coordinator-only 0)
+        cached = {hostname: cpus for hostname, cpus in cached.items() if hostname not in self.unprobed_cpus}
+        cached.update({hostname: cpus for hostname, cpus in self.machine_cpus.items()
+                       if hostname not in self.unprobed_cpus})
+        try:
+            os.makedirs(os.path.dirname(self.cpu_cache_path), exist_ok=True)
+            with open(self.cpu_cache_path, 'w') as f:
+                json.dump(cached, f, indent=2)
+        except OSError as e:
+            self.logger.warning(f"Failed to save CPU counts to {self.cpu_cache_path}: {str(e)}")
 
 class HandleSim(object):
     """
@@ -245,11 +581,11 @@ class HandleSim(object):
         self.printlog("Initialized HandleSim class.", level="info")
 
         # Add compute resource manager
-        self.resource_manager = ComputeResourceManager(self.logger)
+        self.resource_manager = ComputeResourceManager(self.logger, self.settings_dict)
         
         # Adapt paths based on current machine
-        self.execution_path = self.resource_manager.adapt_path(self.execution_path, self.resource_manager.current_hostname)
-        self.backup_path = self.resource_manager.adapt_path(self.backup_path, self.resource_manager.current_hostname)
+        self.execution_path = self.resource_manager.adapt_path(self.execution_path, self.resource_manager.current_machine)
+        self.backup_path = self.resource_manager.adapt_path(self.backup_path, self.resource_manager.current_machine)
 
     def init_logger(self) -> None:
         """
@@ -540,6 +876,8 @@ class HandleSim(object):
                 """ hard changes """
                 # rewrite detector's XMLs to hold current change for detector
                 self.mod_detector_settings(curr_sim_det_path, curr_px_dx, curr_px_dy)
+                # the XMLs were patched in the sources and the install alike, the build stays current
+                stamp_variant(curr_sim_det_path)
                 
                 """ gather simulation relavent details """
                 # update the simulation dictionary for current requested change
@@ -608,36 +946,9 @@ class HandleSim(object):
         """
         self.printlog(f"Compiling detector at {detector_path}", level="info")
         try:
-            build_path = os.path.join(detector_path, 'build')
-            if os.path.exists(build_path):
-                shutil.rmtree(build_path)
-            os.makedirs(build_path)
-            
-            # Run compilation inside Singularity
-            cmd = [
-                "singularity", "exec", "--containall",
-                "--bind", f"{os.path.dirname(detector_path)}:{os.path.dirname(detector_path)}",
-                self.sif_path,
-                "/bin/bash", "-c", f"""
-                    set -e
-                    cd {detector_path}
-                    mkdir -p build && cd build
-                    cmake -DCMAKE_INSTALL_PREFIX=../install ..
-                    make -j$(nproc) install
-                """
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            self.printlog(f"Compilation output: {result.stdout}", level="debug")
-            
-            # Verify installation
-            install_path = os.path.join(detector_path, 'install')
-            if not os.path.exists(install_path):
-                raise RuntimeError(f"Installation directory not created: {install_path}")
-                
-            thisepic_path = os.path.join(install_path, 'bin/thisepic.sh')
-            if not os.path.exists(thisepic_path):
-                raise RuntimeError(f"thisepic.sh not found at: {thisepic_path}")
+            # Run compilation inside Singularity (fresh build directory); the install is stamped with its sources
+            output = compile_variant(detector_path, self.sif_path)
+            self.printlog(f"Compilation output: {output}", level="debug")
                 
         except Exception as e:
             self.printlog(f"Failed to compile detector: {e}", level="error")
@@ -800,15 +1111,15 @@ class HandleSim(object):
                     self.printlog(f"Failed to merge reconstruction outputs: {e}", level="error")
             """
     def exec_simv2(self) -> None:
-        """Modified execution with distributed computing support and queuing"""
+        """Modified execution with distributed computing support and a pull-based work queue"""
         self.printlog("Starting enhanced parallel execution with distributed computing.", level="info")
-        
-        # Count total tasks
-        total_tasks = sum(len(sim_config['ddsim_cmds']) for sim_config in self.sim_dict.values())
+        queue_settings = self.settings_dict.get('work_queue', {})
         
         # Get available machines and their CPU counts
         available_machines = {}
         for hostname in self.resource_manager.machines:
+            if self.resource_manager.machine_cpus[hostname] == 0:
+                continue  # only coordinates
             if hostname in self.resource_manager.current_hostname or \
                self.resource_manager.get_machine_load(hostname) < 0.8:  # 80% threshold
                 available_machines[hostname] = self.resource_manager.machine_cpus[hostname]
@@ -816,44 +1127,65 @@ class HandleSim(object):
         if not available_machines:
             raise RuntimeError("No machines available for execution")
         
-        # Distribute tasks based on CPU count
-        machine_queues = {hostname: [] for hostname in available_machines}
-        current_machine = min(available_machines.items(), key=lambda x: x[1])[0]
-        
+        # Queue every task with its cost; hosts pull the next one whenever a slot is free
+        queue = WorkQueue(heartbeat_timeout=queue_settings.get('heartbeat_timeout_s', 120.0), logger=self.logger)
         for px_key, sim_config in self.sim_dict.items():
             for sim_cmd in sim_config['ddsim_cmds']:
-                # Find machine with lowest load
-                current_machine = self.resource_manager.get_best_machine()
-                machine_queues[current_machine].append({
-                    'sim_cmd': sim_cmd,
-                    'detector_path': sim_config['sim_det_path'],
-                    'shell_path': sim_config['sim_shell_path'],
-                    'px_key': px_key
-                })
+                n_events = re.search(r"-N (\d+)", sim_cmd)
+                task_id = self.sim_task_id(px_key, sim_cmd)
+                queue.add(task_id, self.task_spec(task_id, sim_cmd, sim_config['sim_det_path'], px_key),
+                          events=int(n_events.group(1)) if n_events else None)
+        self.printlog(f"Queued {len(queue.tasks)} tasks for {len(available_machines)} machines.", level="info")
         
-        # Execute tasks on each machine
-        futures = []
-        with ProcessPoolExecutor(max_workers=len(available_machines)) as executor:
-            for hostname, tasks in machine_queues.items():
-                if hostname == self.resource_manager.current_hostname:
-                    # Execute locally
-                    for task in tasks:
-                        futures.append(executor.submit(self.run_single_sim, **task))
-                else:
-                    # Execute remotely
-                    futures.append(executor.submit(
-                        self.run_remote_tasks,
-                        hostname=hostname,
-                        tasks=tasks
-                    ))
-                    
-        # Wait for all tasks to complete
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                self.printlog(f"Task completed: {result}", level="info")
-            except Exception as e:
-                self.printlog(f"Task failed: {str(e)}", level="error")
+        # Every telemetry sample of a host is its heartbeat
+        self.resource_manager.telemetry.add_listener(lambda hostname, reading: queue.heartbeat(hostname))
+        # Local slots pull in threads of this process, every remote host runs one worker pool fed over SSH
+        remote_hosts = [hostname for hostname in available_machines if hostname not in self.resource_manager.current_hostname]
+        # Remote hosts only count for the others once they are staged and pulling
+        for hostname, cpus in available_machines.items():
+            queue.register_host(hostname, cpus,
+                                events_per_s=queue_settings.get('default_events_per_s', DEFAULT_EVENTS_PER_S),
+                                ready=hostname not in remote_hosts)
+        
+        local_slots = sum(cpus for hostname, cpus in available_machines.items() if hostname not in remote_hosts)
+        # Hosts start at their calibrated throughput (rerun only for new or changed hosts)
+        calibration_settings = self.settings_dict.get('calibration', {})
+        if calibration_settings.get('enabled', True):
+            for hostname in available_machines:
+                if hostname not in remote_hosts:
+                    self.calibrate_host(hostname)
+            self.apply_calibration(queue, list(available_machines))
+        with ThreadPoolExecutor(max_workers=max(1, len(remote_hosts))) as staging, \
+             ThreadPoolExecutor(max_workers=local_slots + len(remote_hosts)) as executor:
+            # Remote hosts get the inputs (and are calibrated) before they start pulling, the local host starts right away
+            staged = {hostname: staging.submit(self.stage_remote, hostname, queue, list(available_machines))
+                      for hostname in remote_hosts}
+            futures = [
+                executor.submit(self.host_worker, queue, hostname)
+                for hostname in available_machines if hostname not in remote_hosts
+                for _ in range(available_machines[hostname])
+            ]
+            futures += [
+                executor.submit(self.run_remote_tasks, hostname, queue, available_machines[hostname], staged[hostname])
+                for hostname in remote_hosts
+            ]
+            task_status = queue.wait()
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.printlog(f"Worker failed: {str(e)}", level="error")
+        
+        for hostname in remote_hosts:
+            if any(status['machine'] == hostname for status in task_status.values()):
+                self.collect_remote(hostname)
+        for hostname, host in queue.summary().items():
+            self.printlog(f"{hostname}: {host['completed']} tasks completed, "
+                          f"{host['events_per_s']:.2f} events/s per slot", level="info")
+        failed_tasks = [task_id for task_id, status in task_status.items() if status['status'] != 'completed']
+        failed_tasks += [task_id for task_id in queue.tasks if task_id not in task_status]
+        self.log_execution_summary(task_status, failed_tasks)
+        self.create_execution_report(task_status)
         
         # Only merge if reconstruction was successful
         if self.reconstruct:
@@ -865,6 +1197,32 @@ class HandleSim(object):
         self.setup_readme()
         self.printlog("Simulation process completed.", level="info")
 
+    def host_worker(self, queue: WorkQueue, hostname: str) -> None:
+        """
+        Run tasks pulled from the queue in one local slot until there are none left for hostname.
+
+        Args:
+            queue: The run's work queue
+            hostname: This machine
+        """
+        while True:
+            lease = queue.next_task(hostname)
+            if lease is None:
+                return
+            start = time.time()
+            try:
+                result = run_task(lease['task'])
+            except Exception as e:
+                # e.g. the task's log could not be opened; the lease must not stay open
+                result = {'status': 'failed', 'error': str(e), 'machine': hostname}
+            try:
+                queue.complete(lease['task_id'], hostname, result, wall_s=time.time() - start)
+            except Exception as e:
+                # Its telemetry keeps the host alive, so the run would wait for the lease forever
+                queue.drop_host(hostname, f"worker failed: {str(e)}")
+                raise
+            self.printlog(f"Task {lease['task_id']} on {hostname}: {result['status']}", level="info")
+
     def get_recon_cmd_for_energy(self, px_key: str, energy: str) -> dict:
         """
         Generate reconstruction command for specific pixel key and energy level.
@@ -933,100 +1291,41 @@ class HandleSim(object):
         Success Rate: {(completed/total)*100:.2f}%
         """, level="info")
 
-    def run_single_sim(self, sim_cmd: str, detector_path: str, shell_path: str, px_key: str) -> str:
+    def sim_task_id(self, px_key: str, sim_cmd: str) -> str:
+        """Task id of a ddsim command: pixel key and output file name"""
+        output_file = re.search(r"--outputFile (\S+)", sim_cmd)
+        # hash() is salted per process, the id has to be the same on the coordinator and the workers
+        name = os.path.basename(output_file.group(1)) if output_file else hashlib.sha1(sim_cmd.encode()).hexdigest()[:12]
+        return f"{px_key}_{name}"
+
+    def task_spec(self, task_id: str, sim_cmd: str, detector_path: str, px_key: str) -> dict:
         """
-        Execute a single simulation and optional reconstruction by calling run_sim.sh script.
+        Self-contained description of a simulation task for task_worker.run_task.
+
+        Holds everything the worker needs without the settings: the detector variant,
+        the command, the container image, the paths run_sim.sh binds, the run directory
+        and the environment of this process that the task inherits.
         """
-        subprocess_logger, log_file = self.setup_subprocess_logger(sim_cmd, px_key)
-        
-        try:
-            # Validate paths
-            if not os.path.exists(detector_path):
-                raise FileNotFoundError(f"Detector path not found: {detector_path}")
-            if not os.path.exists(self.sif_path):
-                raise FileNotFoundError(f"Singularity image not found: {self.sif_path}")
-            
-            # Get absolute paths
-            abs_detector_path = os.path.abspath(detector_path)
-            abs_detector_parent = os.path.dirname(abs_detector_path)
-            
-            # Create command to execute run_sim.sh with required parameters
-            script_path = os.path.join(os.path.dirname(__file__), "run_sim.sh")
-            cmd = [
-                script_path,
-                abs_detector_path,
-                abs_detector_parent,
-                self.execution_path,
-                self.sim_out_path,
-                self.sif_path,
-                sim_cmd,
-                str(self.reconstruct).lower(),
-                self.plugin_path if self.reconstruct else ""
-            ]
-            
-            # Execute the script
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
-            
-            try:
-                stdout, stderr = process.communicate()
-                if process.returncode != 0:
-                    raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
-                return {
-                    'status': 'completed', 
-                    'machine': self.resource_manager.current_hostname  # Include machine information
-                }
-                
-            except subprocess.TimeoutExpired:
-                process.kill()
-                raise TimeoutError
-                
-        except Exception as e:
-            subprocess_logger.error(f"Error in simulation: {str(e)}")
-            return {
-                'status': 'failed',
-                'error': str(e),
-                'machine': self.resource_manager.current_hostname  # Include machine information
-            }
+        return {
+            'task_id': task_id,
+            'px_key': px_key,
+            'variant_path': os.path.abspath(detector_path),
+            'command': sim_cmd,
+            'sif_path': self.sif_path,
+            'execution_path': self.execution_path,
+            'sim_out_path': self.sim_out_path,
+            'reconstruct': self.reconstruct,
+            'plugin_path': self.plugin_path,
+            'run_dir': self.backup_path,
+            'console_logging': self.console_logging,
+            'env': env_snapshot()
+        }
 
-    def setup_subprocess_logger(self, sim_cmd: str, px_key: str) -> Tuple[logging.Logger, str]:
+    def run_single_sim(self, sim_cmd: str, detector_path: str, shell_path: str, px_key: str) -> dict:
         """
-        Create a separate logger for each subprocess with its own log file in the pixel folder.
+        Execute a single simulation and optional reconstruction by calling run_sim.sh script.
         """
-        logger_name = f"subprocess_{hash(sim_cmd)}_{os.getpid()}"
-        logger = logging.getLogger(logger_name)
-        
-        if not logger.hasHandlers():
-            logger.setLevel(logging.DEBUG)
-            
-            # Create log file in the pixel-specific directory within backup_path
-            px_path = os.path.join(self.backup_path, f"{px_key}px")
-            os.makedirs(px_path, exist_ok=True)
-            
-            log_file = os.path.join(
-                px_path,
-                f"subprocess.log"
-            )
-            
-            file_handler = logging.FileHandler(log_file)
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s - Process %(process)d - %(levelname)s - %(message)s'
-            ))
-            logger.addHandler(file_handler)
-            
-            if self.console_logging:
-                console_handler = logging.StreamHandler()
-                console_handler.setFormatter(logging.Formatter(
-                    '%(levelname)s - Process %(process)d - %(message)s'
-                ))
-                logger.addHandler(console_handler)
-        
-        return logger, log_file
+        return run_task(self.task_spec(self.sim_task_id(px_key, sim_cmd), sim_cmd, detector_path, px_key))
 
     def run_reconstruction(self, recon_cmd: dict, px_key: str) -> str:
         """
@@ -1335,51 +1634,269 @@ class HandleSim(object):
                 self.printlog(f"Failed to merge reconstruction files for {px_key}: {e.stderr}", level="error")
                 raise
 
-    def run_remote_tasks(self, hostname: str, tasks: List[dict]) -> None:
-        """Execute tasks on remote machine"""
-        executor = self.resource_manager.machines[hostname]['executor']
-        try:
-            executor.connect()
-            
-            # Transfer necessary files
+    def stage_remote(self, hostname: str, queue: WorkQueue = None, hostnames: List[str] = None) -> None:
+        """Transfer the worker scripts to a remote machine and calibrate it for the queue"""
+        remote_execution_path = self.resource_manager.adapt_path(self.execution_path, hostname)
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.resource_manager.transfer_files_to_remote(
+            [(os.path.join(script_dir, name), os.path.join(remote_execution_path, name), [])
+             for name in WORKER_FILES],
+            hostname
+        )
+        if queue is not None and self.settings_dict.get('calibration', {}).get('enabled', True):
+            try:
+                self.calibrate_host(hostname)
+                self.apply_calibration(queue, hostnames or [hostname])
+            except Exception as e:
+                # The host still runs, starting from the default estimate
+                self.printlog(f"Failed to calibrate {hostname}: {str(e)}", level="warning")
+
+    def calibrate_host(self, hostname: str) -> dict:
+        """
+        Benchmark a machine unless its cached calibration still matches its CPU and container image.
+
+        Runs the synthetic kernel and a short ddsim job with the first detector variant of the
+        run (see host_calibration.py); a remote machine gets that variant staged and built
+        first. Results are cached on this machine.
+
+        Returns:
+            dict: The calibration of hostname
+        """
+        calibration_settings = self.settings_dict.get('calibration', {})
+        cache = CalibrationCache(max_age_days=calibration_settings.get('max_age_days', 30.0))
+        seconds = calibration_settings.get('seconds', 5.0)
+        compact = next(iter(self.sim_dict.values()))['sim_ip6_path'] if self.sim_dict else None
+        if not calibration_settings.get('ddsim', True):
+            compact = None
+
+        if hostname in self.resource_manager.current_hostname:
+            identity = host_identity(self.sif_path)
+            entry = cache.get(hostname, identity)
+            if entry is None:
+                self.printlog(f"Calibrating {hostname}", level="info")
+                entry = cache.put(hostname, calibrate(self.sif_path, compact, seconds))
+        else:
             remote_execution_path = self.resource_manager.adapt_path(self.execution_path, hostname)
-            remote_backup_path = self.resource_manager.adapt_path(self.backup_path, hostname)
-            
+            args = f"--sif {shlex.quote(self.resource_manager.adapt_shared_path(self.sif_path, hostname))}"
+            executor = self.resource_manager.machines[hostname]['executor']
+            stdout, _ = executor.execute_command(
+                f"cd {remote_execution_path} && python3 host_calibration.py --identity {args}", timeout=60
+            )
+            entry = cache.get(hostname, json.loads(stdout))
+            if entry is None:
+                self.printlog(f"Calibrating {hostname}", level="info")
+                if compact:
+                    # The benchmark needs the variant installed on the host, its tasks reuse the build
+                    variant_path = next(iter(self.sim_dict.values()))['sim_det_path']
+                    try:
+                        self.stage_variant(hostname, variant_path)
+                        _, stderr = executor.execute_command(
+                            f"cd {remote_execution_path} && python3 task_worker.py --build "
+                            f"{shlex.quote(self.resource_manager.adapt_path(variant_path, hostname))} {args}"
+                        )
+                        if stderr.strip():
+                            self.printlog(f"[{hostname}] {stderr.strip()}", level="debug")
+                        args += f" --compact {shlex.quote(self.resource_manager.adapt_path(compact, hostname))}"
+                    except Exception as e:
+                        self.printlog(f"Failed to prepare {variant_path} on {hostname}: {str(e)}", level="warning")
+                stdout, stderr = executor.execute_command(
+                    f"cd {remote_execution_path} && python3 host_calibration.py {args} --seconds {seconds}"
+                )
+                if not stdout.strip():
+                    raise RuntimeError(stderr.strip() or "no calibration output")
+                entry = cache.put(hostname, json.loads(stdout))
+
+        ddsim_rate = entry.get('ddsim_events_per_s')
+        if not ddsim_rate and calibration_settings.get('ddsim', True):
+            self.printlog(f"No ddsim benchmark on {hostname}, its throughput is scaled from the synthetic kernel",
+                          level="warning")
+        self.printlog(f"{hostname}: {entry['synthetic_per_s']:.1f} synthetic events/s per core"
+                      + (f", {ddsim_rate:.2f} ddsim events/s per core" if ddsim_rate else ""), level="info")
+        return entry
+
+    def apply_calibration(self, queue: WorkQueue, hostnames: List[str]) -> None:
+        """Start the hosts of the queue at their calibrated events/s per slot"""
+        entries = {hostname: entry for hostname, entry in CalibrationCache().read().items() if hostname in hostnames}
+        if not entries:
+            return
+        default = self.settings_dict.get('work_queue', {}).get('default_events_per_s', DEFAULT_EVENTS_PER_S)
+        for hostname, events_per_s in events_per_core(entries, default).items():
+            queue.set_throughput(hostname, events_per_s)
+
+    def stage_variant(self, hostname: str, variant_path: str) -> None:
+        """Transfer a detector variant to a remote machine"""
+        remote_variant_path = self.resource_manager.adapt_path(variant_path, hostname)
+        # An install is only valid at the path it was built for, elsewhere the worker rebuilds it
+        excludes = ["build/"] + (["install/"] if remote_variant_path != variant_path else [])
+        self.resource_manager.transfer_files_to_remote(
+            [(variant_path, remote_variant_path, excludes)], hostname, kind="variant"
+        )
+
+    def stage_task(self, hostname: str, spec: dict) -> None:
+        """Transfer what a task needs to a remote machine: its detector variant and HepMC input"""
+        self.stage_variant(hostname, spec['variant_path'])
+        input_file = re.search(r"--inputFiles (\S+)", spec['command'])
+        if input_file and os.path.exists(input_file.group(1)):
             self.resource_manager.transfer_files_to_remote(
-                self.execution_path,
-                remote_execution_path,
+                [(input_file.group(1), self.resource_manager.adapt_path(input_file.group(1), hostname), [])],
                 hostname
             )
-            
-            # Execute each task
-            for task in tasks:
-                adapted_task = {
-                    'sim_cmd': self.resource_manager.adapt_path(task['sim_cmd'], hostname),
-                    'detector_path': self.resource_manager.adapt_path(task['detector_path'], hostname),
-                    'shell_path': self.resource_manager.adapt_path(task['shell_path'], hostname),
-                    'px_key': task['px_key']
-                }
-                
-                cmd = f"cd {remote_execution_path} && python3 epic_sim_fuse.py --task '{json.dumps(adapted_task)}'"
-                stdout, stderr = executor.execute_command(cmd)
-                
-                if stderr:
-                    self.printlog(f"Remote execution error on {hostname}: {stderr}", level="error")
-                else:
-                    self.printlog(f"Remote execution completed on {hostname}: {stdout}", level="info")
-            
-            # Transfer results back
+
+    def fetch_outputs(self, hostname: str, spec: dict) -> None:
+        """Start fetching the outputs of a task completed on a remote machine"""
+        output_file = re.search(r"--outputFile (\S+)", spec['command'])
+        if output_file is None:
+            return
+        outputs = [output_file.group(1)]
+        if spec['reconstruct']:
+            outputs.append(os.path.join(os.path.dirname(outputs[0]), "recon", f"recon_{os.path.basename(outputs[0])}"))
+        for output in outputs:
             self.resource_manager.transfer_files_from_remote(
-                f"{remote_backup_path}/",
-                f"{self.backup_path}/",
-                hostname
+                self.resource_manager.adapt_path(output, hostname), output, hostname
             )
-            
-        finally:
-            executor.close()
+
+    def adapt_spec(self, spec: dict, hostname: str) -> dict:
+        """Task spec with its paths and environment adapted to a remote machine"""
+        adapted = dict(spec)
+        for key in ('variant_path', 'command', 'execution_path', 'sim_out_path', 'run_dir'):
+            if adapted.get(key):
+                adapted[key] = self.resource_manager.adapt_path(adapted[key], hostname)
+        # Nothing stages the image and plugins, a host has its own copy (a pseudo-host uses this machine's)
+        shared = [spec[key] for key in ('sif_path', 'plugin_path') if spec.get(key)]
+        for key in ('sif_path', 'plugin_path'):
+            if adapted.get(key):
+                adapted[key] = self.resource_manager.adapt_shared_path(adapted[key], hostname)
+        adapted['env'] = {
+            key: (self.resource_manager.adapt_shared_path if any(value.startswith(path) for path in shared)
+                  else self.resource_manager.adapt_path)(value, hostname)
+            for key, value in spec['env'].items()
+        }
+        return adapted
+
+    def collect_remote(self, hostname: str) -> None:
+        """Wait for the outputs of a remote machine and fetch its logs and metrics"""
+        for error in self.resource_manager.data_mover.wait(hostname):
+            self.printlog(f"Failed to fetch an output from {hostname}: {str(error)}", level="error")
+        # Logs and metrics land in hosts/<hostname>, the ROOT outputs were fetched task by task
+        host_dir = os.path.join(self.backup_path, "hosts", hostname)
+        try:
+            self.resource_manager.transfer_files_from_remote(
+                f"{self.resource_manager.adapt_path(self.backup_path, hostname)}/", f"{host_dir}/",
+                hostname, excludes=["*.root"]
+            ).result()
+        except Exception as e:
+            self.printlog(f"Failed to fetch the logs of {hostname}: {str(e)}", level="error")
+            return
+        remote_metrics = MetricsTable(host_dir)
+        local_metrics = MetricsTable(self.backup_path)
+        for record in remote_metrics.read():
+            local_metrics.append(record)
+
+    def run_remote_tasks(self, hostname: str, queue: WorkQueue, slots: int, staged=None) -> None:
+        """
+        Feed a remote machine's worker pool (task_worker.serve) from the queue over one SSH channel.
+
+        A task is pulled whenever one of the remote slots is free and its status is read back
+        as soon as it finishes; when the queue has nothing left for the host its input is
+        closed and the remote pool drains. If the channel ends with tasks still running the
+        host is dropped and those tasks go back to the queue.
+
+        Args:
+            hostname: Remote machine
+            queue: The run's work queue
+            slots: Tasks the remote pool runs at the same time
+            staged: Future of the input transfer to hostname
+        """
+        try:
+            if staged is not None:
+                staged.result()
+        except Exception as e:
+            queue.drop_host(hostname, f"staging failed: {str(e)}")
+            return
+        queue.mark_ready(hostname)
+        
+        remote_execution_path = self.resource_manager.adapt_path(self.execution_path, hostname)
+        cmd = f"cd {remote_execution_path} && python3 task_worker.py --slots {slots}"
+        in_flight = {}  # task_id -> spec
+        in_flight_lock = threading.Lock()
+        free_slots = threading.Semaphore(slots)
+        closed = threading.Event()
+        drained = threading.Event()  # the queue has nothing left for this host
+        
+        try:
+            with self.resource_manager.machines[hostname]['executor'].session(cmd) as (stdin, stdout, stderr):
+                def feed() -> None:
+                    try:
+                        while True:
+                            free_slots.acquire()
+                            if closed.is_set():
+                                return
+                            lease = queue.next_task(hostname)
+                            if lease is None:
+                                drained.set()
+                                return
+                            with in_flight_lock:
+                                in_flight[lease['task_id']] = lease['task']
+                            self.stage_task(hostname, lease['task'])
+                            stdin.write(json.dumps({'task_id': lease['task_id'],
+                                                    'spec': self.adapt_spec(lease['task'], hostname)}) + "\n")
+                            stdin.flush()
+                    finally:
+                        stdin.channel.shutdown_write()
+                
+                def drain_stderr() -> None:
+                    for line in stderr:
+                        self.logger.debug(f"[{hostname}] {line.rstrip()}")
+                
+                feeder = threading.Thread(target=feed, daemon=True)
+                feeder.start()
+                threading.Thread(target=drain_stderr, daemon=True).start()
+                
+                for line in stdout:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        message = None
+                    if not isinstance(message, dict):
+                        self.logger.debug(f"[{hostname}] {line.rstrip()}")
+                        continue
+                    queue.heartbeat(hostname)
+                    task_id = message.pop('task_id', None)
+                    if task_id is None:
+                        continue  # ready or heartbeat
+                    with in_flight_lock:
+                        spec = in_flight.pop(task_id, None)
+                    wall_s = message.pop('wall_s', None)
+                    if queue.complete(task_id, hostname, message, wall_s=wall_s) and \
+                       spec is not None and message.get('status') == 'completed':
+                        # Outputs come back while the host keeps computing
+                        self.fetch_outputs(hostname, spec)
+                    self.printlog(f"Task {task_id} on {hostname}: {message['status']}", level="info")
+                    free_slots.release()
+                
+                closed.set()
+                free_slots.release()  # wake the feeder if it waits for a slot
+                if not drained.is_set() or in_flight:
+                    # The remote pool ended before the queue did, the feeder returns once the host is dropped
+                    queue.drop_host(hostname, f"worker pool ended with {len(in_flight)} tasks running")
+                feeder.join()
+        except Exception as e:
+            self.printlog(f"Remote worker pool on {hostname} failed: {str(e)}", level="error")
+        
+        closed.set()
+        if not drained.is_set() or in_flight:
+            queue.drop_host(hostname, f"worker pool ended with {len(in_flight)} tasks running")
 
 if __name__ == "__main__":
 
+    if len(sys.argv) > 1 and sys.argv[1] in ("--task", "--worker"):
+        # Worker modes only run prepared task specs, see task_worker.py
+        from task_worker import main
+        argv = sys.argv[1:]
+        if argv[0] == "--worker":
+            argv = ["--slots", argv[1] if len(argv) > 1 else str(os.cpu_count())]
+        sys.exit(main(argv))
+
     """ Simulation """
     # initialize the simulation handler
     eic_simulation = HandleSim()
@@ -1397,14 +1914,7 @@ if __name__ == "__main__":
     eic_simulation.prep_sim()
 
     # execute the simulation and reconstruction in parallel
-    if len(sys.argv) > 1 and sys.argv[1].startswith("--task"):
-        # Remote execution mode
-        task_json = sys.argv[1].split("'")[1]
-        task = json.loads(task_json)
-        eic_simulation.run_single_sim(**task)
-    else:
-        # Local execution mode
-        eic_simulation.exec_simv2()  # Use the new execution function
+    eic_simulation.exec_simv2()  # Use the new execution function
 
     # Only merge if reconstruction was successful
     if eic_simulation.reconstruct:
@@ -1414,4 +1924,8 @@ if __name__ == "__main__":
     # Create README directly instead of calling mk_sim_backup
     eic_simulation.printlog("Creating README file.", level="info")
     eic_simulation.setup_readme()
+    eic_simulation.resource_manager.telemetry.stop()
+    eic_simulation.resource_manager.data_mover.close()
+    eic_simulation.resource_manager.ssh_pool.close_all()
+    eic_simulation.resource_manager.local_transport.close_all()
     eic_simulation.printlog("Simulation process completed.", level="info")
\ No newline at end of file
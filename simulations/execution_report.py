@@ -0,0 +1,328 @@
+"""
+Execution report of a simulation campaign, built from structured task records.
+
+Every task of a run becomes one record (pixel key, stage, file type, energy,
+shard, status, error and its resource usage from metrics.jsonl). The report
+is derived from these records only: totals, per-configuration throughput
+and CPU-hours, failures grouped by signature and the critical path. It is
+written as execution_report.json with the task table next to it
+(execution_report.csv, and .parquet when pandas is available), and the
+human-readable execution_report.txt is rendered from the same data.
+"""
+import os
+import re
+import csv
+import json
+from datetime import datetime
+from typing import Dict, List
+
+REPORT_NAME = "execution_report"
+STAGE_TITLES = {"sim": "Simulation", "recon": "Reconstruction"}
+TASK_COLUMNS = [
+    "task_id", "px_key", "stage", "file_type", "energy", "shard", "status", "error_signature",
+    "events", "start", "end", "wall_s", "cpu_s", "events_per_s", "peak_rss_mb", "output_bytes", "attempts"
+]
+
+# Parts of error messages that differ between otherwise identical failures
+_SIGNATURE_SUBSTITUTIONS = [
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<addr>"),
+    (re.compile(r"(?:/[^\s/:'\"]+)+/?"), "<path>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "N"),
+    (re.compile(r"\s+"), " "),
+]
+_ERROR_LINE = re.compile(r"error|exception|fatal|abort|segmentation|killed|traceback", re.IGNORECASE)
+
+
+def failure_signature(error: str) -> str:
+    """
+    Short normalised form of an error message for grouping failures.
+
+    The last line that looks like an error (else the last line) with paths,
+    numbers and addresses replaced, so the same failure of different tasks
+    gets the same signature.
+    """
+    lines = [line.strip() for line in str(error or "").splitlines() if line.strip()]
+    if not lines:
+        return "unknown error"
+    error_lines = [line for line in lines if _ERROR_LINE.search(line)]
+    line = (error_lines or lines)[-1]
+    for pattern, replacement in _SIGNATURE_SUBSTITUTIONS:
+        line = pattern.sub(replacement, line)
+    return line.strip()[:200]
+
+
+def task_records(tasks: List[Dict], task_status: Dict[str, Dict], metrics: List[Dict]) -> List[Dict]:
+    """
+    One record per task with its outcome and resource usage.
+
+    Args:
+        tasks: Task dicts of the run (task_id, px_key, type, file_type, energy, shard, events)
+        task_status: Result of every executed task by task_id
+        metrics: Rows of metrics.jsonl; several rows of one task (DEBUG re-runs) are added up
+
+    Returns:
+        List[Dict]: Task records in the order of tasks
+    """
+    usage: Dict[str, Dict] = {}
+    for row in metrics:
+        entry = usage.setdefault(row["task_id"], {
+            "start": row["start"], "end": row["end"], "wall_s": 0.0, "cpu_s": 0.0,
+            "peak_rss_mb": 0.0, "output_bytes": None, "attempts": 0
+        })
+        entry["start"] = min(entry["start"], row["start"])
+        entry["end"] = max(entry["end"], row["end"])
+        entry["wall_s"] += row["wall_s"]
+        entry["cpu_s"] += row["user_s"] + row["sys_s"]
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"], row["peak_rss_mb"])
+        if row.get("output_bytes") is not None and row.get("attempt") is None:
+            entry["output_bytes"] = row["output_bytes"]
+        entry["attempts"] += 1
+
+    records = []
+    for task in tasks:
+        status = task_status.get(task["task_id"])
+        if status is None:
+            continue  # never executed (e.g. reconstruction of a failed simulation)
+        used = usage.get(task["task_id"], {})
+        failed = status.get("status") != "completed"
+        events = task.get("events") if not failed else None
+        wall = used.get("wall_s")
+        records.append({
+            "task_id": task["task_id"],
+            "px_key": task["px_key"],
+            "stage": task["type"],
+            "file_type": task.get("file_type"),
+            "energy": task.get("energy"),
+            "shard": task.get("shard"),
+            "status": status.get("status", "failed"),
+            "error": str(status.get("error"))[-2000:] if failed else None,  # tail of the task output
+            "error_signature": failure_signature(status.get("error")) if failed else None,
+            "events": events,
+            "start": used.get("start"),
+            "end": used.get("end"),
+            "wall_s": round(wall, 3) if wall is not None else None,
+            "cpu_s": round(used["cpu_s"], 3) if used else None,
+            "events_per_s": round(events / wall, 3) if events and wall else None,
+            "peak_rss_mb": used.get("peak_rss_mb"),
+            "output_bytes": used.get("output_bytes"),
+            "attempts": used.get("attempts", 0),
+        })
+    return records
+
+
+def _throughput(records: List[Dict]) -> Dict:
+    """Task counts, events, wall time, CPU-hours and events/s of a group of records."""
+    completed = [record for record in records if record["status"] == "completed"]
+    events = sum(record["events"] or 0 for record in completed)
+    wall = sum(record["wall_s"] or 0.0 for record in completed)
+    return {
+        "tasks": len(records),
+        "completed": len(completed),
+        "failed": len(records) - len(completed),
+        "events": events,
+        "wall_s": round(wall, 3),
+        "cpu_hours": round(sum(record["cpu_s"] or 0.0 for record in records) / 3600, 4),
+        "events_per_s": round(events / wall, 3) if wall > 0 else None,
+    }
+
+
+def critical_path(records: List[Dict]) -> Dict:
+    """
+    Tasks that determined the run time.
+
+    All reconstructions start after the last simulation (and merging after the
+    last reconstruction), so the critical path is the last task to finish in
+    each stage; slack is how much longer it took than the stage's median task.
+    """
+    timed = [record for record in records if record["start"] is not None]
+    if not timed:
+        return {"tasks": [], "makespan_s": None}
+    path = []
+    for stage in STAGE_TITLES:
+        members = [record for record in timed if record["stage"] == stage]
+        if not members:
+            continue
+        last = max(members, key=lambda record: record["end"])
+        walls = sorted(record["wall_s"] for record in members)
+        median = walls[len(walls) // 2]
+        path.append({
+            "stage": stage,
+            "task_id": last["task_id"],
+            "start": last["start"],
+            "end": last["end"],
+            "wall_s": last["wall_s"],
+            "stage_span_s": round(last["end"] - min(record["start"] for record in members), 3),
+            "slack_s": round(last["wall_s"] - median, 3),
+        })
+    return {
+        "tasks": path,
+        "makespan_s": round(max(record["end"] for record in timed) - min(record["start"] for record in timed), 3),
+    }
+
+
+def build_report(records: List[Dict], configuration: Dict, resources: Dict = None, run_id: str = None) -> Dict:
+    """
+    Execution report of a run from its task records.
+
+    Args:
+        records: Output of task_records
+        configuration: Settings of the run shown in the report header
+        resources: Per task type totals of MetricsTable.summary()
+        run_id: Identifier of the run
+
+    Returns:
+        Dict: JSON-serialisable report
+    """
+    configs: Dict[tuple, List[Dict]] = {}
+    for record in records:
+        configs.setdefault((record["px_key"], record["stage"]), []).append(record)
+
+    failures: Dict[str, Dict] = {}
+    for record in records:
+        if record["status"] == "completed":
+            continue
+        entry = failures.setdefault(record["error_signature"], {
+            "signature": record["error_signature"], "count": 0, "task_ids": [], "example": record["error"]
+        })
+        entry["count"] += 1
+        entry["task_ids"].append(record["task_id"])
+
+    return {
+        "generated": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "run_id": run_id,
+        "configuration": configuration,
+        "summary": _throughput(records),
+        "configs": [
+            {"px_key": px_key, "stage": stage, **_throughput(members)}
+            for (px_key, stage), members in configs.items()
+        ],
+        "failures": sorted(failures.values(), key=lambda entry: -entry["count"]),
+        "critical_path": critical_path(records),
+        "resources": resources or {},
+        "tasks": records,
+    }
+
+
+def render_text(report: Dict) -> str:
+    """Human-readable execution report of the same data."""
+    config = report["configuration"]
+    summary = report["summary"]
+    lines = [
+        "EPIC Simulation Report",
+        "====================",
+        f"Generated: {report['generated']}",
+        "",
+        "Configuration",
+        "-------------",
+        f"Particles: {config['particles']:,}",
+        f"File Types: {', '.join(config['file_types'])}",
+        f"Energies (GeV): {', '.join(map(str, config['energies']))}",
+    ]
+    campaign = config.get("campaign")
+    if campaign is not None:
+        lines.append(f"Campaign: {campaign['spectrum']} {campaign['energy_min']:g}-{campaign['energy_max']:g} GeV, "
+                     f"{campaign['events']:,} events in {campaign['shards']} shards")
+    lines += [f"Reconstruction: {'Enabled' if config['reconstruction'] else 'Disabled'}", ""]
+
+    lines += ["Execution Summary", "----------------", f"Total Tasks: {summary['tasks']}"]
+    if summary["tasks"]:
+        lines.append(f"Success Rate: {summary['completed'] / summary['tasks'] * 100:.1f}% "
+                     f"({summary['completed']}/{summary['tasks']})")
+    if summary["failed"] > 0:
+        lines.append(f"Failed Tasks: {summary['failed']}")
+    lines.append(f"CPU: {summary['cpu_hours']:.2f} h")
+    if report["critical_path"]["makespan_s"] is not None:
+        lines.append(f"Task makespan: {report['critical_path']['makespan_s'] / 3600:.2f} h")
+    lines.append("")
+
+    lines += ["Status by Configuration", "----------------------"]
+    by_pixel: Dict[str, Dict[str, Dict]] = {}
+    for config_entry in report["configs"]:
+        by_pixel.setdefault(config_entry["px_key"], {})[config_entry["stage"]] = config_entry
+    for px_key, stages in by_pixel.items():
+        lines += ["", f"[{px_key}]"]
+        for stage, title in STAGE_TITLES.items():
+            entry = stages.get(stage)
+            if entry is None:
+                continue
+            line = f"{title}: {entry['completed']}/{entry['tasks']} completed"
+            if entry["failed"] > 0:
+                line += f" ({entry['failed']} failed)"
+            if entry["events_per_s"] is not None:
+                line += f", {entry['events_per_s']:.2f} events/s"
+            line += f", {entry['cpu_hours']:.2f} CPU-h"
+            lines.append(line)
+            failed = [record for record in report["tasks"] if record["px_key"] == px_key
+                      and record["stage"] == stage and record["status"] != "completed"]
+            if failed:
+                lines.append("  Failed:")
+                for record in failed:
+                    energy = str(record["energy"])
+                    energy += "" if energy.endswith("GeV") else " GeV"  # campaign keys carry their unit
+                    shard = f" (shard {record['shard']})" if record["shard"] is not None else ""
+                    lines.append(f"  - {record['file_type']} @ {energy}{shard}: {record['error_signature']}")
+
+    if report["failures"]:
+        lines += ["", "Failure Signatures", "------------------"]
+        for entry in report["failures"]:
+            lines.append(f"{entry['count']} x {entry['signature']}")
+            lines.append(f"    e.g. {entry['task_ids'][0]}")
+
+    if report["critical_path"]["tasks"]:
+        lines += ["", "Critical Path", "-------------"]
+        for step in report["critical_path"]["tasks"]:
+            lines.append(f"{STAGE_TITLES[step['stage']]}: {step['task_id']} finished last, "
+                         f"{step['wall_s'] / 60:.1f} min ({step['slack_s'] / 60:+.1f} min vs. median task), "
+                         f"stage span {step['stage_span_s'] / 60:.1f} min")
+
+    if report.get("regressions"):
+        lines += ["", "Throughput Regressions", "----------------------"]
+        for alert in report["regressions"]:
+            lines.append(f"{STAGE_TITLES[alert['stage']]} {alert['file_type']} {alert['px_key']}px "
+                         f"@ {', '.join(alert['energies'])}: "
+                         f"{alert['events_per_s']:.2f} events/s vs. {alert['baseline_events_per_s']:.2f} "
+                         f"over the last {alert['baseline_runs']} runs ({alert['slowdown']:.0%} slower, "
+                         f"p = {alert['p_value']:.1e})")
+
+    if report["resources"]:
+        lines += ["", "Resource Usage", "--------------"]
+        for task_type, usage in report["resources"].items():
+            lines.append(
+                f"{task_type}: {usage['tasks']} tasks, wall {usage['wall_s'] / 3600:.2f} h, "
+                f"CPU {usage['cpu_s'] / 3600:.2f} h, CPU efficiency {usage['cpu_efficiency']:.2f}, "
+                f"{usage['events_per_s']:.2f} events/s, peak RSS {usage['peak_rss_mb']:.0f} MB, "
+                f"I/O {usage['read_bytes'] / 2**30:.2f}/{usage['write_bytes'] / 2**30:.2f} GB read/written"
+            )
+
+    lines += ["", "Machine-readable report: " + ", ".join(report.get("files", [])),
+              "", "=" * 50, f"Report generated at: {report['generated']}", ""]
+    return "\n".join(lines)
+
+
+def write_report(report: Dict, run_dir: str) -> List[str]:
+    """
+    Write execution_report.json/.csv/.parquet and the text rendering into run_dir.
+
+    Returns:
+        List[str]: Paths written
+    """
+    base = os.path.join(run_dir, REPORT_NAME)
+    paths = [f"{base}.json", f"{base}.csv"]
+
+    with open(f"{base}.csv", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TASK_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(report["tasks"])
+    try:
+        import pandas as pd
+        pd.DataFrame(report["tasks"]).to_parquet(f"{base}.parquet")
+        paths.append(f"{base}.parquet")
+    except ImportError:
+        pass
+
+    report["files"] = [os.path.basename(path) for path in paths]
+    with open(f"{base}.json", 'w') as f:
+        json.dump(report, f, indent=2)
+    with open(f"{base}.txt", 'w') as f:
+        f.write(render_text(report))
+    return paths + [f"{base}.txt"]
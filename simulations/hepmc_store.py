@@ -0,0 +1,260 @@
+"""
+Concurrency-safe store for the generated HepMC inputs shared between runs.
+
+Several HandleSim runs may point at the same hepmc_input_path. The store makes
+sure only one of them produces a given file (per-file advisory locks), that
+nobody ever sees a half written file (temp name + atomic rename) and keeps a
+reference count per file so unused inputs can be garbage collected.
+"""
+import os
+import json
+import time
+import fcntl
+import socket
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+class HepMCStore(object):
+    """
+    Shared directory of HepMC files with per-file locks and reference counts.
+
+    Layout inside the store directory:
+        <name>.hepmc                      committed files
+        .<name>.<host>.<pid>.partial.hepmc  files being written
+        .locks/<name>.lock                per-file producer locks
+        .store.json                       manifest with references and usage
+    """
+
+    MANIFEST = ".store.json"
+
+    def __init__(self, root: str, logger=None) -> None:
+        self.root = root
+        self.logger = logger
+        self.lock_dir = os.path.join(root, ".locks")
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self.hostname = socket.gethostname()
+        self._held: Dict[str, int] = {}  # file name -> open lock fd
+
+    def _log(self, message: str, level: str = "info") -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    def path(self, name: str) -> str:
+        """Final path of a file in the store."""
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        """Check whether a file has been committed to the store."""
+        return os.path.exists(self.path(name))
+
+    def temp_path(self, name: str) -> str:
+        """
+        Private path to write a file to before it is committed.
+
+        Keeps the .hepmc extension (abconv appends it to its -o argument) and
+        lives in the store directory so the final rename is atomic.
+        """
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.root, f".{stem}.{self.hostname}.{os.getpid()}.partial.hepmc")
+
+    def commit(self, name: str, temp_path: str) -> str:
+        """
+        Atomically publish a finished temp file under its final name.
+
+        Returns:
+            str: The final path
+        """
+        if not os.path.exists(temp_path):
+            raise RuntimeError(f"Cannot commit {name}, temp file not found: {temp_path}")
+        final_path = self.path(name)
+        os.replace(temp_path, final_path)
+        with self._manifest() as manifest:
+            entry = manifest.setdefault(name, {"refs": []})
+            entry["created"] = entry["last_used"] = time.time()
+            entry["size"] = os.path.getsize(final_path)
+        self._log(f"Committed {final_path}")
+        return final_path
+
+    def discard(self, temp_path: str) -> None:
+        """Remove a temp file left over by a failed producer step."""
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # ------------------------------------------------------------------
+    # Producer locks
+    # ------------------------------------------------------------------
+    def _lock_fd(self, name: str) -> int:
+        return os.open(os.path.join(self.lock_dir, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+
+    def try_claim(self, names: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Try to become the producer of all missing files in names without blocking.
+
+        Claiming is all-or-nothing: if any missing file is being produced by
+        someone else, no lock is kept.
+
+        Returns:
+            Tuple[List[str], List[str]]: (claimed files, files busy elsewhere)
+        """
+        claimed, busy = [], []
+        for name in names:
+            if self.exists(name):
+                continue
+            fd = self._lock_fd(name)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                busy.append(name)
+                continue
+            # The previous holder may have committed it just before we got the lock
+            if self.exists(name):
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+                continue
+            self._held[name] = fd
+            claimed.append(name)
+
+        if busy:
+            self.release(claimed)
+            return [], busy
+        return claimed, busy
+
+    def release(self, names: List[str]) -> None:
+        """Release producer locks held by this process."""
+        for name in names:
+            fd = self._held.pop(name, None)
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def wait_for(self, names: List[str], timeout: float = None) -> None:
+        """
+        Block until no other process holds the producer lock of the given files.
+
+        Args:
+            names: Files another process is producing
+            timeout: Give up after this many seconds (None waits forever)
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        for name in names:
+            self._log(f"Waiting for in-flight producer of {name}")
+            fd = self._lock_fd(name)
+            try:
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if deadline is not None and time.time() > deadline:
+                            raise TimeoutError(f"Timed out waiting for producer of {name}")
+                        time.sleep(2)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+    # ------------------------------------------------------------------
+    # Reference counting and garbage collection
+    # ------------------------------------------------------------------
+    @contextmanager
+    def _manifest(self):
+        """Read-modify-write the manifest under an exclusive lock."""
+        manifest_path = os.path.join(self.root, self.MANIFEST)
+        fd = os.open(os.path.join(self.lock_dir, f"{self.MANIFEST}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            manifest = {}
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'r') as f:
+                    try:
+                        manifest = json.load(f)
+                    except json.JSONDecodeError:
+                        self._log(f"Corrupt store manifest {manifest_path}, starting a new one", "warning")
+            yield manifest
+            tmp_path = f"{manifest_path}.{self.hostname}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, manifest_path)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def add_refs(self, run_id: str, names: List[str]) -> List[str]:
+        """
+        Record that run_id uses the given files.
+
+        Existence is checked under the manifest lock, so a file garbage
+        collected after the caller last saw it is reported rather than
+        silently referenced.
+
+        Returns:
+            List[str]: Names that are not in the store (to be regenerated)
+        """
+        now = time.time()
+        missing = []
+        with self._manifest() as manifest:
+            for name in names:
+                if not self.exists(name):
+                    missing.append(name)
+                entry = manifest.setdefault(name, {"refs": [], "created": now})
+                if run_id not in entry["refs"]:
+                    entry["refs"].append(run_id)
+                entry["last_used"] = now
+        return missing
+
+    def release_refs(self, run_id: str) -> None:
+        """Drop every reference held by run_id."""
+        now = time.time()
+        with self._manifest() as manifest:
+            for entry in manifest.values():
+                if run_id in entry.get("refs", []):
+                    entry["refs"].remove(run_id)
+                    entry["last_used"] = now
+
+    def _ref_alive(self, run_id: str) -> bool:
+        """Runs on this host whose process is gone no longer hold their references."""
+        parts = run_id.split(":")
+        if len(parts) < 2 or parts[0] != self.hostname:
+            return True
+        try:
+            os.kill(int(parts[1]), 0)
+        except (ValueError, ProcessLookupError):
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def garbage_collect(self, max_age_days: float) -> List[str]:
+        """
+        Delete unreferenced files not used for more than max_age_days.
+
+        A file is only removed while holding its producer lock as well, files
+        being (re)produced by another run are left alone.
+
+        Returns:
+            List[str]: Names of removed files
+        """
+        cutoff = time.time() - max_age_days * 86400
+        removed = []
+        with self._manifest() as manifest:
+            for name, entry in list(manifest.items()):
+                entry["refs"] = [ref for ref in entry.get("refs", []) if self._ref_alive(ref)]
+                if entry["refs"] or entry.get("last_used", 0) > cutoff:
+                    continue
+                fd = self._lock_fd(name)
+                try:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    if self.exists(name):
+                        os.remove(self.path(name))
+                    del manifest[name]
+                    removed.append(name)
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                finally:
+                    os.close(fd)
+        if removed:
+            self._log(f"Garbage collected {len(removed)} HepMC files: {removed}")
+        return removed
@@ -0,0 +1,267 @@
+"""
+Host-wide admission control for concurrent runs on one machine.
+
+Every HandleSim run registers in a broker directory shared by all users of the
+host (/tmp/epic_sim_broker, sticky like /tmp, no service to run): its own
+JSON file, written only by the run itself, holds its priority, how many
+tasks it could run at once (demand) and the peak memory of one task. Each
+run reads the files of all runs every few seconds, without following
+symlinks, and recomputes the allocation of the whole host: the CPUs (minus a reserve) and a fraction of the
+physical memory are divided between the live runs by weighted max-min
+fairness (priority as weight, no run gets more than its demand, what a run
+does not need goes to the others): memory first, then the CPUs among the
+tasks that fit into each run's memory share. Every run gets at least one
+slot.
+
+A run only starts a task while it holds fewer tasks than its slots
+(AdaptiveSemaphore). Shrinking takes effect as running tasks finish;
+nothing is preempted. Runs heartbeat into their file; a run that ends
+removes it, and one that died (its process is gone or it stopped
+heartbeating) is ignored by the others, so its share goes back to them.
+"""
+import os
+import json
+import stat
+import time
+import socket
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+BROKER_DIR = "/tmp/epic_sim_broker"
+
+
+def _water_fill(capacity: float, demands: Dict[str, float], weights: Dict[str, float]) -> Dict[str, float]:
+    """Weighted max-min fair division of capacity, no key getting more than its demand."""
+    shares = {key: 0.0 for key in demands}
+    active = {key for key, demand in demands.items() if demand > 0}
+    remaining = capacity
+    while active and remaining > 1e-9:
+        total_weight = sum(weights[key] for key in active)
+        satisfied = {key for key in active
+                     if demands[key] - shares[key] <= remaining * weights[key] / total_weight}
+        if not satisfied:
+            for key in active:
+                shares[key] += remaining * weights[key] / total_weight
+            break
+        for key in satisfied:
+            remaining -= demands[key] - shares[key]
+            shares[key] = demands[key]
+        active -= satisfied
+    return shares
+
+
+def fair_slots(runs: Dict[str, dict], cpus: int, memory_mb: float) -> Dict[str, int]:
+    """
+    Task slots of every run.
+
+    Args:
+        runs: Per run priority, demand (tasks) and memory_mb (per task)
+        cpus: CPUs to divide
+        memory_mb: Memory to divide
+
+    Returns:
+        Dict[str, int]: Slots per run, at least 1
+    """
+    weights = {key: max(run['priority'], 1e-3) for key, run in runs.items()}
+    memory_shares = _water_fill(memory_mb, {key: run['demand'] * run['memory_mb'] for key, run in runs.items()},
+                                weights)
+    # CPUs a run cannot use for lack of memory go to the others
+    demands = {key: min(run['demand'], memory_shares[key] / max(run['memory_mb'], 1.0)) for key, run in runs.items()}
+    cpu_shares = _water_fill(cpus, demands, weights)
+    return {key: max(1, int(cpu_shares[key] + 1e-6)) for key in runs}
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # another user's process
+    return True
+
+
+class AdaptiveSemaphore(object):
+    """Semaphore whose number of permits can change while it is held."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.held = 0
+        self._cond = threading.Condition()
+
+    def set_limit(self, limit: int) -> None:
+        with self._cond:
+            self.limit = max(1, limit)
+            self._cond.notify_all()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.held >= self.limit:
+                self._cond.wait()
+            self.held += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.held -= 1
+            self._cond.notify_all()
+
+
+class HostBroker(object):
+    """
+    Registration of one run with the host's broker state.
+
+    Usage:
+        broker = HostBroker(priority=1.0)
+        broker.register(run_id, demand=len(tasks), memory_mb=2500)
+        with broker.slot():
+            run(task)
+        broker.close()
+    """
+
+    SUFFIX = ".run.json"
+
+    def __init__(self, path: str = BROKER_DIR, priority: float = 1.0, reserve_cpus: int = 1,
+                 memory_fraction: float = 0.9, interval: float = 5.0, ttl: float = 60.0, logger=None) -> None:
+        self.path = path
+        self.priority = priority
+        self.cpus = max(1, os.cpu_count() - reserve_cpus)
+        self.memory_mb = memory_fraction * os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 2**20
+        self.interval = interval
+        self.ttl = ttl
+        self.logger = logger
+        self.key = None
+        self.demand = 0
+        self.task_memory_mb = 0.0
+        self.semaphore = AdaptiveSemaphore(1)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _log(self, message: str, level: str = "info") -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    def _directory(self) -> str:
+        """The broker directory, created sticky and world-writable like /tmp on first use."""
+        try:
+            os.mkdir(self.path)
+            os.chmod(self.path, 0o1777)  # only the directory just created
+        except FileExistsError:
+            pass
+        info = os.lstat(self.path)
+        if not stat.S_ISDIR(info.st_mode) or not info.st_mode & stat.S_ISVTX:
+            raise OSError(f"Broker directory {self.path} is not a sticky directory")
+        return self.path
+
+    def _run_path(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest()[:16] + self.SUFFIX)
+
+    def _read_runs(self) -> Dict[str, dict]:
+        """Live runs of the host by key, read from their files (symlinks are not followed)."""
+        runs = {}
+        now = time.time()
+        for name in os.listdir(self._directory()):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                fd = os.open(os.path.join(self.path, name), os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+                with os.fdopen(fd, 'r') as f:
+                    if not stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+                        continue
+                    run = json.load(f)
+                key = run.pop('key')
+                if key != self.key and (now - run['heartbeat'] > self.ttl or not _alive(run['pid'])):
+                    continue  # left behind by a run that died
+                runs[key] = run
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                continue  # removed meanwhile or not a registration
+        return runs
+
+    def _write_run(self) -> None:
+        """Replace this run's file atomically with its current registration."""
+        run = {
+            "key": self.key, "user": os.environ.get("USER", str(os.getuid())), "pid": os.getpid(),
+            "priority": self.priority, "demand": self.demand, "memory_mb": self.task_memory_mb,
+            "heartbeat": time.time()
+        }
+        # A new file of this user's (O_EXCL), so a planted symlink is never written through
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory(), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(run, f, indent=2)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self._run_path(self.key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _update(self) -> None:
+        if self.key is not None:
+            self._write_run()
+        runs = self._read_runs()
+        slots = fair_slots(runs, self.cpus, self.memory_mb) if runs else {}
+        if self.key is not None and self.key in slots and slots[self.key] != self.semaphore.limit:
+            self._log(f"Admission: {slots[self.key]} task slots ({len(runs)} runs on {socket.gethostname()}, "
+                      f"{self.cpus} CPUs, {self.memory_mb / 1024:.0f} GB)")
+            self.semaphore.set_limit(slots[self.key])
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self._update()
+            except OSError as e:
+                self._log(f"Admission: registration not updated: {str(e)}", level="warning")
+
+    def register(self, run_id: str, demand: int, memory_mb: float) -> int:
+        """
+        Register the run and start following its allocation.
+
+        Args:
+            run_id: Id of the run, unique on the host
+            demand: Tasks the run could run at the same time
+            memory_mb: Peak memory of one task
+
+        Returns:
+            int: Task slots of the run
+        """
+        self.key = run_id
+        self.demand = demand
+        self.task_memory_mb = memory_mb
+        self._update()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._heartbeat, name="host-broker", daemon=True)
+            self._thread.start()
+        return self.semaphore.limit
+
+    def set_demand(self, demand: int, memory_mb: float = None) -> int:
+        """Change how many tasks (of how much memory) the run could run at once; returns its slots."""
+        self.demand = demand
+        if memory_mb is not None:
+            self.task_memory_mb = memory_mb
+        self._update()
+        return self.semaphore.limit
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the run's task slots."""
+        self.semaphore.acquire()
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+    def close(self) -> None:
+        """Unregister the run, its share goes to the other runs on their next update."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+        if self.key is not None:
+            key, self.key = self.key, None
+            try:
+                os.unlink(self._run_path(key))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,223 @@
+"""
+Per-host calibration of simulation throughput.
+
+A core of one machine is not a core of another. Each host runs a short
+benchmark once: a fixed small ddsim job (particle gun through a built
+detector, timed at two event counts so the geometry load cancels out)
+when the container and a detector are available there, and always a
+synthetic Geant4-like CPU kernel (particles stepped through material with
+sampled free paths, scattering, energy loss and secondaries) that needs
+nothing but Python. Hosts without a ddsim result get the ddsim rate of a
+host that has one, scaled by the ratio of their synthetic rates.
+
+Results are kept per host in ~/.cache/epic_sim/host_calibration.json
+together with the host's identity (CPU model, cores, container image) and
+rerun when the identity changes or the result is too old. The work queue
+of epic_sim_fuse.py starts every host at its calibrated events/s per core
+and epic_sim2.py plan uses this host's rate when the run catalog has no
+history.
+
+Run on a host (prints the result; --save also stores it for this host):
+    python3 host_calibration.py --sif <image> --compact <epic_ip6_extended.xml> [--save]
+    python3 host_calibration.py --identity --sif <image>
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List
+
+CALIBRATION_FILE = "~/.cache/epic_sim/host_calibration.json"
+MAX_AGE_DAYS = 30.0
+SYNTHETIC_SECONDS = 5.0
+DDSIM_EVENTS = (10, 60)  # the difference of the two runs is the per-event time
+
+_cache_lock = threading.Lock()  # hosts are calibrated from concurrent staging threads
+
+
+def host_identity(sif_path: str = None) -> Dict:
+    """CPU model, core count and container image (path:size:mtime) of this host."""
+    cpu_model = "unknown"
+    try:
+        with open("/proc/cpuinfo", 'r') as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    image = None
+    if sif_path and os.path.exists(sif_path):
+        stat = os.stat(sif_path)
+        image = f"{os.path.realpath(sif_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    return {"hostname": socket.gethostname(), "cpu_model": cpu_model, "cores": os.cpu_count(), "image": image}
+
+
+def _shower(rng: random.Random, energy: float = 1000.0) -> int:
+    """One synthetic event: transport a particle and its secondaries down to the cut; returns steps."""
+    cut, radiation_length = 1.0, 1.0
+    stack = [(energy, 0.0, 0.0, 0.0, 1.0)]  # energy, x, y, z, cos(theta)
+    steps = 0
+    while stack:
+        e, x, y, z, direction = stack.pop()
+        while e > cut and z < 50.0:
+            step = -math.log(1.0 - rng.random()) * radiation_length
+            theta = rng.gauss(0.0, 0.0136 / e * math.sqrt(step))  # multiple scattering
+            direction = max(-1.0, min(1.0, direction * math.cos(theta)))
+            z += step * direction
+            x += step * math.sin(theta)
+            y += step * math.sin(theta) * rng.random()
+            e -= 0.02 * step * e + 0.001 * step
+            if rng.random() < 0.3:
+                # Bremsstrahlung / pair production: split off a secondary
+                fraction = rng.random()
+                stack.append((e * fraction, x, y, z, direction))
+                e *= 1.0 - fraction
+            steps += 1
+    return steps
+
+
+def synthetic_kernel(seconds: float = SYNTHETIC_SECONDS, seed: int = 1) -> float:
+    """Synthetic events per second of one core."""
+    rng = random.Random(seed)
+    events, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        _shower(rng)
+        events += 1
+    return events / (time.perf_counter() - start)
+
+
+def ddsim_benchmark(sif_path: str, compact: str, events: List[int] = DDSIM_EVENTS) -> float:
+    """
+    ddsim events per second of one core with a 10 GeV electron gun through compact.
+
+    Returns:
+        float: Events/s, None if the image, the detector or singularity is not available
+    """
+    if not sif_path or not os.path.exists(sif_path) or not compact or not os.path.exists(compact):
+        return None
+    install = os.path.dirname(os.path.dirname(os.path.dirname(compact)))  # <variant>/install/share/epic/x.xml
+    setup = os.path.join(install, "bin", "thisepic.sh")
+    durations = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_events in events:
+            output = os.path.join(tmp, f"calibration_{n_events}.edm4hep.root")
+            shell_cmd = (
+                f"source {setup} && ddsim --compactFile {compact} --enableGun --gun.particle e- "
+                f"--gun.energy '10*GeV' --gun.thetaMin '3.1*rad' --gun.thetaMax '3.14*rad' "
+                f"--random.seed 1 --printLevel WARNING -N {n_events} --outputFile {output}"
+            )
+            cmd = ["singularity", "exec", "--bind", f"{os.path.dirname(install)},{tmp}", sif_path,
+                   "/bin/bash", "-c", shell_cmd]
+            start = time.perf_counter()
+            try:
+                subprocess.run(cmd, check=True, capture_output=True, text=True)
+            except (OSError, subprocess.CalledProcessError):
+                return None
+            durations.append(time.perf_counter() - start)
+    per_event = (durations[1] - durations[0]) / (events[1] - events[0])
+    return 1.0 / per_event if per_event > 0 else None
+
+
+def calibrate(sif_path: str = None, compact: str = None, seconds: float = SYNTHETIC_SECONDS,
+              events: List[int] = DDSIM_EVENTS) -> Dict:
+    """Benchmark this host: identity, synthetic events/s per core and ddsim events/s per core (or None)."""
+    return {
+        **host_identity(sif_path),
+        "synthetic_per_s": synthetic_kernel(seconds),
+        "ddsim_events_per_s": ddsim_benchmark(sif_path, compact, events),
+        "time": time.time(),
+    }
+
+
+def events_per_core(entries: Dict[str, Dict], default: float) -> Dict[str, float]:
+    """
+    ddsim events/s per core of every calibrated host.
+
+    Hosts without a ddsim result are scaled from the fastest-known host that has
+    one by the ratio of their synthetic rates; without any ddsim result the
+    synthetic rates only rank the hosts around default.
+    """
+    measured = {hostname: entry for hostname, entry in entries.items() if entry.get("ddsim_events_per_s")}
+    if measured:
+        reference = max(measured.values(), key=lambda entry: entry["ddsim_events_per_s"])
+        scale = reference["ddsim_events_per_s"] / reference["synthetic_per_s"]
+    else:
+        mean = sum(entry["synthetic_per_s"] for entry in entries.values()) / max(1, len(entries))
+        scale = default / mean if mean > 0 else 0.0
+    return {
+        hostname: entry.get("ddsim_events_per_s") or entry["synthetic_per_s"] * scale
+        for hostname, entry in entries.items()
+    }
+
+
+class CalibrationCache(object):
+    """
+    Calibration results per host.
+
+    Usage:
+        cache = CalibrationCache()
+        entry = cache.get(hostname, identity) or cache.put(hostname, calibrate(...))
+    """
+
+    def __init__(self, path: str = CALIBRATION_FILE, max_age_days: float = MAX_AGE_DAYS) -> None:
+        self.path = os.path.expanduser(path)
+        self.max_age_days = max_age_days
+
+    def read(self) -> Dict[str, Dict]:
+        """All stored results by hostname."""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, hostname: str, identity: Dict = None) -> Dict:
+        """The stored result of hostname, None if missing, too old or measured on another CPU or image."""
+        entry = self.read().get(hostname)
+        if entry is None or time.time() - entry.get("time", 0) > self.max_age_days * 86400:
+            return None
+        if identity is not None and any(entry.get(key) != identity.get(key) for key in ("cpu_model", "cores", "image")):
+            return None
+        return entry
+
+    def put(self, hostname: str, entry: Dict) -> Dict:
+        """Store the result of hostname and return it."""
+        with _cache_lock:
+            entries = self.read()
+            entries[hostname] = entry
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+        return entry
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the simulation throughput of this host")
+    parser.add_argument("--sif", help="container image with ddsim")
+    parser.add_argument("--compact", help="compact file of a built detector (install/share/epic/...xml)")
+    parser.add_argument("--seconds", type=float, default=SYNTHETIC_SECONDS, help="duration of the synthetic kernel")
+    parser.add_argument("--identity", action="store_true", help="only print the host identity")
+    parser.add_argument("--save", action="store_true", help="store the result for this host")
+    args = parser.parse_args(argv)
+
+    if args.identity:
+        print(json.dumps(host_identity(args.sif)))
+        return 0
+    result = calibrate(args.sif, args.compact, args.seconds)
+    if args.save:
+        CalibrationCache().put(socket.gethostname(), result)
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Local transport of the pseudo-hosts of a distributed run (epic_sim_fuse.py).
+
+A host named local:<n> in the host registry is not reached over SSH: its
+commands run as child processes of this machine in the host's own base
+path, and its worker pool (task_worker.py --slots) is fed through the pipes
+of a child process instead of an SSH channel. Everything else stays the
+same as for a remote host: staging copies the worker scripts, detector
+variants and inputs into the pseudo-host's base path (rsync between local
+paths), the telemetry samples it, the work queue heartbeats and drops it.
+Several pseudo-hosts on one box load-test the scheduler, data staging and
+failure handling without a cluster.
+
+Per host settings besides base_path and cpus:
+    isolate_network   run its commands in their own network namespace
+                      (unshare --user --map-root-user --net)
+    fail_after_s      kill the host's worker pools this long after they
+                      start, to test how the run recovers from a lost host
+"""
+import os
+import signal
+import threading
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+LOCAL_PREFIX = "local:"
+UNSHARE_NET = ["unshare", "--user", "--map-root-user", "--net"]
+
+
+def is_local_host(hostname: str) -> bool:
+    """Whether hostname is a local pseudo-host (local:<n>)."""
+    return hostname.startswith(LOCAL_PREFIX)
+
+
+class _PipeInput(object):
+    """stdin of a local worker pool with the part of paramiko's channel file interface the feeder uses."""
+
+    def __init__(self, pipe) -> None:
+        self.pipe = pipe
+        self.channel = self
+
+    def write(self, data: str) -> None:
+        self.pipe.write(data)
+
+    def flush(self) -> None:
+        self.pipe.flush()
+
+    def shutdown_write(self) -> None:
+        try:
+            self.pipe.close()
+        except OSError:
+            pass  # the worker pool is already gone
+
+
+class LocalTransport(object):
+    """
+    Commands of the local pseudo-hosts, with the interface of SSHConnectionPool.
+
+    Usage:
+        transport = LocalTransport(machines)
+        stdout, stderr = transport.execute("local:1", "python3 -c 'print(1)'")
+        with transport.session("local:1", "python3 task_worker.py --slots 2") as (stdin, stdout, stderr):
+            ...
+    """
+
+    def __init__(self, machines: Dict[str, dict]) -> None:
+        self.machines = machines
+        self._init_state()
+
+    def _init_state(self) -> None:
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, List[subprocess.Popen]] = {}
+
+    def __getstate__(self) -> dict:
+        # Child processes stay with the coordinating process
+        return {key: value for key, value in self.__dict__.items() if not key.startswith('_')}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_state()
+
+    def _command(self, hostname: str, command: str) -> List[str]:
+        prefix = UNSHARE_NET if self.machines[hostname].get('isolate_network') else []
+        return prefix + ["/bin/bash", "-c", command]
+
+    def _cwd(self, hostname: str) -> str:
+        base_path = self.machines[hostname]['base_path']
+        os.makedirs(base_path, exist_ok=True)
+        return base_path
+
+    def client(self, hostname: str) -> None:
+        """Nothing to connect, the pseudo-host is this machine."""
+        return None
+
+    def execute(self, hostname: str, command: str, timeout: float = None) -> Tuple[str, str]:
+        """Run command as a child process in the base path of hostname."""
+        result = subprocess.run(self._command(hostname, command), cwd=self._cwd(hostname),
+                                capture_output=True, text=True, timeout=timeout)
+        return result.stdout, result.stderr
+
+    @contextmanager
+    def session(self, hostname: str, command: str):
+        """
+        Long-running command of hostname as a child process in its own process group.
+
+        Yields:
+            Tuple: stdin, stdout and stderr of the command
+        """
+        process = subprocess.Popen(self._command(hostname, command), cwd=self._cwd(hostname),
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   text=True, bufsize=1, start_new_session=True)
+        with self._lock:
+            self._sessions.setdefault(hostname, []).append(process)
+        fail_after = self.machines[hostname].get('fail_after_s')
+        timer = threading.Timer(fail_after, self.kill, args=(hostname,)) if fail_after else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            yield _PipeInput(process.stdin), process.stdout, process.stderr
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._terminate(process)
+            with self._lock:
+                self._sessions[hostname].remove(process)
+
+    @staticmethod
+    def _terminate(process: subprocess.Popen, sig: int = signal.SIGTERM) -> None:
+        if process.poll() is None:
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                pass
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+    def kill(self, hostname: str) -> None:
+        """Kill the sessions of hostname and their tasks, as if the host went down."""
+        with self._lock:
+            processes = list(self._sessions.get(hostname, []))
+        for process in processes:
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def discard(self, hostname: str) -> None:
+        """Nothing is pooled for a pseudo-host."""
+        return None
+
+    def close_all(self) -> None:
+        """Terminate the sessions that are still running."""
+        with self._lock:
+            processes = [process for sessions in self._sessions.values() for process in sessions]
+        for process in processes:
+            self._terminate(process)
@@ -0,0 +1,178 @@
+"""
+Single queue-based logging pipeline for the orchestrator and its tasks.
+
+Worker threads only put records on a queue (QueueHandler); one QueueListener
+thread formats them and does all file I/O. Task records carry the path of
+their log file and are routed by TaskFileHandler, which opens task logs on
+demand, keeps at most max_open_files of them open (least recently used are
+closed first) and closes a task's file when the task logs its last record,
+optionally compressing it with zstd (in a background thread, the listener
+never waits for a compression). Task loggers are cheap LoggerAdapters on
+one shared logger, so no Logger object or handler is created per task.
+"""
+import os
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAIN_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+TASK_FORMAT = "%(asctime)s - %(task_name)s - Process %(process)d - %(levelname)s - %(message)s"
+
+
+class TaskFileHandler(logging.Handler):
+    """Write records with a task_log attribute to that file, with a bounded set of open files."""
+
+    def __init__(self, max_open_files: int = 64, compress: bool = False) -> None:
+        super().__init__()
+        self.max_open_files = max(1, max_open_files)
+        self.compress = compress and zstandard is not None
+        self._files: "OrderedDict[str, object]" = OrderedDict()
+        self._compressor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-compress") if self.compress else None
+
+    def _stream(self, path: str):
+        stream = self._files.pop(path, None)
+        if stream is None:
+            if len(self._files) >= self.max_open_files:
+                _, oldest = self._files.popitem(last=False)
+                oldest.close()
+            stream = open(path, 'a')
+        self._files[path] = stream  # most recently used last
+        return stream
+
+    def _finish(self, path: str) -> None:
+        """Close a completed task log and queue its compression if enabled."""
+        stream = self._files.pop(path, None)
+        if stream is not None:
+            stream.close()
+        if self._compressor is not None and os.path.exists(path):
+            self._compressor.submit(self._compress, path)
+
+    @staticmethod
+    def _compress(path: str) -> None:
+        """Replace path by path.zst; the plain log stays if compression fails."""
+        try:
+            with open(path, 'rb') as source, open(f"{path}.zst.tmp", 'wb') as target:
+                zstandard.ZstdCompressor().copy_stream(source, target)
+            os.replace(f"{path}.zst.tmp", f"{path}.zst")
+            os.remove(path)
+        except OSError:
+            if os.path.exists(f"{path}.zst.tmp"):
+                os.remove(f"{path}.zst.tmp")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        path = getattr(record, "task_log", None)
+        if path is None:
+            return
+        try:
+            stream = self._stream(path)
+            stream.write(self.format(record) + "\n")
+            if getattr(record, "task_close", False):
+                self._finish(path)
+            else:
+                stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        for stream in self._files.values():
+            stream.close()
+        self._files.clear()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)  # finish the queued compressions
+        super().close()
+
+
+class _MainRecords(logging.Filter):
+    """Records of the orchestrator itself (not of a task)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not hasattr(record, "task_log")
+
+
+class _ConsoleRecords(logging.Filter):
+    """Orchestrator records, plus warnings and errors of tasks."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not hasattr(record, "task_log") or record.levelno >= logging.WARNING
+
+
+class TaskLogger(logging.LoggerAdapter):
+    """Logger of one task; close() writes the last record and releases its file."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+    def close(self) -> None:
+        self.info("Task log closed", extra={"task_close": True})
+
+
+class LogPipeline(object):
+    """
+    Queue, listener thread and handlers shared by the main logger and all task loggers.
+
+    Usage:
+        pipeline = LogPipeline("overview.log", console=True)
+        logger = pipeline.main_logger
+        task_logger = pipeline.task_logger("1.0x0.1_idealElectrons_10_sim", "logs/idealElectrons_10_sim.log")
+        ...
+        task_logger.close()
+        pipeline.stop()
+    """
+
+    def __init__(self, overview_log_path: str, console: bool = False,
+                 max_open_files: int = 64, compress_task_logs: bool = False) -> None:
+        self.queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+
+        main_handler = logging.FileHandler(overview_log_path, mode="w")
+        main_handler.setLevel(logging.DEBUG)
+        main_handler.setFormatter(logging.Formatter(MAIN_FORMAT))
+        main_handler.addFilter(_MainRecords())
+
+        self.task_handler = TaskFileHandler(max_open_files, compress_task_logs)
+        self.task_handler.setFormatter(logging.Formatter(TASK_FORMAT))
+
+        handlers = [main_handler, self.task_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.DEBUG)
+            console_handler.setFormatter(logging.Formatter(MAIN_FORMAT))
+            console_handler.addFilter(_ConsoleRecords())
+            handlers.append(console_handler)
+        self.handlers = handlers
+
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+        self.main_logger = self._queue_logger("main_logger")
+        self._task_base = self._queue_logger("main_logger.tasks")
+        self._stop_lock = threading.Lock()
+
+    def _queue_logger(self, name: str) -> logging.Logger:
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = [QueueHandler(self.queue)]
+        logger.propagate = False
+        return logger
+
+    def task_logger(self, name: str, log_file: str) -> TaskLogger:
+        """Logger writing to log_file; the file is only opened when the first record arrives."""
+        return TaskLogger(self._task_base, {"task_log": log_file, "task_name": name})
+
+    def stop(self) -> None:
+        """Flush the queue and close all files."""
+        with self._stop_lock:
+            if self.listener is None:
+                return
+            self.listener.stop()
+            self.listener = None
+            for handler in self.handlers:
+                handler.close()
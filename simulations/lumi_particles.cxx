@@ -15,6 +15,7 @@
 #include "TF2.h"
 #include "TH2D.h"
 #include "TLorentzVector.h"
+#include "TApplication.h"
 
 #include "HepMC3/GenEvent.h"
 #include "HepMC3/Print.h"
@@ -75,7 +76,7 @@ double pionMass = 0.13957039;
 TRandom* RandN = new TRandom();
 
 
-void lumi_particles(int n_events = 1e5, bool flat=false, bool convert = false, bool displaceVertices = false, double Egamma_start = 5.0, double Egamma_end = 18.0, string out_fname="genParticles.hepmc") {
+void lumi_particles(int n_events = 1e5, bool flat=false, bool convert = false, bool displaceVertices = false, double Egamma_start = 5.0, double Egamma_end = 18.0, string out_fname="genParticles.hepmc", bool terminate = true) {
  
   RandN->SetSeed(0);
 
@@ -198,7 +199,8 @@ void lumi_particles(int n_events = 1e5, bool flat=false, bool convert = false, b
   QED_BH_h2->Write();
   fout->Close();
 
-  gApplication->Terminate();
+  // keep the session alive when several energies are generated in one ROOT process
+  if( terminate ) gApplication->Terminate();
 }
 
 //----------------------------------------------------------------------------
@@ -0,0 +1,125 @@
+"""
+Prometheus/OpenMetrics endpoint of a running simulation campaign.
+
+Optional and stdlib only: a ThreadingHTTPServer bound to localhost serves
+/metrics in the Prometheus text exposition format, so a node exporter style
+scrape (or an SSH tunnel) can put campaign progress next to the node health
+dashboards in Grafana.
+"""
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "epic_sim"
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counters(object):
+    """
+    Thread-safe monotonically increasing counters with labels.
+
+    Usage:
+        counters = Counters()
+        counters.inc("container_starts_total", stage="sim")
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[Tuple[str, Tuple], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def items(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(name, labels, value) of every counter."""
+        with self._lock:
+            return [(name, dict(labels), value) for (name, labels), value in self._values.items()]
+
+
+class MetricsServer(object):
+    """
+    Serve the samples returned by collect() on http://127.0.0.1:<port>/metrics.
+
+    collect returns (metric name, type, help, labels, value) tuples; names are
+    prefixed with epic_sim_ and grouped into families on output.
+    """
+
+    def __init__(self, port: int, collect: Callable[[], List[Tuple[str, str, str, Dict, float]]],
+                 host: str = "127.0.0.1") -> None:
+        self.collect = collect
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                try:
+                    body = server.exposition().encode()
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass  # scrapes every few seconds would flood the campaign log
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread: threading.Thread = None
+
+    def exposition(self) -> str:
+        """Current samples in the Prometheus text format."""
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+        for name, metric_type, help_text, labels, value in self.collect():
+            full_name = f"{PREFIX}_{name}"
+            family = families.setdefault(full_name, (metric_type, help_text, []))
+            family[2].append(f"{full_name}{_labels(labels)} {float(value)!r}")
+        lines = []
+        for full_name, (metric_type, help_text, samples) in families.items():
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self._thread.join()
+            self._thread = None
+
+
+def host_load() -> List[Tuple[str, str, str, Dict, float]]:
+    """1/5/15 minute load averages and CPU count of this host."""
+    host = socket.gethostname()
+    samples = [
+        ("host_load", "gauge", "Load average of the orchestrating host", {"host": host, "window": window}, load)
+        for window, load in zip(("1m", "5m", "15m"), os.getloadavg())
+    ]
+    samples.append(("host_cpus", "gauge", "CPUs of the orchestrating host", {"host": host}, os.cpu_count() or 0))
+    return samples
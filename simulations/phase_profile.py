@@ -0,0 +1,169 @@
+"""
+Profiling of the orchestrator's own Python code, one phase at a time.
+
+With --profile every phase of epic_sim2.py (load_settings, get_energies,
+prep_sim, exec_sim, create_execution_report) runs under cProfile and
+tracemalloc. Each phase is written as <n>_<phase>.pstats (open with
+python -m pstats or snakeviz) and summarised in profile_summary.txt: wall
+time, the top functions by cumulative time, peak traced memory and the
+top allocation sites of the phase.
+
+Phases may nest (create_execution_report runs inside exec_sim); the outer
+profiler is paused while the inner phase runs, so every call is counted in
+exactly one phase. Before Python 3.12 cProfile only sees the thread that
+enabled it, so worker functions are wrapped with wrap() to profile them in
+their own thread and merge them into the phase.
+"""
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+SUMMARY_FILE = "profile_summary.txt"
+# Allocations of the profiling machinery itself
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+]
+
+
+class PhaseProfiler(object):
+    """
+    cProfile + tracemalloc per named phase; a no-op unless enabled.
+
+    Usage:
+        profiler = PhaseProfiler(enabled=True)
+        with profiler.phase("prep_sim"):
+            ...
+        executor.submit(profiler.wrap(worker), task)
+        profiler.write(run_dir)
+    """
+
+    def __init__(self, enabled: bool = False, top_n: int = 30) -> None:
+        self.enabled = enabled
+        self.top_n = top_n
+        self.phases: List[Dict] = []  # in start order
+        self._stack: List[Dict] = []  # phases currently running in the main thread
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    def _update_peaks(self) -> None:
+        """Credit the traced peak since the last phase boundary to every running phase."""
+        peak = tracemalloc.get_traced_memory()[1]
+        for phase in self._stack:
+            phase["peak_bytes"] = max(phase["peak_bytes"], peak)
+        tracemalloc.reset_peak()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Profile the enclosed block as phase name."""
+        if not self.enabled:
+            yield
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._update_peaks()
+        if self._stack:
+            self._stack[-1]["profile"].disable()
+
+        phase = {
+            "name": name, "profile": cProfile.Profile(), "threads": [], "peak_bytes": 0,
+            "start_snapshot": self._snapshot(), "end_snapshot": None, "wall_s": 0.0
+        }
+        self.phases.append(phase)
+        self._stack.append(phase)
+        start = time.perf_counter()
+        phase["profile"].enable()
+        try:
+            yield
+        finally:
+            phase["profile"].disable()
+            phase["wall_s"] = time.perf_counter() - start
+            phase["end_snapshot"] = self._snapshot()
+            self._update_peaks()
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["profile"].enable()
+
+    def wrap(self, func: Callable) -> Callable:
+        """func profiled in the thread that calls it and merged into the current phase."""
+        if not self.enabled or not self._stack:
+            return func
+        phase = self._stack[-1]
+
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python >= 3.12: the phase's profiler already sees every thread
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._lock:
+                    phase["threads"].append(profile)
+        return profiled
+
+    def _stats(self, phase: Dict) -> pstats.Stats:
+        stream = io.StringIO()
+        stats = pstats.Stats(phase["profile"], stream=stream)
+        with self._lock:
+            threads = list(phase["threads"])
+        for profile in threads:
+            stats.add(profile)
+        return stats
+
+    def write(self, run_dir: str) -> str:
+        """
+        Write the .pstats files and profile_summary.txt into run_dir.
+
+        Returns:
+            str: Path of the summary, None when profiling is disabled
+        """
+        if not self.enabled or not self.phases:
+            return None
+        os.makedirs(run_dir, exist_ok=True)
+        lines = [f"Orchestrator profile (top {self.top_n} per phase)", ""]
+        for index, phase in enumerate(self.phases, 1):
+            if phase["end_snapshot"] is None:
+                continue  # still running
+            stats = self._stats(phase)
+            pstats_path = os.path.join(run_dir, f"{index:02d}_{phase['name']}.pstats")
+            stats.dump_stats(pstats_path)
+
+            lines.append(f"=== {phase['name']}: {phase['wall_s']:.3f} s wall, "
+                         f"peak traced memory {phase['peak_bytes'] / 2**20:.1f} MB ({os.path.basename(pstats_path)})")
+            if phase["threads"]:
+                lines.append(f"    includes {len(phase['threads'])} profiled worker calls")
+            stats.stream = io.StringIO()
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+            lines.extend("    " + line for line in stats.stream.getvalue().strip("\n").splitlines())
+
+            lines.append("    Top allocation sites (net change over the phase):")
+            differences = phase["end_snapshot"].compare_to(phase["start_snapshot"], "lineno")
+            for difference in differences[:self.top_n]:
+                lines.append(f"    {difference}")
+            lines.append("")
+
+        path = os.path.join(run_dir, SUMMARY_FILE)
+        with open(path, 'w') as f:
+            f.write("\n".join(lines))
+        return path
+
+    def stop(self) -> None:
+        """Stop tracemalloc if this profiler started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
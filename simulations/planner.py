@@ -0,0 +1,168 @@
+"""
+Dry-run prediction of the cost of a simulation campaign.
+
+The planner takes the expanded task graph (every ddsim and eicrecon task
+of the settings, see HandleSim.plan_tasks) and a per-event cost for each
+task, from the run catalog when earlier runs did similar tasks and from a
+configurable cost model otherwise. It predicts CPU-hours, the makespan on
+the given number of workers (the stages are separated by barriers and
+each is list-scheduled longest task first, as the thread pool would run
+them at best), peak memory of concurrently running tasks and output bytes
+per stage, and flags what does not fit into memory or onto the disk.
+"""
+import heapq
+from typing import Callable, Dict, List
+
+STAGES = ["sim", "recon"]
+
+# Fallback per-event costs when the run catalog has no similar tasks; override with plan.cost_model
+DEFAULT_COST_MODEL = {
+    "sim": {"wall_s_per_event": 0.5, "cpu_s_per_event": 0.5, "peak_rss_mb": 2500.0,
+            "output_bytes_per_event": 200e3, "overhead_s": 60.0},
+    "recon": {"wall_s_per_event": 0.05, "cpu_s_per_event": 0.05, "peak_rss_mb": 3000.0,
+              "output_bytes_per_event": 0.0, "overhead_s": 60.0},
+}
+
+
+def _makespan(durations: List[float], workers: int) -> float:
+    """Finish time of durations scheduled longest first onto workers identical slots."""
+    slots = [0.0] * max(1, min(workers, len(durations)))
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(slots, slots[0] + duration)
+    return max(slots) if durations else 0.0
+
+
+def estimate(tasks: List[Dict], cost_of: Callable[[Dict], Dict], workers: int,
+             memory_limit_mb: float, disk_free_bytes: float, fixed_bytes: Dict[str, float] = None) -> Dict:
+    """
+    Predict the resources of a task graph.
+
+    Args:
+        tasks: Task dicts (task_id, px_key, type, file_type, energy, shard, events)
+        cost_of: Per-event cost of a task (wall_s_per_event, cpu_s_per_event, peak_rss_mb,
+            output_bytes_per_event, overhead_s, source)
+        workers: Tasks run at the same time
+        memory_limit_mb: Memory available to the tasks
+        disk_free_bytes: Free space where the outputs are written
+        fixed_bytes: Other disk usage per pixel configuration (e.g. the detector copy)
+
+    Returns:
+        Dict: Per-task predictions, per-stage and per-configuration totals, the whole
+        campaign and a list of warnings
+    """
+    fixed_bytes = fixed_bytes or {}
+    predictions = []
+    for task in tasks:
+        cost = cost_of(task)
+        events = task.get("events") or 0
+        predictions.append({
+            "task_id": task["task_id"],
+            "px_key": task["px_key"],
+            "stage": task["type"],
+            "events": events,
+            "wall_s": events * cost["wall_s_per_event"] + cost.get("overhead_s", 0.0),
+            "cpu_s": events * cost["cpu_s_per_event"] + cost.get("overhead_s", 0.0),
+            "peak_rss_mb": cost["peak_rss_mb"],
+            "output_bytes": events * (cost.get("output_bytes_per_event") or 0.0),
+            "source": cost["source"],
+        })
+
+    stages = {}
+    for stage in STAGES:
+        members = [prediction for prediction in predictions if prediction["stage"] == stage]
+        if not members:
+            continue
+        concurrent = sorted((prediction["peak_rss_mb"] for prediction in members), reverse=True)[:workers]
+        sources: Dict[str, int] = {}
+        for prediction in members:
+            sources[prediction["source"]] = sources.get(prediction["source"], 0) + 1
+        stages[stage] = {
+            "tasks": len(members),
+            "events": sum(prediction["events"] for prediction in members),
+            "cpu_hours": sum(prediction["cpu_s"] for prediction in members) / 3600,
+            "makespan_s": _makespan([prediction["wall_s"] for prediction in members], workers),
+            "peak_memory_mb": sum(concurrent),
+            "max_task_rss_mb": concurrent[0],
+            "output_bytes": sum(prediction["output_bytes"] for prediction in members),
+            "cost_sources": sources,
+        }
+
+    configs = {}
+    for prediction in predictions:
+        entry = configs.setdefault(prediction["px_key"], {
+            "tasks": 0, "cpu_hours": 0.0, "output_bytes": fixed_bytes.get(prediction["px_key"], 0.0)
+        })
+        entry["tasks"] += 1
+        entry["cpu_hours"] += prediction["cpu_s"] / 3600
+        entry["output_bytes"] += prediction["output_bytes"]
+
+    total_bytes = sum(entry["output_bytes"] for entry in configs.values())
+    peak_memory = max((stage["peak_memory_mb"] for stage in stages.values()), default=0.0)
+    warnings = []
+    for name, stage in stages.items():
+        if stage["max_task_rss_mb"] > memory_limit_mb:
+            warnings.append(f"a single {name} task needs {stage['max_task_rss_mb']:.0f} MB, "
+                            f"more than the {memory_limit_mb:.0f} MB available")
+        elif stage["peak_memory_mb"] > memory_limit_mb:
+            fit = int(memory_limit_mb // stage["max_task_rss_mb"])
+            warnings.append(f"{name}: {min(workers, stage['tasks'])} concurrent tasks need {stage['peak_memory_mb']:.0f} MB "
+                            f"of {memory_limit_mb:.0f} MB, only about {fit} fit in memory")
+    if total_bytes > disk_free_bytes:
+        warnings.append(f"outputs need {total_bytes / 2**30:.1f} GB but only {disk_free_bytes / 2**30:.1f} GB are free")
+        for px_key, entry in configs.items():
+            if entry["output_bytes"] > disk_free_bytes:
+                warnings.append(f"{px_key} alone needs {entry['output_bytes'] / 2**30:.1f} GB (outputs and detector copy)")
+    modelled = sum(1 for prediction in predictions if prediction["source"] == "model")
+    if modelled:
+        warnings.append(f"{modelled} of {len(predictions)} tasks have no history in the run catalog, "
+                        f"their cost comes from the default cost model")
+
+    return {
+        "workers": workers,
+        "memory_limit_mb": memory_limit_mb,
+        "disk_free_bytes": disk_free_bytes,
+        "total": {
+            "tasks": len(predictions),
+            "cpu_hours": sum(stage["cpu_hours"] for stage in stages.values()),
+            "makespan_s": sum(stage["makespan_s"] for stage in stages.values()),
+            "peak_memory_mb": peak_memory,
+            "output_bytes": total_bytes,
+        },
+        "stages": stages,
+        "configs": configs,
+        "warnings": warnings,
+        "tasks": predictions,
+    }
+
+
+def render_plan(plan: Dict) -> str:
+    """Human-readable summary of a plan."""
+    total = plan["total"]
+    lines = [
+        "EPIC Simulation Plan",
+        "====================",
+        f"Tasks: {total['tasks']} on {plan['workers']} workers",
+        f"Predicted makespan: {total['makespan_s'] / 3600:.2f} h",
+        f"Predicted CPU: {total['cpu_hours']:.1f} h",
+        f"Peak memory: {total['peak_memory_mb'] / 1024:.1f} GB of {plan['memory_limit_mb'] / 1024:.1f} GB",
+        f"Disk: {total['output_bytes'] / 2**30:.1f} GB of {plan['disk_free_bytes'] / 2**30:.1f} GB free",
+        "",
+        "By Stage",
+        "--------",
+    ]
+    for name, stage in plan["stages"].items():
+        sources = ", ".join(f"{count} {source}" for source, count in stage["cost_sources"].items())
+        lines.append(
+            f"{name}: {stage['tasks']} tasks, {stage['events']:,} events, {stage['cpu_hours']:.1f} CPU-h, "
+            f"{stage['makespan_s'] / 3600:.2f} h, peak {stage['peak_memory_mb'] / 1024:.1f} GB, "
+            f"output {stage['output_bytes'] / 2**30:.2f} GB (cost from {sources})"
+        )
+    lines += ["", "By Configuration", "----------------"]
+    for px_key, entry in plan["configs"].items():
+        lines.append(f"[{px_key}] {entry['tasks']} tasks, {entry['cpu_hours']:.1f} CPU-h, "
+                     f"{entry['output_bytes'] / 2**30:.2f} GB")
+    if plan["warnings"]:
+        lines += ["", "Warnings", "--------"]
+        lines += [f"- {warning}" for warning in plan["warnings"]]
+    lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,216 @@
+"""
+Live progress of the ddsim/eicrecon tasks of a campaign.
+
+The task output is parsed for event counters while it streams (see
+run_measured's on_line) to show per-task and per-stage events/s, the queue
+depth of each stage and a projected ETA of the whole campaign. On a terminal
+the view is redrawn in place with plain ANSI codes (works over SSH); when the
+output is not a TTY a summary line is logged periodically instead.
+"""
+import re
+import sys
+import time
+import threading
+from typing import Callable, Dict, List
+
+# Event counters printed by ddsim and eicrecon (JANA status line). ddsim prints its own
+# counter at INFO only; the Geant4 run manager's "--> Event <id> starts." (/run/printProgress,
+# event ids from 0, see SIM_PROGRESS_ARGS) is printed at any print level.
+EVENT_PATTERNS = {
+    "sim": re.compile(r"--> Event (\d+) starts|Initializing event (\d+)"),
+    "recon": re.compile(r"(\d+) events processed"),
+}
+STAGES = ["sim", "recon"]
+SIM_PROGRESS_ARGS = "--ui.commandsPreRun '/run/printProgress 1'"
+
+
+def count_events(stage: str, line: str) -> int:
+    """Events a task of stage has reached according to one output line, None if the line has no counter."""
+    match = EVENT_PATTERNS[stage].search(line)
+    if not match:
+        return None
+    if stage == "sim" and match.group(1) is not None:
+        return int(match.group(1)) + 1
+    return int(match.group(match.lastindex))
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressTracker(object):
+    """
+    Thread-safe progress state of all tasks plus the thread that displays it.
+
+    Usage:
+        tracker = ProgressTracker(log=printlog)
+        tracker.add_task("1.0x0.1_idealElectrons_10", "sim", 5000)
+        tracker.start()
+        ...  # workers call start_task / feed / finish_task
+        tracker.stop()
+    """
+
+    MAX_TASK_LINES = 20  # running tasks shown individually on a terminal
+
+    def __init__(self, log: Callable[[str], None] = None, log_interval: float = 60.0,
+                 refresh_interval: float = 1.0, stream=None) -> None:
+        self.log = log
+        self.log_interval = log_interval
+        self.refresh_interval = refresh_interval
+        self.stream = stream or sys.stderr
+        self.interactive = hasattr(self.stream, "isatty") and self.stream.isatty()
+        self._tasks: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+        self._lines_drawn = 0
+
+    # ------------------------------------------------------------------
+    # Task state, called from the worker threads
+    # ------------------------------------------------------------------
+    def add_task(self, task_id: str, stage: str, events: int = None) -> None:
+        """Register a queued task expected to process events events."""
+        with self._lock:
+            self._tasks[task_id] = {
+                "stage": stage, "state": "queued", "expected": events or 0,
+                "events": 0, "start": None, "end": None
+            }
+
+    def remove_task(self, task_id: str) -> None:
+        """Forget a task that will not run (e.g. reconstruction of a failed simulation)."""
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def start_task(self, task_id: str) -> None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task["state"], task["start"] = "running", time.time()
+
+    def feed(self, task_id: str, line: str) -> None:
+        """Parse one output line of a running task for its event counter."""
+        task = self._tasks.get(task_id)
+        if task is None:
+            return
+        events = count_events(task["stage"], line)
+        if events is not None:
+            with self._lock:
+                task["events"] = max(task["events"], events)
+
+    def finish_task(self, task_id: str, success: bool) -> None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task["state"], task["end"] = ("done" if success else "failed"), time.time()
+                if success and task["expected"]:
+                    task["events"] = task["expected"]
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per stage counts, aggregate events/s and remaining time."""
+        now = time.time()
+        with self._lock:
+            tasks = [dict(task) for task in self._tasks.values()]
+
+        stages = {}
+        for stage in STAGES:
+            members = [task for task in tasks if task["stage"] == stage]
+            counts = {state: sum(1 for task in members if task["state"] == state)
+                      for state in ("queued", "running", "done", "failed")}
+            started = [task["start"] for task in members if task["start"] is not None]
+            processed = sum(task["events"] for task in members)
+            rate = 0.0
+            if started:
+                # events over the stage's elapsed time, up to its last finished task once nothing runs
+                until = now if counts["running"] else max(task["end"] or now for task in members if task["start"])
+                rate = processed / (until - min(started)) if until > min(started) else 0.0
+            remaining = sum(max(task["expected"] - task["events"], 0)
+                            for task in members if task["state"] in ("queued", "running"))
+            stages[stage] = {
+                **counts,
+                "events": processed,
+                "expected": sum(task["expected"] for task in members),
+                "rate": rate,
+                "eta": remaining / rate if rate > 0 else (0.0 if remaining == 0 else None),
+            }
+        return stages
+
+    def eta(self, stages: Dict[str, Dict]) -> float:
+        """Remaining campaign time, the stages run one after the other (unknown stages are skipped)."""
+        return sum(stage["eta"] for stage in stages.values() if stage["eta"] is not None)
+
+    def summary_line(self) -> str:
+        """One line with queue depth, events/s and ETA of every stage."""
+        stages = self.snapshot()
+        parts = [
+            f"{name}: {s['queued']} queued, {s['running']} running, {s['done']} done, {s['failed']} failed, "
+            f"{s['events']:,}/{s['expected']:,} events at {s['rate']:.1f} ev/s"
+            for name, s in stages.items() if s['queued'] + s['running'] + s['done'] + s['failed'] > 0
+        ]
+        # a stage without a rate yet (e.g. reconstruction during simulation) makes the ETA a lower bound
+        unknown = [name for name, s in stages.items() if s["eta"] is None]
+        eta = f"ETA {_format_duration(self.eta(stages))}"
+        if unknown:
+            eta += f"+ ({', '.join(unknown)} not started)"
+        return " | ".join(parts + [eta])
+
+    def render(self) -> List[str]:
+        """Lines of the terminal view: running tasks, then the stage summary."""
+        now = time.time()
+        with self._lock:
+            running = [(task_id, dict(task)) for task_id, task in self._tasks.items() if task["state"] == "running"]
+        lines = []
+        for task_id, task in running[:self.MAX_TASK_LINES]:
+            elapsed = now - task["start"]
+            rate = task["events"] / elapsed if elapsed > 0 else 0.0
+            fraction = f"{task['events'] / task['expected']:.0%}" if task["expected"] else "?"
+            lines.append(f"  {task['stage']:5s} {task_id:50.50s} {task['events']:>8,}/{task['expected']:<8,} "
+                         f"{fraction:>4s} {rate:7.1f} ev/s  {_format_duration(elapsed)}")
+        if len(running) > self.MAX_TASK_LINES:
+            lines.append(f"  ... {len(running) - self.MAX_TASK_LINES} more running")
+        lines.append(self.summary_line())
+        return lines
+
+    # ------------------------------------------------------------------
+    # Display thread
+    # ------------------------------------------------------------------
+    def _draw(self) -> None:
+        lines = self.render()
+        out = ""
+        if self._lines_drawn:
+            out += f"\x1b[{self._lines_drawn}F"  # back to the first line of the previous view
+        out += "".join(f"\x1b[2K{line}\n" for line in lines)
+        if len(lines) < self._lines_drawn:
+            out += "\x1b[J"  # clear leftovers of a longer previous view
+        self.stream.write(out)
+        self.stream.flush()
+        self._lines_drawn = len(lines)
+
+    def _run(self) -> None:
+        interval = self.refresh_interval if self.interactive else self.log_interval
+        while not self._stop.wait(interval):
+            self._report()
+
+    def _report(self) -> None:
+        if self.interactive:
+            self._draw()
+        elif self.log is not None:
+            self.log(f"Progress: {self.summary_line()}")
+
+    def start(self) -> None:
+        """Start refreshing the view (or logging) in the background."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after a final update."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._report()
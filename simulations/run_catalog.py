@@ -0,0 +1,369 @@
+"""
+SQLite catalog of the performance of all simulation runs.
+
+Every run directory (simEvents/<timestamp>) is ingested at the end of the
+run from its execution report: one row per run (host, container image,
+detector commit) and one row per task (pixel pair, stage, file type, energy,
+events/s, wall/CPU time, peak RSS). The catalog answers trend queries across
+runs and compares the throughput of a run with a rolling baseline of the
+previous runs, flagging statistically significant slowdowns. Pixel pairs
+are different geometries and are never pooled.
+
+Trend queries from the command line:
+    python run_catalog.py trend --db simEvents/run_catalog.sqlite --stage sim
+    python run_catalog.py regressions --db simEvents/run_catalog.sqlite --run-id <run_id>
+"""
+import os
+import math
+import json
+import sqlite3
+import argparse
+import statistics
+from contextlib import contextmanager
+from typing import Dict, List
+
+CATALOG_FILE = "run_catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_dir TEXT,
+    generated TEXT,
+    host TEXT,
+    image TEXT,
+    detector_hash TEXT,
+    configuration TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    run_id TEXT REFERENCES runs(run_id),
+    task_id TEXT,
+    px_key TEXT,
+    stage TEXT,
+    file_type TEXT,
+    energy TEXT,
+    shard INTEGER,
+    status TEXT,
+    events INTEGER,
+    wall_s REAL,
+    cpu_s REAL,
+    events_per_s REAL,
+    peak_rss_mb REAL,
+    output_bytes INTEGER,
+    PRIMARY KEY (run_id, task_id)
+);
+CREATE INDEX IF NOT EXISTS tasks_key ON tasks (stage, file_type, energy);
+CREATE INDEX IF NOT EXISTS tasks_config ON tasks (stage, file_type, px_key, energy);
+"""
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """Continued fraction of the incomplete beta function (modified Lentz)."""
+    tiny, eps = 1e-300, 1e-14
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 301):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < eps:
+            break
+    return h
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def _t_cdf(t: float, df: float) -> float:
+    """P(T <= t) of Student's t distribution with df (not necessarily integer) degrees of freedom."""
+    tail = 0.5 * _betainc(df / 2.0, 0.5, df / (df + t * t))
+    return tail if t < 0 else 1.0 - tail
+
+
+def _welch(current: List[float], baseline: List[float]) -> float:
+    """
+    One-sided p-value that the mean of current is below the mean of baseline (Welch's t-test).
+
+    t follows Student's t distribution with the Welch-Satterthwaite degrees of
+    freedom, which are small (1-3) when a side has only a few tasks; the normal
+    approximation would understate the p-value there.
+    """
+    var_current = statistics.variance(current) / len(current)
+    var_baseline = statistics.variance(baseline) / len(baseline)
+    variance = var_current + var_baseline
+    if variance == 0:
+        return 0.0 if statistics.mean(current) < statistics.mean(baseline) else 1.0
+    t = (statistics.mean(current) - statistics.mean(baseline)) / math.sqrt(variance)
+    df = variance ** 2 / (var_current ** 2 / (len(current) - 1) + var_baseline ** 2 / (len(baseline) - 1))
+    return _t_cdf(t, df)
+
+
+def _energy_order(energy: str):
+    """Numeric energies in order, labels (e.g. campaign keys) after them."""
+    try:
+        return 0, float(energy), ""
+    except (TypeError, ValueError):
+        return 1, 0.0, str(energy)
+
+
+class RunCatalog(object):
+    """
+    Performance history of all runs in one SQLite file.
+
+    Usage:
+        catalog = RunCatalog("simEvents/run_catalog.sqlite")
+        catalog.ingest(report, run_dir, host, image, detector_hash)
+        alerts = catalog.regressions(report["run_id"])
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # Catalogs created before output sizes were recorded
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(tasks)")}
+            if "output_bytes" not in columns:
+                db.execute("ALTER TABLE tasks ADD COLUMN output_bytes INTEGER")
+
+    @contextmanager
+    def _connect(self):
+        """Connection committed on success and closed afterwards."""
+        # Several runs may finish at the same time, wait for the write lock instead of failing
+        db = sqlite3.connect(self.db_path, timeout=60)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def ingest(self, report: Dict, run_dir: str, host: str, image: str, detector_hash: str) -> None:
+        """Store (or replace) a run and its task records from its execution report."""
+        run_id = report["run_id"]
+        with self._connect() as db:
+            db.execute("DELETE FROM tasks WHERE run_id = ?", (run_id,))
+            db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, run_dir, report["generated"], host, image, detector_hash,
+                 json.dumps(report["configuration"]))
+            )
+            db.executemany(
+                "INSERT INTO tasks (run_id, task_id, px_key, stage, file_type, energy, shard, status, events, "
+                "wall_s, cpu_s, events_per_s, peak_rss_mb, output_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, record["task_id"], record["px_key"], record["stage"], record["file_type"],
+                  None if record["energy"] is None else str(record["energy"]), record["shard"],
+                  record["status"], record["events"], record["wall_s"], record["cpu_s"],
+                  record["events_per_s"], record["peak_rss_mb"], record.get("output_bytes"))
+                 for record in report["tasks"]]
+            )
+
+    def trend(self, stage: str = "sim", file_type: str = None, energy: str = None, px_key: str = None) -> List[Dict]:
+        """
+        Throughput of every run and pixel pair, oldest first.
+
+        Returns:
+            List[Dict]: Per run and px_key: run_id, generated, host, image, detector_hash, px_key,
+            tasks, mean/min/max events/s, mean wall time and max peak RSS of its completed tasks
+        """
+        conditions, parameters = ["t.stage = ?", "t.status = 'completed'"], [stage]
+        if file_type is not None:
+            conditions.append("t.file_type = ?")
+            parameters.append(file_type)
+        if energy is not None:
+            conditions.append("t.energy = ?")
+            parameters.append(str(energy))
+        if px_key is not None:
+            conditions.append("t.px_key = ?")
+            parameters.append(px_key)
+        query = f"""
+            SELECT r.run_id, r.generated, r.host, r.image, r.detector_hash, t.px_key, COUNT(*) AS tasks,
+                   AVG(t.events_per_s) AS mean_events_per_s, MIN(t.events_per_s) AS min_events_per_s,
+                   MAX(t.events_per_s) AS max_events_per_s, AVG(t.wall_s) AS mean_wall_s,
+                   MAX(t.peak_rss_mb) AS peak_rss_mb
+            FROM tasks t JOIN runs r ON r.run_id = t.run_id
+            WHERE {' AND '.join(conditions)}
+            GROUP BY r.run_id, t.px_key ORDER BY r.generated, t.px_key
+        """
+        with self._connect() as db:
+            return [dict(row) for row in db.execute(query, parameters)]
+
+    def cost_model(self, stage: str, file_type: str = None, energy: str = None, px_key: str = None,
+                   window: int = 10) -> Dict:
+        """
+        Per-event cost of completed tasks in the last window runs that had such tasks.
+
+        Pass px_key: pixel pairs are different geometries with different costs.
+
+        Returns:
+            Dict: wall_s_per_event, cpu_s_per_event, peak_rss_mb, output_bytes_per_event
+            (None if no output sizes were recorded) and the number of tasks, None without history
+        """
+        conditions, parameters = ["t.stage = ?", "t.status = 'completed'", "t.events > 0"], [stage]
+        if file_type is not None:
+            conditions.append("t.file_type = ?")
+            parameters.append(file_type)
+        if energy is not None:
+            conditions.append("t.energy = ?")
+            parameters.append(str(energy))
+        if px_key is not None:
+            conditions.append("t.px_key = ?")
+            parameters.append(px_key)
+        where = " AND ".join(conditions)
+        query = f"""
+            SELECT COUNT(*) AS tasks, SUM(t.wall_s) AS wall_s, SUM(t.cpu_s) AS cpu_s, SUM(t.events) AS events,
+                   MAX(t.peak_rss_mb) AS peak_rss_mb,
+                   SUM(t.output_bytes) AS output_bytes, SUM(CASE WHEN t.output_bytes IS NULL THEN 0 ELSE t.events END) AS sized_events
+            FROM tasks t
+            WHERE {where} AND t.run_id IN (
+                SELECT r.run_id FROM runs r WHERE EXISTS (SELECT 1 FROM tasks t WHERE t.run_id = r.run_id AND {where})
+                ORDER BY r.generated DESC LIMIT ?
+            )
+        """
+        with self._connect() as db:
+            row = db.execute(query, parameters + parameters + [window]).fetchone()
+        if not row["tasks"]:
+            return None
+        return {
+            "tasks": row["tasks"],
+            "wall_s_per_event": row["wall_s"] / row["events"],
+            "cpu_s_per_event": row["cpu_s"] / row["events"],
+            "peak_rss_mb": row["peak_rss_mb"],
+            "output_bytes_per_event": row["output_bytes"] / row["sized_events"] if row["sized_events"] else None,
+        }
+
+    def regressions(self, run_id: str, window: int = 10, min_slowdown: float = 0.1,
+                    alpha: float = 0.01) -> List[Dict]:
+        """
+        Throughput regressions of run_id against the previous window runs.
+
+        Tasks are compared per (stage, file type, pixel pair) on events/s, each
+        divided by the baseline mean of its energy, so the energies of a
+        configuration form one sample (energies without a baseline are left
+        out). A regression is a mean slowdown of at least min_slowdown that is
+        significant at alpha in a one-sided Welch t-test.
+
+        Returns:
+            List[Dict]: stage, file_type, px_key, energies, current/baseline mean events/s,
+            slowdown, p_value, baseline runs and hosts/images of both sides
+        """
+        with self._connect() as db:
+            run = db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if run is None:
+                return []
+            keys = db.execute(
+                "SELECT DISTINCT stage, file_type, px_key FROM tasks "
+                "WHERE run_id = ? AND status = 'completed' AND events_per_s IS NOT NULL", (run_id,)
+            ).fetchall()
+
+            alerts = []
+            for key in keys:
+                config = (key["stage"], key["file_type"], key["px_key"])
+                current = db.execute(
+                    "SELECT energy, events_per_s FROM tasks WHERE run_id = ? AND stage = ? AND file_type IS ? "
+                    "AND px_key IS ? AND status = 'completed' AND events_per_s IS NOT NULL",
+                    (run_id, *config)
+                ).fetchall()
+                baseline_runs = [row[0] for row in db.execute(
+                    "SELECT DISTINCT r.run_id FROM runs r JOIN tasks t ON t.run_id = r.run_id "
+                    "WHERE r.generated < ? AND t.stage = ? AND t.file_type IS ? AND t.px_key IS ? "
+                    "AND t.status = 'completed' AND t.events_per_s IS NOT NULL "
+                    "ORDER BY r.generated DESC LIMIT ?",
+                    (run["generated"], *config, window)
+                )]
+                if not baseline_runs:
+                    continue
+                marks = ",".join("?" * len(baseline_runs))
+                baseline = db.execute(
+                    f"SELECT t.energy, t.events_per_s, r.host, r.image FROM tasks t JOIN runs r ON r.run_id = t.run_id "
+                    f"WHERE t.run_id IN ({marks}) AND t.stage = ? AND t.file_type IS ? AND t.px_key IS ? "
+                    f"AND t.status = 'completed' AND t.events_per_s IS NOT NULL",
+                    (*baseline_runs, *config)
+                ).fetchall()
+
+                by_energy: Dict[str, List[float]] = {}
+                for row in baseline:
+                    by_energy.setdefault(row[0], []).append(row[1])
+                means = {energy: statistics.mean(rates) for energy, rates in by_energy.items()}
+                current = [row for row in current if means.get(row[0])]
+                baseline = [row for row in baseline if means.get(row[0]) and row[0] in {c[0] for c in current}]
+                # Relative to the baseline of the same energy, so energies can be pooled
+                current_ratios = [row[1] / means[row[0]] for row in current]
+                baseline_ratios = [row[1] / means[row[0]] for row in baseline]
+                if len(current_ratios) < 2 or len(baseline_ratios) < 2:
+                    continue  # no variance estimate
+
+                slowdown = 1 - statistics.mean(current_ratios) / statistics.mean(baseline_ratios)
+                p_value = _welch(current_ratios, baseline_ratios)
+                if slowdown >= min_slowdown and p_value < alpha:
+                    alerts.append({
+                        "stage": key["stage"],
+                        "file_type": key["file_type"],
+                        "px_key": key["px_key"],
+                        "energies": sorted({row[0] for row in current}, key=_energy_order),
+                        "events_per_s": round(statistics.mean(row[1] for row in current), 3),
+                        "baseline_events_per_s": round(statistics.mean(row[1] for row in baseline), 3),
+                        "slowdown": round(slowdown, 3),
+                        "p_value": p_value,
+                        "baseline_runs": len(baseline_runs),
+                        "host": run["host"],
+                        "image": run["image"],
+                        "detector_hash": run["detector_hash"],
+                        "baseline_hosts": sorted({row[2] for row in baseline}),
+                        "baseline_images": sorted({row[3] for row in baseline}),
+                    })
+            return alerts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the performance history of simulation runs")
+    parser.add_argument("command", choices=["trend", "regressions"])
+    parser.add_argument("--db", default=os.path.join("simEvents", CATALOG_FILE), help="catalog file")
+    parser.add_argument("--stage", default="sim", choices=["sim", "recon"])
+    parser.add_argument("--file-type", default=None)
+    parser.add_argument("--energy", default=None)
+    parser.add_argument("--px-key", default=None, help="pixel pair, e.g. 0.1x0.1 (default: all, listed separately)")
+    parser.add_argument("--run-id", default=None, help="run to check (default: latest)")
+    parser.add_argument("--window", type=int, default=10, help="baseline runs")
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.db)
+    if args.command == "trend":
+        print(f"{'generated':19s}  {'host':20s}  {'detector':10s}  {'pixels':12s}  {'tasks':>5s}  {'events/s':>9s}  "
+              f"{'min':>9s}  {'max':>9s}  {'RSS MB':>7s}  image")
+        for row in catalog.trend(args.stage, args.file_type, args.energy, args.px_key):
+            print(f"{row['generated']:19s}  {row['host'][:20]:20s}  {(row['detector_hash'] or '-')[:10]:10s}  "
+                  f"{(row['px_key'] or '-')[:12]:12s}  "
+                  f"{row['tasks']:5d}  {row['mean_events_per_s'] or 0:9.2f}  {row['min_events_per_s'] or 0:9.2f}  "
+                  f"{row['max_events_per_s'] or 0:9.2f}  {row['peak_rss_mb'] or 0:7.0f}  {row['image']}")
+    else:
+        run_id = args.run_id
+        if run_id is None:
+            with catalog._connect() as db:
+                latest = db.execute("SELECT run_id FROM runs ORDER BY generated DESC LIMIT 1").fetchone()
+            run_id = latest[0] if latest else None
+        alerts = catalog.regressions(run_id, window=args.window) if run_id else []
+        if not alerts:
+            print(f"No throughput regressions for {run_id}")
+        for alert in alerts:
+            print(f"{alert['stage']} {alert['file_type']} {alert['px_key']}px @ {', '.join(alert['energies'])}: "
+                  f"{alert['events_per_s']:.2f} events/s vs. "
+                  f"{alert['baseline_events_per_s']:.2f} over {alert['baseline_runs']} runs "
+                  f"({alert['slowdown']:.0%} slower, p = {alert['p_value']:.1e})")
+
+
+if __name__ == "__main__":
+    main()
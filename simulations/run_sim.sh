@@ -12,6 +12,12 @@ SIM_CMD="$6"
 DO_RECON="${7:-false}"  # Optional reconstruction flag
 PLUGIN_PATH="${8:-}"    # Optional plugin path for reconstruction
 
+# Verbosity (environment): ddsim print level, and whether to keep the full output
+# (DEBUG re-runs of failed tasks) or only its last SIM_TAIL_LINES lines
+SIM_PRINT_LEVEL="${SIM_PRINT_LEVEL:-WARNING}"
+SIM_FULL_CAPTURE="${SIM_FULL_CAPTURE:-false}"
+SIM_TAIL_LINES="${SIM_TAIL_LINES:-200}"
+
 echo "Starting with parameters:"
 echo "DETECTOR_PATH: $DETECTOR_PATH"
 echo "DETECTOR_PARENT: $DETECTOR_PARENT"
@@ -88,7 +94,7 @@ execute_commands() {
         echo "Error: ddsim command not found"
         echo "PATH=$PATH"
         exit 1
-    }
+    fi
 
     # Show environment for debugging
     echo "PATH=$PATH"
@@ -108,18 +114,34 @@ execute_commands() {
     ERROR_LOG=$(mktemp)
     STDOUT_LOG=$(mktemp)
 
-    # Add --runType batch and verbose logging if not already present
+    # Add --runType batch, the print level and the Geant4 per-event progress line
+    # (printed at any print level) if not already present
+    SIM_ARGS=(${SIM_CMD})
     if [[ ! "${SIM_CMD}" =~ "--runType" ]]; then
-        SIM_CMD="${SIM_CMD} --runType batch"
+        SIM_ARGS+=(--runType batch)
     fi
     if [[ ! "${SIM_CMD}" =~ "-v" ]] && [[ ! "${SIM_CMD}" =~ "--printLevel" ]]; then
-        SIM_CMD="${SIM_CMD} -v DEBUG"
+        SIM_ARGS+=(-v "${SIM_PRINT_LEVEL:-WARNING}")
+    fi
+    if [[ ! "${SIM_CMD}" =~ "printProgress" ]]; then
+        SIM_ARGS+=(--ui.commandsPreRun "/run/printProgress 1")
     fi
 
-    echo "Modified simulation command: ${SIM_CMD}"
+    echo "Modified simulation command: ${SIM_ARGS[*]}"
 
-    # Run the simulation with output capture
-    if ! ${SIM_CMD} > >(tee "${STDOUT_LOG}") 2> >(tee "${ERROR_LOG}" >&2); then
+    # Run the simulation, either passing the full output through or keeping a bounded tail
+    # (the event counter lines still pass through for the caller's progress)
+    if [ "${SIM_FULL_CAPTURE:-false}" == "true" ]; then
+        "${SIM_ARGS[@]}" > >(tee "${STDOUT_LOG}") 2> >(tee "${ERROR_LOG}" >&2)
+        SIM_STATUS=$?
+    else
+        "${SIM_ARGS[@]}" 2>&1 | awk -v n="${SIM_TAIL_LINES:-200}" -v out="${STDOUT_LOG}" '
+            /--> Event [0-9]+ starts|Initializing event [0-9]+/ { print; fflush() }
+            { tail[NR % n] = $0 }
+            END { for (i = (NR > n ? NR - n + 1 : 1); i <= NR; i++) print tail[i % n] > out }'
+        SIM_STATUS=${PIPESTATUS[0]}
+    fi
+    if [ "${SIM_STATUS}" -ne 0 ]; then
         echo "Error: Simulation command failed"
         echo "Environment:"
         env | grep -E "^(LD_LIBRARY_PATH|PATH|DD4HEP)"
@@ -225,10 +247,13 @@ if [ "$INSIDE_SINGULARITY" = true ]; then
     execute_commands
 else
     echo "Executing commands via Singularity"
+    # --containall starts from an empty environment: the parameters and verbosity settings
+    # are passed as variable definitions in front of the function
     singularity exec --containall \
         --bind ${BIND_PATHS} \
-        ${SIF_PATH} /bin/bash -c "$(declare -f execute_commands); execute_commands"
+        ${SIF_PATH} /bin/bash -c "$(declare -p DETECTOR_PATH SIM_CMD DO_RECON PLUGIN_PATH RECON_DIR RECON_OUTPUT \
+            SIM_PRINT_LEVEL SIM_FULL_CAPTURE SIM_TAIL_LINES 2>/dev/null); $(declare -f execute_commands); execute_commands"
 fi
 
-# Exit with success
-exit 0
\ No newline at end of file
+# Exit with the status of the simulation (and reconstruction)
+exit $?
\ No newline at end of file
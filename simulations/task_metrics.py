@@ -0,0 +1,238 @@
+"""
+Resource accounting for the child processes of a simulation campaign.
+
+run_measured() replaces subprocess.run for ddsim/eicrecon tasks: the child is
+reaped with os.wait4 so its rusage (CPU time, peak RSS, block I/O of the whole
+waited-for process tree) is kept, and /proc is sampled while it runs to catch
+the peak RSS summed over the tree. Every task becomes one line of
+metrics.jsonl in the run directory.
+"""
+import os
+import json
+import time
+import fcntl
+import socket
+import threading
+import subprocess
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+METRICS_FILE = "metrics.jsonl"
+SAMPLE_INTERVAL = 2.0  # seconds between /proc samples of the process tree
+BLOCK_SIZE = 512  # ru_inblock/ru_oublock unit
+UNBUFFERED_ENV = {
+    "PYTHONUNBUFFERED": "1",
+    "SINGULARITYENV_PYTHONUNBUFFERED": "1",
+    "APPTAINERENV_PYTHONUNBUFFERED": "1",
+}
+
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and all its descendants, from the parent ids in /proc/<pid>/stat."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                # the command name may contain spaces, fields restart after the last ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def _tree_rss_bytes(pid: int) -> int:
+    """Resident memory summed over the process tree of pid."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for member in _process_tree(pid):
+        try:
+            with open(f"/proc/{member}/statm", 'r') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def run_measured(cmd: List[str], events: int = None, on_line: Callable[[str], None] = None,
+                 tail_lines: int = None, capture_path: str = None, env: Dict[str, str] = None,
+                 event_counter: Callable[[str], int] = None) -> Tuple[subprocess.CompletedProcess, Dict]:
+    """
+    Run cmd to completion like subprocess.run(cmd, capture_output=True, text=True).
+
+    Args:
+        cmd: Command list
+        events: Number of events the task was asked to process
+        on_line: Called with every stdout/stderr line as it arrives (e.g. progress parsing)
+        tail_lines: Only keep the last tail_lines lines of stdout and stderr in memory
+        capture_path: Also write the complete output (stdout and stderr interleaved) to this file
+        env: Extra environment variables for the child
+        event_counter: Events reached according to an output line (None for lines without a
+            counter, see progress.count_events); the highest value seen is recorded as the
+            events processed. Without counter lines (or without a counter) a task that
+            succeeded is assumed to have processed events.
+
+    Returns:
+        Tuple[subprocess.CompletedProcess, Dict]: The result and its resource usage
+    """
+    start = time.time()
+    # Unbuffered Python (ddsim) so lines reach on_line while the task runs. singularity exec
+    # --containall drops the host environment, the *ENV_ variables are passed into the container.
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               env={**os.environ, **UNBUFFERED_ENV, **(env or {})})
+
+    # Drain the pipes in threads, communicate() would reap the child and lose its rusage
+    output = {"stdout": deque(maxlen=tail_lines), "stderr": deque(maxlen=tail_lines)}
+    capture = open(capture_path, 'w') if capture_path else None
+    capture_lock = threading.Lock()
+    processed = 0
+
+    def drain(name: str, pipe) -> None:
+        nonlocal processed
+        for line in pipe:
+            output[name].append(line)
+            reached = event_counter(line) if event_counter is not None else None
+            if reached is not None:
+                with capture_lock:
+                    processed = max(processed, reached)
+            if capture is not None:
+                with capture_lock:
+                    capture.write(line)
+            if on_line is not None:
+                on_line(line)
+
+    readers = [
+        threading.Thread(target=drain, args=(name, pipe), daemon=True)
+        for name, pipe in (("stdout", process.stdout), ("stderr", process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+
+    peak_tree_rss = 0
+    finished = threading.Event()
+
+    def sample() -> None:
+        nonlocal peak_tree_rss
+        while not finished.wait(SAMPLE_INTERVAL):
+            peak_tree_rss = max(peak_tree_rss, _tree_rss_bytes(process.pid))
+
+    sampler = None
+    if os.path.isdir("/proc"):
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+
+    _, status, usage = os.wait4(process.pid, 0)
+    end = time.time()
+    finished.set()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+    if capture is not None:
+        capture.close()
+    if sampler is not None:
+        sampler.join()
+
+    wall = end - start
+    cpu = usage.ru_utime + usage.ru_stime
+    if processed:
+        events = processed
+    elif process.returncode != 0:
+        events = None
+    metrics = {
+        "host": socket.gethostname(),
+        "start": start,
+        "end": end,
+        "wall_s": round(wall, 3),
+        "user_s": round(usage.ru_utime, 3),
+        "sys_s": round(usage.ru_stime, 3),
+        "cpu_efficiency": round(cpu / wall, 3) if wall > 0 else None,
+        "peak_rss_mb": round(max(usage.ru_maxrss * 1024, peak_tree_rss) / 2**20, 1),  # ru_maxrss is in kB
+        "read_bytes": usage.ru_inblock * BLOCK_SIZE,
+        "write_bytes": usage.ru_oublock * BLOCK_SIZE,
+        "events": events,
+        "events_per_s": round(events / wall, 3) if events and wall > 0 else None,
+        "returncode": process.returncode
+    }
+    result = subprocess.CompletedProcess(cmd, process.returncode, "".join(output["stdout"]), "".join(output["stderr"]))
+    return result, metrics
+
+
+class MetricsTable(object):
+    """
+    Append-only metrics.jsonl of a run.
+
+    Appends take an flock on the file, so any number of tables (one per task
+    thread or per worker process) can write to the same run directory.
+
+    Usage:
+        table = MetricsTable(backup_path)
+        table.append({"task_id": ..., **metrics})
+    """
+
+    def __init__(self, run_dir: str) -> None:
+        self.path = os.path.join(run_dir, METRICS_FILE)
+
+    def append(self, record: Dict) -> None:
+        """Write one task record."""
+        line = json.dumps(record)
+        with open(self.path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line + "\n")
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read(self) -> List[Dict]:
+        """All records written so far."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def to_parquet(self) -> str:
+        """
+        Also store the table as metrics.parquet (needs pandas with a parquet engine).
+
+        Returns:
+            str: Path of the parquet file, None if pandas/pyarrow are not available
+        """
+        try:
+            import pandas as pd
+            path = os.path.splitext(self.path)[0] + ".parquet"
+            pd.DataFrame(self.read()).to_parquet(path)
+        except ImportError:
+            return None
+        return path
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        Per task type totals: tasks, wall/CPU seconds, events/s, CPU efficiency and peak RSS.
+        """
+        summary: Dict[str, Dict] = {}
+        for record in self.read():
+            entry = summary.setdefault(record.get("type", "task"), {
+                "tasks": 0, "wall_s": 0.0, "cpu_s": 0.0, "events": 0, "peak_rss_mb": 0.0,
+                "read_bytes": 0, "write_bytes": 0
+            })
+            entry["tasks"] += 1
+            entry["wall_s"] += record["wall_s"]
+            entry["cpu_s"] += record["user_s"] + record["sys_s"]
+            entry["events"] += record.get("events") or 0
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], record["peak_rss_mb"])
+            entry["read_bytes"] += record["read_bytes"]
+            entry["write_bytes"] += record["write_bytes"]
+        for entry in summary.values():
+            entry["events_per_s"] = entry["events"] / entry["wall_s"] if entry["wall_s"] > 0 else 0.0
+            entry["cpu_efficiency"] = entry["cpu_s"] / entry["wall_s"] if entry["wall_s"] > 0 else 0.0
+        return summary
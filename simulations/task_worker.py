@@ -0,0 +1,318 @@
+"""
+Worker side of distributed runs: run prepared tasks without a HandleSim.
+
+A task spec is self-contained: the detector variant it simulates with, the
+ddsim command, the container image, the paths run_sim.sh binds, the run
+directory its logs and metrics go to and a snapshot of the coordinator's
+environment. The worker neither reads the settings nor prepares detectors
+for all pixel pairs; it only makes sure the task's variant is built on this
+host (building it once, under a per-variant file lock, when it is not) and
+runs the task.
+
+Entry points (run from the simulations directory of the host):
+    python3 task_worker.py --slots 16   # worker pool fed with spec lines on stdin
+    python3 task_worker.py --task '<spec json>'
+    python3 task_worker.py --build <variant> --sif <image>   # build a variant ahead of its tasks
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import fcntl
+import socket
+import functools
+import hashlib
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from progress import count_events
+from task_metrics import MetricsTable, run_measured
+
+BUILD_STAMP = ".epic_sim_build"  # in <variant>/install, fingerprint of the sources it was built from
+SKIP_DIRS = {"build", "install", ".git"}
+# Coordinator environment passed on to the tasks (verbosity of run_sim.sh, detector/plugin settings)
+TASK_ENV_PREFIXES = ("SIM_", "DETECTOR", "JANA", "EICRECON")
+TAIL_LINES = 200
+
+_verified: Dict[str, str] = {}  # variant path -> fingerprint, checked (or built) once per process
+_verified_lock = threading.Lock()
+_logger_lock = threading.Lock()
+
+
+def env_snapshot(environ: Dict[str, str] = None) -> Dict[str, str]:
+    """Variables of environ (default os.environ) that tasks inherit from the coordinator."""
+    environ = os.environ if environ is None else environ
+    return {key: value for key, value in environ.items() if key.startswith(TASK_ENV_PREFIXES)}
+
+
+def variant_fingerprint(variant_path: str) -> str:
+    """
+    Fingerprint of a detector variant's sources and location.
+
+    Covers the path of every source file with its size and modification time
+    (build products excluded) and the variant's absolute path, since the
+    installed setup scripts hard-code it: a variant copied to another base
+    path has to be rebuilt there.
+    """
+    digest = hashlib.sha1(os.path.abspath(variant_path).encode())
+    for root, dirs, files in os.walk(variant_path):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(path, variant_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def variant_built(variant_path: str, fingerprint: str = None) -> bool:
+    """Whether variant_path has an install built from its current sources."""
+    stamp = os.path.join(variant_path, "install", BUILD_STAMP)
+    if not os.path.exists(os.path.join(variant_path, "install", "bin", "thisepic.sh")) or not os.path.exists(stamp):
+        return False
+    with open(stamp, 'r') as f:
+        return f.read().strip() == (fingerprint or variant_fingerprint(variant_path))
+
+
+def compile_variant(variant_path: str, sif_path: str) -> str:
+    """
+    Build and install a detector variant inside the container and stamp the install.
+
+    Returns:
+        str: Output of the build
+    """
+    variant_path = os.path.abspath(variant_path)
+    build_path = os.path.join(variant_path, 'build')
+    if os.path.exists(build_path):
+        shutil.rmtree(build_path)
+    os.makedirs(build_path)
+    cmd = [
+        "singularity", "exec", "--containall",
+        "--bind", f"{os.path.dirname(variant_path)}:{os.path.dirname(variant_path)}",
+        sif_path,
+        "/bin/bash", "-c", f"""
+            set -e
+            cd {variant_path}
+            mkdir -p build && cd build
+            cmake -DCMAKE_INSTALL_PREFIX=../install ..
+            make -j$(nproc) install
+        """
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+    install_path = os.path.join(variant_path, 'install')
+    if not os.path.exists(install_path):
+        raise RuntimeError(f"Installation directory not created: {install_path}")
+    thisepic_path = os.path.join(install_path, 'bin/thisepic.sh')
+    if not os.path.exists(thisepic_path):
+        raise RuntimeError(f"thisepic.sh not found at: {thisepic_path}")
+    stamp_variant(variant_path)
+    return result.stdout
+
+
+def stamp_variant(variant_path: str) -> None:
+    """Record that the install of variant_path matches its current sources."""
+    with open(os.path.join(variant_path, "install", BUILD_STAMP), 'w') as f:
+        f.write(variant_fingerprint(variant_path))
+
+
+def ensure_variant(variant_path: str, sif_path: str, logger: logging.Logger) -> bool:
+    """
+    Make sure the variant is built on this host, building it if not.
+
+    Concurrent tasks (threads and processes) of the same variant wait on one
+    build through a lock file next to the variant.
+
+    Returns:
+        bool: True if this call built the variant
+    """
+    if not os.path.isdir(variant_path):
+        raise FileNotFoundError(f"Detector variant not found on {socket.gethostname()}: {variant_path}")
+    with _verified_lock:
+        if variant_path in _verified:
+            return False
+    fingerprint = variant_fingerprint(variant_path)
+
+    fd = os.open(f"{variant_path.rstrip(os.sep)}.build.lock", os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        built = False
+        if not variant_built(variant_path, fingerprint):
+            logger.info(f"Building detector variant {variant_path} on {socket.gethostname()}")
+            output = compile_variant(variant_path, sif_path)
+            logger.debug(f"Compilation output: {output}")
+            built = True
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    with _verified_lock:
+        _verified[variant_path] = fingerprint
+    return built
+
+
+def task_logger(run_dir: str, px_key: str, console: bool = False) -> logging.Logger:
+    """Logger of the tasks of one pixel configuration, writing <run_dir>/<px_key>px/subprocess.log."""
+    logger = logging.getLogger(f"subprocess_{px_key}_{os.getpid()}")
+    with _logger_lock:
+        if logger.handlers:
+            return logger
+        logger.setLevel(logging.DEBUG)
+        px_path = os.path.join(run_dir, f"{px_key}px")
+        os.makedirs(px_path, exist_ok=True)
+        file_handler = logging.FileHandler(os.path.join(px_path, "subprocess.log"))
+        file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - Process %(process)d - %(levelname)s - %(message)s'
+        ))
+        logger.addHandler(file_handler)
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter('%(levelname)s - Process %(process)d - %(message)s'))
+            logger.addHandler(console_handler)
+    return logger
+
+
+def run_task(spec: Dict) -> Dict:
+    """
+    Run one simulation (and its reconstruction) task through run_sim.sh.
+
+    Args:
+        spec: task_id, px_key, variant_path, command, sif_path, execution_path, sim_out_path,
+            reconstruct, plugin_path, run_dir, env and optionally console_logging
+
+    Returns:
+        Dict: status ('completed' or 'failed'), machine and the error of a failed task
+    """
+    hostname = socket.gethostname()
+    logger = task_logger(spec['run_dir'], spec['px_key'], spec.get('console_logging', False))
+    log_file = logger.handlers[0].baseFilename
+    try:
+        variant_path = os.path.abspath(spec['variant_path'])
+        if not os.path.exists(spec['sif_path']):
+            raise FileNotFoundError(f"Singularity image not found: {spec['sif_path']}")
+        ensure_variant(variant_path, spec['sif_path'], logger)
+
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_sim.sh")
+        cmd = [
+            script_path,
+            variant_path,
+            os.path.dirname(variant_path),
+            spec['execution_path'],
+            spec['sim_out_path'],
+            spec['sif_path'],
+            spec['command'],
+            str(spec['reconstruct']).lower(),
+            spec['plugin_path'] if spec['reconstruct'] else ""
+        ]
+
+        # Run quietly (bounded output tail), recording the resource usage in metrics.jsonl
+        n_events = re.search(r"-N (\d+)", spec['command'])
+        events = int(n_events.group(1)) if n_events else None
+        env = spec.get('env', {})
+        metrics_table = MetricsTable(spec['run_dir'])
+        result, metrics = run_measured(cmd, events=events, tail_lines=TAIL_LINES, env=env,
+                                       event_counter=functools.partial(count_events, "sim"))
+        metrics_table.append({"task_id": spec['task_id'], "px_key": spec['px_key'], "type": "sim", **metrics})
+        if result.returncode != 0:
+            # Re-run once at DEBUG with the complete output kept next to the task log
+            debug_log = os.path.join(os.path.dirname(log_file), f"{spec['task_id']}_debug.log")
+            logger.warning(f"Simulation failed, tail of its output:\n{result.stdout}")
+            logger.warning(f"Re-running at DEBUG level, full output in {debug_log}")
+            result, metrics = run_measured(
+                cmd, events=events, tail_lines=TAIL_LINES, capture_path=debug_log,
+                env={**env, "SIM_PRINT_LEVEL": "DEBUG", "SIM_FULL_CAPTURE": "true"},
+                event_counter=functools.partial(count_events, "sim")
+            )
+            metrics_table.append({"task_id": spec['task_id'], "px_key": spec['px_key'], "type": "sim",
+                                  "attempt": "debug", **metrics})
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+        return {'status': 'completed', 'machine': hostname}
+
+    except Exception as e:
+        logger.error(f"Error in simulation: {str(e)}")
+        return {'status': 'failed', 'error': str(e), 'machine': hostname}
+
+
+def serve(instream, outstream, slots: int, heartbeat: float = 30.0) -> None:
+    """
+    Worker pool of a host: run the task specs read from instream, up to slots at a time.
+
+    Every input line is a JSON object with task_id and spec; the input ends when
+    the coordinator has no more tasks for this host. The status of each task is
+    written to outstream as one JSON line as soon as it finishes, besides a ready
+    line at the start and a heartbeat line every heartbeat seconds.
+
+    Args:
+        instream: Task lines (stdin of the SSH channel)
+        outstream: Status lines (stdout of the SSH channel)
+        slots: Tasks run at the same time
+        heartbeat: Seconds between heartbeat lines
+    """
+    hostname = socket.gethostname()
+    write_lock = threading.Lock()
+
+    def send(message: Dict) -> None:
+        with write_lock:
+            outstream.write(json.dumps(message) + "\n")
+            outstream.flush()
+
+    def run(task_id: str, spec: Dict) -> None:
+        start = time.time()
+        try:
+            result = run_task(spec)
+        except Exception as e:
+            result = {'status': 'failed', 'error': str(e), 'machine': hostname}
+        send({'task_id': task_id, **result, 'wall_s': time.time() - start})
+
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(heartbeat):
+            send({'event': 'heartbeat'})
+
+    threading.Thread(target=beat, daemon=True).start()
+    send({'event': 'ready', 'machine': hostname, 'slots': slots})
+    try:
+        with ThreadPoolExecutor(max_workers=slots) as executor:
+            for line in instream:
+                if line.strip():
+                    message = json.loads(line)
+                    executor.submit(run, message['task_id'], message['spec'])
+    finally:
+        stop.set()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run prepared simulation tasks on this host")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--slots", type=int, help="serve task spec lines from stdin, running this many at a time")
+    mode.add_argument("--task", help="run a single task spec (JSON)")
+    mode.add_argument("--build", metavar="VARIANT", help="make sure a detector variant is built on this host")
+    parser.add_argument("--sif", help="container image to build the variant in (with --build)")
+    args = parser.parse_args(argv)
+
+    if args.build is not None:
+        logger = logging.getLogger("task_worker")
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+        ensure_variant(os.path.abspath(args.build), args.sif, logger)
+        return 0
+
+    if args.task is not None:
+        result = run_task(json.loads(args.task))
+        print(json.dumps(result))
+        return 0 if result['status'] == 'completed' else 1
+    serve(sys.stdin, sys.stdout, args.slots)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
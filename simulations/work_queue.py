@@ -0,0 +1,226 @@
+"""
+Pull-based task queue for distributed runs (epic_sim_fuse.py).
+
+Instead of partitioning the tasks between the hosts before the run starts,
+every host's workers ask the queue for their next task whenever a slot is
+free, so a host that finishes early keeps pulling work while a slow one
+is still busy. Each task carries its predicted cost (events), each host a
+throughput in events/s per slot that starts from an estimate (the host's
+calibration, see host_calibration.py) and follows
+the measured throughput of the tasks it completes. A host is handed the
+largest pending task it would finish no later than the fastest live host
+could (counting the time until that host has a free slot); slow hosts are
+left the small tasks near the end of the run. A host registered as not
+ready (e.g. still being staged) is not counted until mark_ready.
+
+Hosts heartbeat (the host telemetry does so on every sample, and every
+completed task counts). A host silent for longer than heartbeat_timeout
+is declared dead and its leased tasks go back to the queue for the other
+hosts (its workers stop pulling, a dropped host does not come back
+within the run); the first completion of a task wins.
+"""
+import time
+import threading
+from typing import Dict, List
+
+DEFAULT_EVENTS_PER_S = 1.0  # per slot, until a host has completed tasks
+SMOOTHING = 0.3  # weight of the latest task in the per-host events/s
+
+
+class WorkQueue(object):
+    """
+    Tasks leased to hosts on request.
+
+    Usage:
+        queue = WorkQueue(heartbeat_timeout=120)
+        queue.add(task_id, task, events)
+        queue.register_host(hostname, slots=8)
+        # in every worker of hostname:
+        while (lease := queue.next_task(hostname)) is not None:
+            queue.complete(lease["task_id"], hostname, run(lease["task"]))
+    """
+
+    def __init__(self, heartbeat_timeout: float = 120.0, poll_interval: float = 5.0, logger=None) -> None:
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll_interval = poll_interval  # waiting workers re-check for dead hosts this often
+        self.logger = logger
+        self.tasks: Dict[str, Dict] = {}
+        self.pending: List[str] = []  # largest first
+        self.leases: Dict[str, Dict] = {}  # task_id -> hostname, start, predicted_s
+        self.results: Dict[str, Dict] = {}
+        self.hosts: Dict[str, Dict] = {}
+        self._cond = threading.Condition()
+
+    def _log(self, message: str, level: str = "info") -> None:
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+
+    def add(self, task_id: str, task: Dict, events: int = None) -> None:
+        """Queue task, its cost being the number of events it processes."""
+        with self._cond:
+            self.tasks[task_id] = {"task": task, "events": events or 1, "attempts": 0}
+            self.pending.append(task_id)
+            self.pending.sort(key=lambda pending_id: self.tasks[pending_id]["events"], reverse=True)
+            self._cond.notify_all()
+
+    def register_host(self, hostname: str, slots: int, events_per_s: float = DEFAULT_EVENTS_PER_S,
+                      ready: bool = True) -> None:
+        """
+        Let hostname pull tasks into slots workers, at first estimated at events_per_s per slot.
+
+        A host that is not ready yet is left out when the other hosts pick their tasks,
+        so they do not hold back work for it.
+        """
+        with self._cond:
+            self.hosts[hostname] = {
+                "slots": max(1, slots), "events_per_s": events_per_s,
+                "last_seen": time.time(), "alive": True, "ready": ready, "completed": 0
+            }
+            self._cond.notify_all()
+
+    def mark_ready(self, hostname: str) -> None:
+        """hostname has started pulling tasks."""
+        with self._cond:
+            host = self.hosts.get(hostname)
+            if host is not None:
+                host["ready"] = True
+                self._cond.notify_all()
+
+    def set_throughput(self, hostname: str, events_per_s: float) -> None:
+        """Replace the initial estimate of hostname (e.g. by a calibration) unless it has measured throughput."""
+        with self._cond:
+            host = self.hosts.get(hostname)
+            if host is not None and not host["completed"] and events_per_s > 0:
+                host["events_per_s"] = events_per_s
+                self._cond.notify_all()
+
+    def heartbeat(self, hostname: str) -> None:
+        """hostname is alive."""
+        with self._cond:
+            host = self.hosts.get(hostname)
+            if host is not None:
+                host["last_seen"] = time.time()
+
+    def drop_host(self, hostname: str, reason: str) -> List[str]:
+        """
+        Declare hostname dead and put its leased tasks back into the queue.
+
+        Returns:
+            List[str]: The requeued task ids
+        """
+        with self._cond:
+            return self._drop_host(hostname, reason)
+
+    def _drop_host(self, hostname: str, reason: str) -> List[str]:
+        host = self.hosts.get(hostname)
+        if host is None or not host["alive"]:
+            return []
+        host["alive"] = False
+        orphans = [task_id for task_id, lease in self.leases.items() if lease["hostname"] == hostname]
+        for task_id in orphans:
+            del self.leases[task_id]
+            self.pending.append(task_id)
+        self.pending.sort(key=lambda pending_id: self.tasks[pending_id]["events"], reverse=True)
+        self._log(f"{hostname} dropped ({reason}), requeued {len(orphans)} tasks", level="warning")
+        self._cond.notify_all()
+        return orphans
+
+    def _reap(self) -> None:
+        now = time.time()
+        for hostname, host in self.hosts.items():
+            if host["alive"] and now - host["last_seen"] > self.heartbeat_timeout:
+                self._drop_host(hostname, f"no heartbeat for {now - host['last_seen']:.0f} s")
+
+    def _next_free(self, hostname: str, now: float) -> float:
+        """Predicted time at which hostname has a free slot."""
+        ends = sorted(lease["start"] + lease["predicted_s"] for lease in self.leases.values()
+                      if lease["hostname"] == hostname)
+        if len(ends) < self.hosts[hostname]["slots"]:
+            return now
+        return max(now, ends[len(ends) - self.hosts[hostname]["slots"]])
+
+    def _pick(self, hostname: str) -> str:
+        """Largest pending task hostname finishes no later than the fastest other live host could."""
+        now = time.time()
+        rate = self.hosts[hostname]["events_per_s"]
+        others = {
+            other: (self._next_free(other, now), host["events_per_s"])
+            for other, host in self.hosts.items() if other != hostname and host["alive"] and host["ready"]
+        }
+        for task_id in self.pending:
+            events = self.tasks[task_id]["events"]
+            finish = now + events / rate
+            if all(finish <= free + events / other_rate for free, other_rate in others.values()):
+                return task_id
+        return None
+
+    def _finished(self) -> bool:
+        return not self.pending and not self.leases
+
+    def next_task(self, hostname: str) -> Dict:
+        """
+        Lease the next task to a free slot of hostname, waiting while better placed hosts are busy.
+
+        Returns:
+            Dict: task_id, task and predicted_s; None when there is nothing left for hostname
+        """
+        with self._cond:
+            while True:
+                self._reap()
+                host = self.hosts.get(hostname)
+                if host is None or not host["alive"] or self._finished():
+                    return None
+                task_id = self._pick(hostname) if self.pending else None
+                if task_id is not None:
+                    self.pending.remove(task_id)
+                    entry = self.tasks[task_id]
+                    entry["attempts"] += 1
+                    predicted = entry["events"] / host["events_per_s"]
+                    self.leases[task_id] = {"hostname": hostname, "start": time.time(), "predicted_s": predicted}
+                    return {"task_id": task_id, "task": entry["task"], "predicted_s": predicted}
+                # Leased tasks may still come back from a dead host
+                self._cond.wait(self.poll_interval)
+
+    def complete(self, task_id: str, hostname: str, result: Dict, wall_s: float = None) -> bool:
+        """
+        Record the result of task_id run by hostname and update the host's throughput.
+
+        Returns:
+            bool: False if the task had already been completed (e.g. by the host it was requeued to)
+        """
+        with self._cond:
+            host = self.hosts.get(hostname)
+            if host is not None:
+                host["last_seen"] = time.time()
+            lease = self.leases.get(task_id)
+            if lease is not None and lease["hostname"] == hostname:
+                del self.leases[task_id]
+            if task_id in self.results:
+                self._cond.notify_all()
+                return False
+            if task_id in self.pending:
+                # Finished by a host that was declared dead after all
+                self.pending.remove(task_id)
+            self.results[task_id] = {**result, "machine": hostname}
+            events = self.tasks[task_id]["events"]
+            if host is not None and result.get("status") == "completed" and wall_s:
+                measured = events / wall_s
+                host["events_per_s"] += SMOOTHING * (measured - host["events_per_s"])
+                host["completed"] += 1
+            self._cond.notify_all()
+            return True
+
+    def wait(self) -> Dict[str, Dict]:
+        """Block until every task has a result (or no live host is left) and return the results."""
+        with self._cond:
+            while not self._finished():
+                self._reap()
+                if not any(host["alive"] for host in self.hosts.values()):
+                    break
+                self._cond.wait(self.poll_interval)
+            return dict(self.results)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per host: slots, measured events/s per slot, completed tasks and whether it is alive."""
+        with self._cond:
+            return {hostname: dict(host) for hostname, host in self.hosts.items()}